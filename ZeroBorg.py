@@ -1,21 +1,22 @@
-import logging, types, time, enum
+import logging, types, time, enum, threading, queue, concurrent.futures, collections, json, os, bisect, heapq
 
-logging.basicConfig(level=logging.INFO)
+logger=logging.getLogger(__name__)
 
-try: import smbus
-except ImportError:
-    logging.warning("smbus not installed, using stub instead.")
-    class smbus(object):
-        class SMBus(object):
-            def __init__(self, *args, **kwargs): pass
-            def read_i2c_block_data(*args): return []
-            def write_byte_data(*args): pass
+# smbus is only imported when the first bus is opened, see openSMBus
+smbus=None
 
 I2C_NORM_LEN    = 4
 I2C_LONG_LEN    = 24
 I2C_ID_ZEROBORG = 0x40
 PWM_MAX         = 255
 IR_MAX_BYTES    = I2C_LONG_LEN-2
+ANALOG_VREF     = 3.3
+SCAN_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "zeroborg", "scan.json")
+SCAN_STALL_FACTOR = 10  # A probe still running this many scan timeouts after it started means the bus has stalled
+
+INIT_PROBE      = "probe"       # init() reads the board ID before returning
+INIT_TRUST      = "trust"       # init() assumes the board is there without touching the bus
+INIT_BACKGROUND = "background"  # init() reads the board ID on a background thread
 
 class Command(enum.IntEnum):
     SetLED       = 1     # Set the LED status
@@ -55,71 +56,277 @@ class Command(enum.IntEnum):
     ValueOff     = 0     # I2C value representing off
     AnalogMax    = 0x3FF # Maximum value for analog readings
 
+class ZeroBorgError(Exception):
+    """Raised for failed ZeroBorg transactions when ZeroBorg.raiseErrors is True"""
+
+class ZeroBorgIOError(ZeroBorgError, IOError):
+    """An I\u00B2C transaction failed on every attempt allowed by the RetryPolicy"""
+
+class ZeroBorgTimeoutError(ZeroBorgError):
+    """An I\u00B2C transaction could not complete within the RetryPolicy deadline"""
+
+class ZeroBorgReplyError(ZeroBorgError):
+    """The board sent a reply shorter than requested"""
+
+class RetryPolicy(object):
+    """
+How ZeroBorg retries failed I\u00B2C transactions
+retries                 Number of extra attempts after the first one fails
+backoff                 Seconds to wait before the first retry
+factor                  Multiplier applied to the wait before each further retry
+maxBackoff              Longest wait between attempts, in seconds
+deadline                Seconds from the first attempt after which no further retry is started, None for no limit
+reopenAfter             Consecutive failed attempts, across calls, after which the bus is reopened, 0 to never reopen
+A blocking smbus call cannot be interrupted, so the worst case latency of a call is deadline plus one transaction.
+    """
+
+    def __init__(self, retries=2, backoff=0.001, factor=2.0, maxBackoff=0.01, deadline=0.02, reopenAfter=10):
+        self.retries=retries
+        self.backoff=backoff
+        self.factor=factor
+        self.maxBackoff=maxBackoff
+        self.deadline=deadline
+        self.reopenAfter=reopenAfter
+
+    def delay(self, attempt):
+        """
+        seconds = delay(attempt)
+        Returns the wait before retrying after failed attempt number attempt, counting from 0
+        """
+        return min(self.backoff*self.factor**attempt, self.maxBackoff)
+
+class Transport(object):
+    """
+Base class for the objects ZeroBorg talks to an I\u00B2C bus through, using the smbus.SMBus method names
+combined                True if writeRegisters and readRegisters send all their messages in one bus transaction
+Subclasses provide read_i2c_block_data, write_byte_data, read_byte, write_quick and close.
+The base writeRegisters and readRegisters send one message at a time, transports which can do better override them.
+Any object with the smbus.SMBus methods can be used as ZeroBorg.bus, it does not have to derive from Transport.
+    """
+
+    combined=False
+
+    def read_i2c_block_data(self, address, command, length): raise NotImplementedError
+    def write_byte_data(self, address, command, value): raise NotImplementedError
+    def read_byte(self, address): raise NotImplementedError
+    def write_quick(self, address): raise NotImplementedError
+    def close(self): pass
+
+    def writeRegisters(self, address, writes):
+        """
+        writeRegisters(address, writes)
+        Writes every (command, value) pair in writes to the device at address
+        """
+        for command, value in writes: self.write_byte_data(address, command, value)
+
+    def readRegisters(self, address, reads):
+        """
+        replies = readRegisters(address, reads)
+        Reads every (command, length) pair in reads from the device at address, returns a list of the replies
+        """
+        return [self.read_i2c_block_data(address, command, length) for command, length in reads]
+
+class SMBusTransport(Transport):
+    """
+Transport using smbus.SMBus, its methods are bound straight onto the instance so calls cost no more than using smbus itself
+busNumber               I\u00B2C bus to open
+    """
+
+    def __init__(self, busNumber):
+        bus=self._bus=smbus.SMBus(busNumber)
+        self.read_i2c_block_data=bus.read_i2c_block_data
+        self.write_byte_data=bus.write_byte_data
+        self.read_byte=bus.read_byte
+        self.write_quick=bus.write_quick
+        self.close=bus.close
+
+class _SMBusStub(Transport):
+    def __init__(self, *args, **kwargs): pass
+    def read_i2c_block_data(self, *args): raise OSError("smbus not installed")
+    def write_byte_data(self, *args): pass
+    def read_byte(self, *args): raise OSError("smbus not installed")
+    def write_quick(self, *args): pass
+
+def openSMBus(busNumber):
+    """
+    bus = openSMBus(busNumber)
+    Opens I\u00B2C bus busNumber as an SMBusTransport, importing smbus the first time.
+    If smbus is not installed a stub bus is returned whose reads fail, and a warning is logged once.
+    """
+    global smbus
+    if smbus is None:
+        try: import smbus
+        except ImportError:
+            logger.warning("smbus not installed, using stub instead.")
+            smbus=False
+    if smbus is False: return _SMBusStub(busNumber)
+    return SMBusTransport(busNumber)
+
 def scanForZeroBorg(busNumber=1):
-    logging.info("Scanning I\u00B2C bus #{}".format(busNumber))
+    logger.info("Scanning I\u00B2C bus #{}".format(busNumber))
     found=[]
-    bus=smbus.SMBus(busNumber)
+    bus=openSMBus(busNumber)
     for address in range(0x03,0x78):
         try:
             i2cRecv=bus.read_i2c_block_data(address, Command.GetID, I2C_NORM_LEN)
             if len(i2cRecv)==I2C_NORM_LEN:
                 if i2cRecv[1]==I2C_ID_ZEROBORG:
-                    logging.info('Found ZeroBorg at 0x{:02X}'.format(address))
+                    logger.info('Found ZeroBorg at 0x{:02X}'.format(address))
                     found.append(address)
 
         except KeyboardInterrupt: raise
         except: pass
 
     if len(found)==0:
-        logging.warning(
+        logger.warning(
             "No ZeroBorg boards found, is bus #{} correct? "
             "(Should be 0 for Rev. 1 or 1 for Rev. 2)".format(busNumber)
         )
-    elif len(found)==1: logging.info("1 ZeroBorg board found.")
-    else: logging.info("{} ZeroBorg boards found.".format(len(found)))
+    elif len(found)==1: logger.info("1 ZeroBorg board found.")
+    else: logger.info("{} ZeroBorg boards found.".format(len(found)))
     return found
 
+ScanResult=collections.namedtuple("ScanResult", ("busNumber", "address", "id", "latency"))
+ScanResult.__doc__="""
+A ZeroBorg found by fastScanForZeroBorg
+busNumber               I\u00B2C bus the board was found on
+address                 I\u00B2C address of the board
+id                      The GetID reply from the board, as bytes
+latency                 Seconds taken to probe the address
+"""
+
+def _probeAddress(bus, busNumber, address, presence):
+    started=time.monotonic()
+    try:
+        # A single byte read is much cheaper than GetID and fails quickly when nothing ACKs
+        if presence: bus.read_byte(address)
+        i2cRecv=bus.read_i2c_block_data(address, Command.GetID, I2C_NORM_LEN)
+    except KeyboardInterrupt: raise
+    except: return
+
+    if len(i2cRecv)==I2C_NORM_LEN and i2cRecv[1]==I2C_ID_ZEROBORG:
+        return ScanResult(busNumber, address, bytes(i2cRecv), time.monotonic()-started)
+
+def _submitProbes(busNumber, bus, addresses, presence):
+    worker=BusWorker.forBus(busNumber)
+    return [worker.submit(_probeAddress, bus, busNumber, address, presence) for address in addresses]
+
+def _collectProbes(busNumber, futures, addresses, timeout):
+    # Returns the boards found and True if every address was probed in time
+    found=[]
+    complete=True
+    for index, future in enumerate(futures):
+        try: result=future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            complete=False
+            logger.warning("Probe of 0x{:02X} timed out on I\u00B2C bus #{}, skipping it".format(addresses[index], busNumber))
+            # The probes run one at a time, so the next one cannot start until this one gives up
+            try: future.result(timeout*SCAN_STALL_FACTOR)
+            except concurrent.futures.TimeoutError:
+                logger.warning("I\u00B2C bus #{} is not responding, abandoning the rest of the scan".format(busNumber))
+                for pending in futures[index+1:]: pending.cancel()
+                break
+            continue
+        if result is not None: found.append(result)
+    return found, complete
+
+def _loadScanCache(cacheFile):
+    if cacheFile is None: return {}
+    try:
+        with open(cacheFile) as f: return {int(k): list(v) for k, v in json.load(f).items()}
+    except (OSError, ValueError, AttributeError): return {}
+
+def _saveScanCache(cacheFile, cache):
+    if cacheFile is None: return
+    try:
+        os.makedirs(os.path.dirname(cacheFile) or ".", exist_ok=True)
+        with open(cacheFile, "w") as f: json.dump({str(k): v for k, v in cache.items()}, f)
+    except OSError as e: logger.warning("Could not save ZeroBorg scan cache: {}".format(e))
+
+def fastScanForZeroBorg(busNumbers=(1,), presence=True, timeout=0.1, cacheFile=SCAN_CACHE_FILE, fullSweep=False):
+    """
+    results = fastScanForZeroBorg([busNumbers], [presence], [timeout], [cacheFile], [fullSweep])
+    Scans each bus in busNumbers for ZeroBorg boards, with the buses probed concurrently on their BusWorker threads.
+    If presence is True each address is first checked with a cheap single byte read and GetID is only sent if it ACKs.
+    An address whose probe takes longer than timeout seconds is skipped, and if the probe has still not finished
+    after SCAN_STALL_FACTOR times timeout the rest of the scan on that bus is abandoned.
+    Boards found are remembered in cacheFile (None disables the cache): a later scan verifies the cached addresses
+    first and only sweeps the whole bus if one of them no longer answers, or if fullSweep is True.
+    A sweep which skipped any address leaves the cache for that bus as it was.
+    Returns a list of ScanResult (busNumber, address, id, latency).
+    """
+    if isinstance(busNumbers, int): busNumbers=(busNumbers,)
+    cache=_loadScanCache(cacheFile)
+    buses={busNumber: openSMBus(busNumber) for busNumber in busNumbers}
+    results={}
+
+    if not fullSweep:
+        pending={busNumber: _submitProbes(busNumber, bus, cache[busNumber], False)
+            for busNumber, bus in buses.items() if cache.get(busNumber)}
+        for busNumber, futures in pending.items():
+            found=_collectProbes(busNumber, futures, cache[busNumber], timeout)[0]
+            if len(found)==len(cache[busNumber]):
+                logger.info("Verified {} cached ZeroBorg board(s) on I\u00B2C bus #{}".format(len(found), busNumber))
+                results[busNumber]=found
+
+    addresses=range(0x03,0x78)
+    pending={busNumber: _submitProbes(busNumber, bus, addresses, presence)
+        for busNumber, bus in buses.items() if busNumber not in results}
+    complete=set(results)
+    for busNumber, futures in pending.items():
+        logger.info("Scanning I\u00B2C bus #{}".format(busNumber))
+        results[busNumber], swept=_collectProbes(busNumber, futures, addresses, timeout)
+        if swept: complete.add(busNumber)
+
+    for busNumber in busNumbers:
+        if busNumber in complete: cache[busNumber]=[result.address for result in results[busNumber]]
+        for result in results[busNumber]:
+            logger.info("Found ZeroBorg at 0x{:02X} on bus #{}".format(result.address, busNumber))
+    _saveScanCache(cacheFile, cache)
+
+    return [result for busNumber in busNumbers for result in results[busNumber]]
+
 def setNewAddress(newAddress, oldAddress=-1, busNumber=1):
     if newAddress<0x03 or newAddress>0x77:
-        logging.error("Error, I\u00B2C addresses below 3 (0x03) and above 119 (0z77) "
+        logger.error("Error, I\u00B2C addresses below 3 (0x03) and above 119 (0z77) "
             "are reserved, use an address between 3 (0x03) and 119 (0x77).")
 
     if oldAddress<0x0:
         found=scanForZeroBorg(busNumber)
         if len(found)<1:
-            logging.error("No ZeroBorg boards found, cannot set a new I\u00B2C address!")
+            logger.error("No ZeroBorg boards found, cannot set a new I\u00B2C address!")
             return
         else: oldAddress=found[0]
 
-    logging.info(
+    logger.info(
         "Changing I\u00B2C address from {:02X} to {:02X} (bus #{})".format(
             oldAddress, newAddress, busNumber))
 
-    bus=smbus.SMBus(busNumber)
+    bus=openSMBus(busNumber)
     try:
         i2cRecv=bus.read_i2c_block_data(oldAddress, Command.GetID, I2C_ID_ZEROBORG)
         if len(i2cRecv)==I2C_NORM_LEN:
             if i2cRecv[1]==I2C_ID_ZEROBORG:
                 foundChip=True
-                logging.info("Found ZeroBorg at {:02X}.".format(oldAddress))
+                logger.info("Found ZeroBorg at {:02X}.".format(oldAddress))
             else:
                 foundChip=False
-                logging.warning("Found a devie at {:02X}, but it is not a ZeroBorg "
+                logger.warning("Found a devie at {:02X}, but it is not a ZeroBorg "
                     "(ID {:02X} instead of {:02X})".format(
                         oldAddress, i2cRecv[1], I2C_ID_ZEROBORG))
         else:
             foundChip=False
-            logging.error("Missing ZeroBorg at {:02X}".format(oldAddress))
+            logger.error("Missing ZeroBorg at {:02X}".format(oldAddress))
 
     except KeyboardInterrupt: raise
     except: 
         foundChip=False
-        logging.error("Missing ZeroBorg at {:02X}".format(oldAddress))
+        logger.error("Missing ZeroBorg at {:02X}".format(oldAddress))
 
     if foundChip:
         bus.write_byte_data(oldAddress, Command.SetI2cAdd, newAddress)
         time.sleep(.1)
-        logging.info("Address changed to {:02X}, "
+        logger.info("Address changed to {:02X}, "
             "attempting to communicate on new address.".format(newAddress))
 
         try:
@@ -127,54 +334,106 @@ def setNewAddress(newAddress, oldAddress=-1, busNumber=1):
             if len(i2cRecv)==I2C_NORM_LEN:
                 if i2cRecv[1]==I2C_ID_ZEROBORG:
                     foundChip=True
-                    logging.info("Found ZeroBorg at {:02X}.".format(newAddress))
+                    logger.info("Found ZeroBorg at {:02X}.".format(newAddress))
                 else:
                     foundChip=False
-                    logging.warning("Found a devie at {:02X}, but it is not a ZeroBorg "
+                    logger.warning("Found a devie at {:02X}, but it is not a ZeroBorg "
                         "(ID {:02X} instead of {:02X})".format(
                             oldAddress, i2cRecv[1], I2C_ID_ZEROBORG))
             else:
                 foundChip=False
-                logging.error("Missing ZeroBorg at {:02X}".format(newAddress))
+                logger.error("Missing ZeroBorg at {:02X}".format(newAddress))
 
         except KeyboardInterrupt: raise
         except:
             foundChip=False
-            logging.error("Missing ZeroBorg at {:02X}".format(newAddress))
+            logger.error("Missing ZeroBorg at {:02X}".format(newAddress))
 
     if foundChip:
-        logging.info("New I\u00B2C address of {:02X} set successfully.".format(newAddress))
-    else: logging.error("Failed to set new I\u00B2C address!")
+        logger.info("New I\u00B2C address of {:02X} set successfully.".format(newAddress))
+    else: logger.error("Failed to set new I\u00B2C address!")
 
 class ZeroBorg(object):
     """
 This module is designed to communicate with the ZeroBorg
 busNumber               I\u00B2C bus on which the ZeroBorg is attached (Rev 1 is bus 0, Rev 2 is bus 1)
-bus                     the smbus object used to talk to the I\u00B2C bus
+bus                     the smbus object used to talk to the I\u00B2C bus, None until the first transaction opens it
+busFactory              Function called with busNumber to open bus, if None openSMBus is used
 i2cAddress              The I\u00B2C address of the ZeroBorg chip to control
 foundChip               True if the ZeroBorg chip can be seen, False otherwise
 printFunction           Function reference to call when printing text, if None "print" is used
+retryPolicy             RetryPolicy applied to every I\u00B2C transaction
+raiseErrors             True to raise ZeroBorgError from failed calls, False to print a message and return None
+While a StateRefresher is running (see startStateRefresh) the getters answer from its readings until they are older than their TTL.
     """
 
+    _MOTOR_REGISTERS=(Command.SetAFwd, Command.SetBFwd, Command.SetCFwd, Command.SetDFwd)
+
     def __init__(self):
         self._busNumber=1
         self._i2cAddress=I2C_ID_ZEROBORG
         self._bus=None
+        self._busFactory=None
         self._foundChip=False
         self._printFunction=None
-
-    def init(self, tryOtherBus=True):
+        self._lock=threading.RLock()
+        self._shadow={}
+        self._cacheEnabled=False
+        self._cacheRefresh=0.1
+        self._cacheMaxAge=0.0
+        self._lastWrite=0.0
+        self._keepAlive=None
+        self._metrics=None
+        self._retryPolicy=RetryPolicy()
+        self._raiseErrors=False
+        self._failures=0
+        self._ownsBus=False
+        self._openLock=threading.Lock()
+        self._initDone=threading.Event()
+        self._initDone.set()
+        self._arbiter=None
+        self._arbiterBus=None
+        self._state=BoardState()
+        self._stateLock=threading.Lock()
+        self._stateTTL={}
+        self._written={}
+        self._refresher=None
+        self._epoTripped=None
+        self._epoCleared=None
+        self._lastIR=None
+
+    def init(self, tryOtherBus=True, mode=INIT_PROBE):
         """
-        init([tryOtherBus])
+        init([tryOtherBus], [mode])
         Prepare the I2C driver for talking to the ZeroBorg
         If tryOtherBus is True or omitted, this function will attempt to use the other bus if the ZeroBorg devices can not be found on the current busNumber
+        The bus itself is opened by the first transaction. mode picks how the board is found:
+        INIT_PROBE       the board ID is read before returning (the default)
+        INIT_TRUST       the board is assumed to be at busNumber / i2cAddress and the bus is not touched
+        INIT_BACKGROUND  the board ID is read on a background thread, see waitForInit()
         """        
         self.print("Loading ZeroBorg on bus {}, address {:02X}.".format(
             self._busNumber, self._i2cAddress))
 
-        self._bus=smbus.SMBus(self._busNumber)
+        self._closeBus()
+        if mode==INIT_TRUST:
+            self._foundChip=True
+        elif mode==INIT_BACKGROUND:
+            self._initDone.clear()
+            threading.Thread(target=self._probe, args=(tryOtherBus,), name="ZeroBorgInit", daemon=True).start()
+        else: self._probe(tryOtherBus)
+
+    def waitForInit(self, timeout=None):
+        """
+        found = waitForInit([timeout])
+        Waits for a background init() probe to finish, returns foundChip, or None if timeout seconds passed first
+        """
+        if not self._initDone.wait(timeout): return
+        return self._foundChip
+
+    def _probe(self, tryOtherBus):
         try:
-            i2cRecv=self._bus.read_i2c_block_data(self._i2cAddress, Command.GetID, I2C_NORM_LEN)
+            i2cRecv=self._read(Command.GetID, I2C_NORM_LEN)
             if len(i2cRecv)==I2C_NORM_LEN:
                 if i2cRecv[1]==I2C_ID_ZEROBORG:
                     self._foundChip=True
@@ -195,10 +454,33 @@ printFunction           Function reference to call when printing text, if None "
         if not self._foundChip:
             self.print("ZeroBorg not found.")
             if tryOtherBus:
-                self._busNumber=1 if self._busNumber==0 else 0
+                # With INIT_BACKGROUND callers may already be using the bus, the switch waits for the transaction
+                # in progress and anyone still queued on the old bus moves over, see _acquireBus
+                arbiter=self.getArbiter()
+                arbiter.acquire(BusArbiter.MOTOR)
+                try:
+                    self._busNumber=1 if self._busNumber==0 else 0
+                    self._closeBus()
+                finally: arbiter.release()
                 self.print("Trying bus number {} instead.".format(self._busNumber))
-                self.init(False)
-
+                self._probe(False)
+        self._initDone.set()
+
+    def _openBus(self):
+        # Opens the bus on first use, the instance lock is not taken as it may be held while waiting for the arbiter
+        with self._openLock:
+            if self._bus is None:
+                self._bus=(self._busFactory or openSMBus)(self._busNumber)
+                self._ownsBus=True
+            return self._bus
+
+    def _closeBus(self):
+        with self._openLock:
+            bus, self._bus=self._bus, None
+            if bus is not None and self._ownsBus:
+                try: bus.close()
+                except Exception: pass
+            self._ownsBus=True
 
     def print(self, message):
         """
@@ -216,17 +498,312 @@ printFunction           Function reference to call when printing text, if None "
         ZB.printFunction = ZB.NoPrint
         """ 
 
-    def _setMotor(self, motor, power):
-        pwm=int(PWM_MAX*power)        
-        if power<0:
+    @property
+    def busNumber(self): return self._busNumber
+    @busNumber.setter
+    def busNumber(self, value): self._busNumber=value
+
+    @property
+    def bus(self): return self._bus
+    @bus.setter
+    def bus(self, value):
+        self._bus=value
+        self._ownsBus=False
+
+    @property
+    def busFactory(self): return self._busFactory
+    @busFactory.setter
+    def busFactory(self, value): self._busFactory=value
+
+    @property
+    def i2cAddress(self): return self._i2cAddress
+    @i2cAddress.setter
+    def i2cAddress(self, value): self._i2cAddress=value
+
+    @property
+    def foundChip(self): return self._foundChip
+
+    @property
+    def printFunction(self): return self._printFunction
+    @printFunction.setter
+    def printFunction(self, value): self._printFunction=value
+
+    def setWriteCache(self, state, refresh=0.1, maxAge=0.0):
+        """
+        setWriteCache(state, [refresh], [maxAge])
+        Enables or disables the shadow register write cache, True to enable, False to disable.
+        While enabled, a motor, LED, LED IR, EPO ignore or failsafe write which would not change the register is skipped,
+        unless it was last sent more than refresh seconds ago (keep refresh below 0.25 when the communications failsafe is on).
+        Getters for those registers return the cached value without a bus read while it is younger than maxAge seconds,
+        a maxAge of 0 always reads the bus.
+        """
+        self._cacheEnabled=bool(state)
+        self._cacheRefresh=refresh
+        self._cacheMaxAge=maxAge
+
+    def getWriteCache(self):
+        """
+        state = getWriteCache()
+        Reads if the shadow register write cache is enabled, True for enabled, False for disabled
+        """
+        return self._cacheEnabled
+
+    writeCache=property(getWriteCache, setWriteCache)
+
+    def clearWriteCache(self):
+        """
+        clearWriteCache()
+        Forgets all shadow register values, the next write to each register is always sent
+        """
+        self._shadow.clear()
+
+    def setMetrics(self, metrics):
+        """
+        setMetrics(metrics)
+        Enables per command transaction metrics, True to start collecting into a new CommandMetrics,
+        a CommandMetrics instance to collect into it (e.g. to share one between boards), False or None to stop
+        """
+        if metrics is True: metrics=CommandMetrics()
+        self._metrics=metrics or None
+
+    def getMetrics(self):
+        """
+        metrics = getMetrics()
+        Returns the CommandMetrics collecting transaction metrics, None if metrics are disabled
+        """
+        return self._metrics
+
+    metrics=property(getMetrics, setMetrics)
+
+    def setRetryPolicy(self, policy):
+        """
+        setRetryPolicy(policy)
+        Sets the RetryPolicy used for every I\u00B2C transaction, None for a single attempt with no deadline
+        """
+        self._retryPolicy=RetryPolicy(0, deadline=None, reopenAfter=0) if policy is None else policy
+
+    def getRetryPolicy(self):
+        """
+        policy = getRetryPolicy()
+        Returns the RetryPolicy used for every I\u00B2C transaction
+        """
+        return self._retryPolicy
+
+    retryPolicy=property(getRetryPolicy, setRetryPolicy)
+
+    def setRaiseErrors(self, state):
+        """
+        setRaiseErrors(state)
+        Sets how failed transactions are reported, True to raise ZeroBorgError (or a subclass) from the failing call,
+        False to print a message and return None as usual
+        """
+        self._raiseErrors=bool(state)
+
+    def getRaiseErrors(self):
+        """
+        state = getRaiseErrors()
+        Reads if failed transactions raise ZeroBorgError, True, or print a message and return None, False
+        """
+        return self._raiseErrors
+
+    raiseErrors=property(getRaiseErrors, setRaiseErrors)
+
+    def _failed(self, message, error):
+        if self._raiseErrors:
+            if isinstance(error, ZeroBorgError): raise error
+            raise ZeroBorgError(message) from error
+        self.print(message)
+
+    def _reopenBus(self):
+        # Only a bus opened by init() can be reopened, one assigned directly is left alone.
+        # Called with the arbiter held, so no other transaction is using the old bus object.
+        with self._openLock:
+            if not self._ownsBus or self._bus is None: return
+            self.print("Reopening I\u00B2C bus {} after {} consecutive failures.".format(self._busNumber, self._failures))
+            try: self._bus.close()
+            except Exception: pass
+            self._bus=None
+            try: self._bus=(self._busFactory or openSMBus)(self._busNumber)
+            except Exception as e: self.print("Failed reopening I\u00B2C bus {}: {}".format(self._busNumber, e))
+            self._failures=0
+
+    def _arbitration(self, operation, command):
+        # Returns the BusArbiter priority class, the latest-wins coalescing key, the board whose motors the
+        # transaction drives and the board whose motors it stops
+        address=self._i2cAddress
+        if command==Command.AllOff: return BusArbiter.SAFETY, None, None, address
+        if command in _SAFETY_COMMANDS: return BusArbiter.SAFETY, None, None, None
+        if operation=="writeRegisters": return BusArbiter.MOTOR, None, address, None
+        if operation!="write_byte_data": return BusArbiter.TELEMETRY, None, None, None
+        if Command.SetAFwd<=command<=Command.SetDRev: return BusArbiter.MOTOR, (address, (command-Command.SetAFwd)//3), address, None
+        if command in (Command.SetAllFwd, Command.SetAllRev): return BusArbiter.MOTOR, (address, 4), address, None
+        return BusArbiter.MOTOR, None, None, None
+
+    def getArbiter(self):
+        """
+        arbiter = getArbiter()
+        Returns the BusArbiter shared by every ZeroBorg on this instance's I\u00B2C bus
+        """
+        if self._arbiterBus!=self._busNumber:
+            self._arbiter=BusArbiter.forBus(self._busNumber)
+            self._arbiterBus=self._busNumber
+        return self._arbiter
+
+    def _acquireBus(self, priority, key=None, drives=None, stops=None):
+        # Returns the held arbiter, or None if the request was dropped. init() may move the board to the other bus
+        # while a request waits, in which case it queues again on the new bus' arbiter.
+        while True:
+            arbiter=self.getArbiter()
+            if not arbiter.acquire(priority, key, drives, stops): return None
+            if arbiter is self.getArbiter(): return arbiter
+            arbiter.release()
+
+    def _transact(self, operation, command, args, byteCount):
+        policy=self._retryPolicy
+        priority, key, drives, stops=self._arbitration(operation, command)
+        started=time.monotonic()
+        attempt=0
+        while True:
+            # A queued motor write replaced by a newer one for the same motor, or by a stop, is dropped
+            arbiter=self._acquireBus(priority, key, drives, stops)
+            if arbiter is None: return
+            key=None
+            metrics=self._metrics
+            if metrics is not None: attemptStarted=time.perf_counter()
+            try:
+                bus=self._bus
+                if bus is None: bus=self._openBus()
+                call=getattr(bus, operation, None)
+                if call is None: result=getattr(Transport, operation)(bus, self._i2cAddress, *args) # Plain smbus object
+                else: result=call(self._i2cAddress, *args)
+                if byteCount is None:
+                    if result is None or len(result)<args[1]:
+                        raise ZeroBorgReplyError("Short reply to command {:02X} from {:02X}".format(
+                            command, self._i2cAddress))
+                    count=1+len(result)
+                else: count=byteCount
+            except Exception as e:
+                error=e
+                if metrics is not None: metrics.record(command, time.perf_counter()-attemptStarted, 1, e)
+                self._failures+=1
+                if policy.reopenAfter and self._failures>=policy.reopenAfter: self._reopenBus()
+            else:
+                if metrics is not None: metrics.record(command, time.perf_counter()-attemptStarted, count)
+                self._failures=0
+                return result
+            finally: arbiter.release()
+
+            if attempt>=policy.retries:
+                if isinstance(error, ZeroBorgError): raise error
+                raise ZeroBorgIOError("I\u00B2C transaction {:02X} with {:02X} failed after {} attempt(s): {}".format(
+                    command, self._i2cAddress, attempt+1, error)) from error
+
+            delay=policy.delay(attempt)
+            if policy.deadline is not None and time.monotonic()+delay-started>policy.deadline:
+                raise ZeroBorgTimeoutError("I\u00B2C transaction {:02X} with {:02X} missed its {:.3f} s deadline: {}".format(
+                    command, self._i2cAddress, policy.deadline, error)) from error
+            if delay>0: time.sleep(delay)
+            attempt+=1
+
+    def _read(self, command, length):
+        return self._transact("read_i2c_block_data", command, (command, length), None)
+
+    def _readMany(self, reads):
+        # Reads several registers in one combined transaction when the transport supports it
+        replies=self._transact("readRegisters", reads[0][0], (reads,), sum(1+length for command, length in reads))
+        for (command, length), reply in zip(reads, replies):
+            if reply is None or len(reply)<length:
+                raise ZeroBorgReplyError("Short reply to command {:02X} from {:02X}".format(command, self._i2cAddress))
+        return replies
+
+    def _write(self, command, value):
+        self._transact("write_byte_data", command, (command, value), 2)
+        self._wrote(command, time.monotonic())
+
+    def _writeMany(self, writes):
+        # Sends several writes in one combined transaction when the transport supports it
+        if len(writes)==1: return self._write(*writes[0])
+        self._transact("writeRegisters", writes[0][0], (writes,), 2*len(writes))
+        now=time.monotonic()
+        for command, value in writes: self._wrote(command, now)
+
+    def _wrote(self, command, now):
+        self._lastWrite=now
+        fields=_WRITE_FIELDS.get(command)
+        if fields is not None:
+            # Refreshed readings of the fields this write changed are stale now
+            times=self._state.times
+            for field in fields:
+                times.pop(field, None)
+                self._written[field]=now
+
+    def _isCurrent(self, register, command, value, now):
+        if not self._cacheEnabled: return False
+        entry=self._shadow.get(register)
+        return (entry is not None and entry[0]==command and entry[1]==value
+            and now-entry[2]<self._cacheRefresh)
+
+    def _writeCached(self, command, value, register=None):
+        # The shadow is updated before the write so the instance lock is not held while waiting for the bus,
+        # letting the arbiter coalesce queued motor writes and put safety commands first
+        if register is None: register=command
+        with self._lock:
+            now=time.monotonic()
+            if self._isCurrent(register, command, value, now): return False
+            entry=self._shadow[register]=[command, value, now, now]
+
+        try: self._write(command, value)
+        except:
+            self._forget((register,), entry)
+            raise
+        return True
+
+    def _writeAll(self, command, value):
+        # SetAllFwd, SetAllRev and AllOff set all four motor registers at once
+        reverse=1 if command==Command.SetAllRev else 0
+        with self._lock:
+            now=time.monotonic()
+            if command!=Command.AllOff and all(self._isCurrent(register, register+reverse, value, now)
+                    for register in self._MOTOR_REGISTERS):
+                return False
+            entry=[None, value, now, now]
+            for register in self._MOTOR_REGISTERS:
+                self._shadow[register]=[register+reverse, value, now, now]
+
+        try: self._write(command, value)
+        except:
+            self._forget(self._MOTOR_REGISTERS, entry)
+            raise
+        return True
+
+    def _forget(self, registers, entry):
+        # Drops shadow entries written by a failed write, unless a newer write has replaced them
+        with self._lock:
+            for register in registers:
+                current=self._shadow.get(register)
+                if current is not None and current[1:]==entry[1:]: del self._shadow[register]
+
+    def _cached(self, register):
+        if not self._cacheEnabled: return
+        entry=self._shadow.get(register)
+        if entry is not None and time.monotonic()-entry[3]<self._cacheMaxAge: return entry
+
+    def _motorCommand(self, motor, power):
+        pwm=int(PWM_MAX*power)
+        if pwm<0:
             motor+=1 # Reverse
             pwm=-pwm
-            
+
         if pwm>PWM_MAX: pwm=PWM_MAX
+        return motor, pwm
 
-        try: self._bus.write_byte_data(self._i2cAddress, motor, pwm)
-        except KeyboardInterrupt: raise
-        except: self.print("Failed setting motor drive level!")
+    def _setMotor(self, motor, power):
+        command, pwm=self._motorCommand(motor, power)
+
+        try:
+            if motor==Command.SetAllFwd: self._writeAll(command, pwm)
+            else: self._writeCached(command, pwm, motor)
+        except Exception as e: self._failed("Failed setting motor drive level!", e)
 
     def setMotor1(self, power):
         """
@@ -288,21 +865,92 @@ printFunction           Function reference to call when printing text, if None "
         """
         self._setMotor(Command.SetAllFwd, power)
 
+    def setMotorFrame(self, power1, power2, power3, power4):
+        """
+        count = setMotorFrame(power1, power2, power3, power4)
+        Sets the drive level for all four motors in a single call, each from +1 to -1.
+        The frame is sent with as few I\u00B2C transactions as possible: SetAllFwd / SetAllRev is used when it saves writes
+        and, with the write cache enabled, motors which are already at the requested level are skipped.
+        The writes are issued back to back while holding the bus arbiter to keep the skew between outputs small.
+        A frame still waiting for the bus when motorsOff() is called is dropped.
+        Returns the number of I\u00B2C transactions used (0 if the frame was dropped), or None if sending failed.
+        e.g.
+        setMotorFrame(0.5, 0.5, 0.5, 0.5)    -> 1 transaction (all motors forward at 50%)
+        setMotorFrame(0.5, 0.5, 0.5, -0.5)   -> 2 transactions (all motors forward, then motor 4 reverse)
+        setMotorFrame(0, 0.25, 0.5, 1)       -> 4 transactions
+        """
+        frame=[self._motorCommand(register, power)
+            for register, power in zip(self._MOTOR_REGISTERS, (power1, power2, power3, power4))]
+
+        try: return self._holdFrame(frame)
+        except Exception as e: self._failed("Failed setting motor drive levels!", e)
+
+    def _holdFrame(self, frame):
+        # The bus is taken before the instance lock, so a motorsOff() is never stuck behind a frame waiting for the
+        # bus, and a stop queued ahead of the frame drops it. A frame of None resends the shadow registers.
+        arbiter=self._acquireBus(BusArbiter.MOTOR, None, self._i2cAddress)
+        if arbiter is None: return 0
+        try:
+            with self._lock:
+                if frame is not None: return self._sendFrame(frame)
+                # Read under the bus so a stop sent while waiting is what gets resent.
+                # Motors which have never been commanded are assumed to still be off
+                frame=[]
+                for register in self._MOTOR_REGISTERS:
+                    entry=self._shadow.get(register)
+                    frame.append((register, 0) if entry is None else (entry[0], entry[1]))
+                return self._sendFrame(frame, True)
+        finally: arbiter.release()
+
+    def _sendFrame(self, frame, force=False):
+        # frame holds a (command, pwm) pair per motor register, force resends registers the cache holds
+        count=0
+        now=time.monotonic()
+        pending=[(register, command, pwm) for register, (command, pwm) in zip(self._MOTOR_REGISTERS, frame)
+            if force or not self._isCurrent(register, command, pwm, now)]
+        if not pending: return 0
+
+        # Setting all motors first pays off when enough of the frame shares one level
+        levels=[(command-register, pwm) for register, (command, pwm) in zip(self._MOTOR_REGISTERS, frame)]
+        common=max(set(levels), key=levels.count)
+        writes=[]
+        if 1+len(levels)-levels.count(common)<len(pending):
+            writes.append((Command.SetAllFwd+common[0], common[1]))
+            pending=[(register, register+reverse, pwm)
+                for register, (reverse, pwm) in zip(self._MOTOR_REGISTERS, levels) if (reverse, pwm)!=common]
+        writes.extend((command, pwm) for register, command, pwm in pending)
+
+        # A transport with combined transactions sends the whole frame in one go
+        self._writeMany(writes)
+        if len(writes)>len(pending):
+            for register in self._MOTOR_REGISTERS:
+                self._shadow[register]=[register+common[0], common[1], now, now]
+        for register, command, pwm in pending: self._shadow[register]=[command, pwm, now, now]
+
+        return len(writes)
+
+    def _resendMotors(self):
+        return self._holdFrame(None)
+
     def motorsOff(self):
         """
         motorsOff()
         Sets all motors to stopped, useful when ending a program
         """
-        try: self._bus.write_byte_data(self._i2cAddress, Command.AllOff, 0)
-        except KeyboardInterrupt: raise
-        except: self.print("Failed sending motors off command!")
+        try: self._writeAll(Command.AllOff, 0)
+        except Exception as e: self._failed("Failed sending motors off command!", e)
 
     def _getMotor(self, motor):
-        try: i2cRecv=self._bus.read_i2c_block_data(self._i2cAddress, motor, I2C_NORM_LEN)
-        except KeyboardInterrupt: raise
-        except:
-            self.print("Failed reading motor drive level!")
-            return
+        register=motor-2 # GetX -> SetXFwd
+        entry=self._cached(register)
+        if entry is not None:
+            power=float(entry[1])/float(PWM_MAX)
+            return power if entry[0]==register else -power
+        power=self._fresh(_MOTOR_FIELDS[motor])
+        if power is not None: return power
+
+        try: i2cRecv=self._read(motor, I2C_NORM_LEN)
+        except Exception as e: return self._failed("Failed reading motor drive level!", e)
 
         power=float(i2cRecv[2])/float(PWM_MAX)
         if i2cRecv[1]==Command.ValueFwd: return power
@@ -369,20 +1017,21 @@ printFunction           Function reference to call when printing text, if None "
         """        
         level=Command.ValueOn if state else Command.ValueOff
 
-        try: self._bus.write_byte_data(self._i2cAddress, Command.SetLED, level)
-        except KeyboardInterrupt: raise
-        except: self.print("Failed sending LED state!")
+        try: self._writeCached(Command.SetLED, level)
+        except Exception as e: self._failed("Failed sending LED state!", e)
 
     def getLED(self):
         """
         state = getLED()
         Reads the current state of the LED, False for off, True for on
         """
-        try: i2cRecv=self._bus.read_i2c_block_data(self._i2cAddress, Command.GetLED, I2C_NORM_LEN)
-        except KeyboardInterrupt: raise
-        except:
-            self.print("Failed reading LED state!")
-            return
+        entry=self._cached(Command.SetLED)
+        if entry is not None: return entry[1]!=Command.ValueOff
+        state=self._fresh("led")
+        if state is not None: return state
+
+        try: i2cRecv=self._read(Command.GetLED, I2C_NORM_LEN)
+        except Exception as e: return self._failed("Failed reading LED state!", e)
 
         return False if i2cRecv[1]==Command.ValueOff else True
 
@@ -393,9 +1042,8 @@ printFunction           Function reference to call when printing text, if None "
         resetEPO()
         Resets the EPO latch state, use to allow movement again after the EPO has been tripped
         """
-        try: self._bus.write_byte_data(self._i2cAddress, Command.ResetEPO, 0)
-        except KeyboardInterrupt: raise
-        except: self.print("Failed resetting EPO!")
+        try: self._write(Command.ResetEPO, 0)
+        except Exception as e: self._failed("Failed resetting EPO!", e)
 
     def getEPO(self):
         """
@@ -405,13 +1053,15 @@ printFunction           Function reference to call when printing text, if None "
         If True the EPO has been tripped, movement is disabled if the EPO is not ignored (see SetEpoIgnore)
             Movement can be re-enabled by calling ResetEpo.
         """
-        try: i2cRecv=self._bus.read_i2c_block_data(self._i2cAddress, Command.GetEPO, I2C_NORM_LEN)
-        except KeyboardInterrupt: raise
-        except:
-            self.print('Failed reading EPO ignore state!')
-            return
+        state=self._fresh("epo")
+        if state is not None: return state
 
-        return False if i2cRecv[1]==Command.ValueOff else True
+        try: i2cRecv=self._read(Command.GetEPO, I2C_NORM_LEN)
+        except Exception as e: return self._failed("Failed reading EPO state!", e)
+
+        state=_parseFlag(i2cRecv)
+        self._merge((("epo", state, time.monotonic()),))
+        return state
 
     def setEPOIgnore(self, state):
         """
@@ -420,21 +1070,23 @@ printFunction           Function reference to call when printing text, if None "
         """        
         level=Command.ValueOn if state else Command.ValueOff
 
-        try: self._bus.write_byte_data(self._i2cAddress, Command.SetEPOIgnore, level)
-        except KeyboardInterrupt: raise
-        except: self.print("Failed sending EPO ignore state!")
+        try: self._writeCached(Command.SetEPOIgnore, level)
+        except Exception as e: self._failed("Failed sending EPO ignore state!", e)
 
     def getEPOIgnore(self):
         """
         state = getEPOIgnore()
         Reads the system EPO ignore state, False for using the EPO latch, True for ignoring the EPO latch
         """
-        try: i2cRecv=self._bus.read_i2c_block_data(self._i2cAddress, Command.GetEPOIgnore, I2C_NORM_LEN)
-        except KeyboardInterrupt: raise
-        except:
-            self.print("Failed reading EPO ignore state!")
+        entry=self._cached(Command.SetEPOIgnore)
+        if entry is not None: return entry[1]!=Command.ValueOff
+        state=self._fresh("epoIgnore")
+        if state is not None: return state
 
-        return False if i2cRecv[1]==Command.ValueOff else False
+        try: i2cRecv=self._read(Command.GetEPOIgnore, I2C_NORM_LEN)
+        except Exception as e: return self._failed("Failed reading EPO ignore state!", e)
+
+        return False if i2cRecv[1]==Command.ValueOff else True
 
     epoIgnore=property(getEPOIgnore, setEPOIgnore)
 
@@ -445,31 +1097,59 @@ printFunction           Function reference to call when printing text, if None "
         If False there has been no messages to the IR sensor since the last read.
         If True there has been a new IR message which can be read using GetIrMessage().
         """
-        try: i2cRecv=self._bus.read_i2c_block_data(self._i2cAddress, Command.GetNewIR, I2C_NORM_LEN)
-        except KeyboardInterrupt: raise
-        except:
-            self.print("Failed reading new IR message received flag!")
-            return
+        try: i2cRecv=self._read(Command.GetNewIR, I2C_NORM_LEN)
+        except Exception as e: return self._failed("Failed reading new IR message received flag!", e)
 
         return False if i2cRecv[1]==Command.ValueOff else True
 
+    def _readIR(self):
+        try: i2cRecv=self._read(Command.GetLastIR, I2C_LONG_LEN)
+        except Exception as e: return self._failed("Failed reading IR message", e)
+
+        payload=self._lastIR=bytes(i2cRecv[1:IR_MAX_BYTES+1])
+        return payload
+
     def getIRMessage(self):
         """
         message = getIRMessage()
         Reads the last IR message which has been received and clears the new IR message received flag.
         Returns the bytes from the remote control as a hexadecimal string, e.g. 'F75AD5AA8000'
+        Trailing zero digits are removed, use getIRBytes() to get the message without losing any.
         Use HasNewIrMessage() to see if there has been a new IR message since the last call.
         """
-        try: i2cRecv=self._bus.read_i2c_block_data(self._i2cAddress, Command.GetLastIR, I2C_LONG_LEN)
-        except KeyboardInterrupt: raise
-        except:
-            self.print("Failed reading IR message")
+        payload=self._readIR()
+        if payload is None: return
+
+        return payload.hex().upper().rstrip('0')
+
+    def getIRBytes(self):
+        """
+        payload = getIRBytes()
+        Reads the last IR message which has been received and clears the new IR message received flag.
+        Returns all 22 bytes of the message as bytes, including any trailing zeros.
+        """
+        return self._readIR()
+
+    def readNewIR(self):
+        """
+        payload = readNewIR()
+        Reads the new IR message received flag and, only if it is set, the message itself.
+        Returns the message as getIRBytes() does, None if there is no new message.
+        With a combined transport (see Transport.combined) the flag and the message are read in one transaction.
+        """
+        bus=self._bus
+        if bus is None or not getattr(bus, "combined", False):
+            if self.hasNewIRMessage(): return self._readIR()
             return
 
-        message=''
-        for i in range(IR_MAX_BYTES): message+='{:02X}'.format(i2cRecv[i+1])
-        return message.rstrip('0')
-            
+        try: flag, i2cRecv=self._readMany(((Command.GetNewIR, I2C_NORM_LEN), (Command.GetLastIR, I2C_LONG_LEN)))
+        except Exception as e: return self._failed("Failed reading IR message", e)
+
+        # A message arriving between the two reads is caught by comparing it with the last one returned
+        payload=bytes(i2cRecv[1:IR_MAX_BYTES+1])
+        last, self._lastIR=self._lastIR, payload
+        if flag[1]!=Command.ValueOff or (last is not None and payload!=last): return payload
+
     def setLEDIR(self, state):
         """
         setLEDIR(state)
@@ -477,35 +1157,41 @@ printFunction           Function reference to call when printing text, if None "
         """
         level=Command.ValueOn if state else Command.ValueOff
 
-        try: self._bus.write_byte_data(self._i2cAddress, Command.SetLEDIR, level)
-        except KeyboardInterrupt: raise
-        except: self.print("Failed sending LED state!")
+        try: self._writeCached(Command.SetLEDIR, level)
+        except Exception as e: self._failed("Failed sending LED state!", e)
 
     def getLEDIR(self):
         """
         state = getLEDIR()
         Reads if IR messages control the state of the LED, False for no effect, True for incoming messages blink the LED
         """
-        try: i2cRecv=self._bus.read_i2c_block_data(self._i2cAddress, Command.GetLEDIR, I2C_NORM_LEN)
-        except KeyboardInterrupt: raise
-        except: 
-            self.print("Failed reading LED state!")
-            return
+        entry=self._cached(Command.SetLEDIR)
+        if entry is not None: return entry[1]!=Command.ValueOff
+        state=self._fresh("ledIR")
+        if state is not None: return state
+
+        try: i2cRecv=self._read(Command.GetLEDIR, I2C_NORM_LEN)
+        except Exception as e: return self._failed("Failed reading LED state!", e)
 
         return False if i2cRecv[1]==Command.ValueOff else True
 
     ledIR=property(getLEDIR, setLEDIR)
 
+    def _getAnalogRaw(self, analog):
+        try: i2cRecv=self._read(analog, I2C_NORM_LEN)
+        except Exception as e: return self._failed("Failed reading analog level!", e)
+
+        return (i2cRecv[1]<<8)+i2cRecv[2]
+
     def _getAnalog(self, analog):
-        try: i2cRecv=self._bus.read_i2c_block_data(self._i2cAddress, analog, I2C_NORM_LEN)
-        except KeyboardInterrupt: raise
-        except:
-            self.print("Failed reading analog level!")
-            return
+        voltage=self._fresh("analog1" if analog==Command.GetAnalog1 else "analog2")
+        if voltage is not None: return voltage
+
+        raw=self._getAnalogRaw(analog)
+        if raw is None: return
 
-        raw=(i2cRecv[1]<<8)+i2cRecv[2]
         level=float(raw)/float(Command.AnalogMax)
-        return level*3.3
+        return level*ANALOG_VREF
 
     def getAnalog1(self):
         """
@@ -523,6 +1209,13 @@ printFunction           Function reference to call when printing text, if None "
         """        
         return self._getAnalog(Command.GetAnalog2)
 
+    def getAnalogRaw(self, port):
+        """
+        raw = getAnalogRaw(port)
+        Reads the current analog level from port #1 (pin 2) or port #2 (pin 4) as the raw 10-bit reading, 0 to 1023.
+        """
+        return self._getAnalogRaw(Command.GetAnalog1 if port==1 else Command.GetAnalog2)
+
     def setCommsFailSafe(self, state):
         """
         setCommsFailsafe(state)
@@ -533,9 +1226,8 @@ printFunction           Function reference to call when printing text, if None "
         """
         level=Command.ValueOn if state else Command.ValueOff
 
-        try: self._bus.write_byte_data(self._i2cAddress, Command.SetFailSafe, level)
-        except KeyboardInterrupt: raise
-        except: self.print("Failed sending communications failsafe state!")
+        try: self._writeCached(Command.SetFailSafe, level)
+        except Exception as e: self._failed("Failed sending communications failsafe state!", e)
 
     def getCommsFailSafe(self):
         """
@@ -543,16 +1235,135 @@ printFunction           Function reference to call when printing text, if None "
         Read the current system state of the communications failsafe, True for enabled, False for disabled
         The failsafe will turn the motors off unless it is commanded at least once every 1/4 of a second
         """
-        try: i2cRecv=self._bus.read_i2c_block_data(self._i2cAddress, Command.GetFailSafe, I2C_NORM_LEN)
-        except KeyboardInterrupt: raise
-        except:
-            self.print("Failed reading communications failsafe state!")
-            return
+        entry=self._cached(Command.SetFailSafe)
+        if entry is not None: return entry[1]!=Command.ValueOff
+        state=self._fresh("commsFailSafe")
+        if state is not None: return state
+
+        try: i2cRecv=self._read(Command.GetFailSafe, I2C_NORM_LEN)
+        except Exception as e: return self._failed("Failed reading communications failsafe state!", e)
 
         return False if i2cRecv[1]==Command.ValueOff else True
 
     commsFailSafe=property(getCommsFailSafe, setCommsFailSafe)
 
+    def _fresh(self, field):
+        # Returns a field read by the state refresher if it is younger than its TTL, None otherwise
+        ttl=self._stateTTL.get(field)
+        if ttl is None: return
+        state=self._state
+        stamp=state.times.get(field)
+        if stamp is not None and time.monotonic()-stamp<ttl: return getattr(state, field)
+
+    def _readFields(self, fields):
+        # Reads fields one after another, then records them all at once. Each read takes the bus on its own so
+        # safety commands and motor writes get in between, and retry backoff never sleeps with the bus held.
+        # A write landing between two reads is caught by _merge, which drops readings older than the write.
+        readings=[]
+        for field in fields:
+            command, length, parse=_STATE_READS[field]
+            i2cRecv=self._read(command, length)
+            readings.append((field, parse(i2cRecv), time.monotonic()))
+        self._merge(readings)
+
+    def _merge(self, readings):
+        state=self._state
+        with self._stateLock:
+            epo=state.epo
+            for field, value, stamp in readings:
+                if stamp<self._written.get(field, 0.0): continue # Overtaken by a write
+                setattr(state, field, value)
+                state.times[field]=stamp
+            changed=state.epo!=epo and (epo is not None or state.epo)
+
+        if changed:
+            callback=self._epoTripped if state.epo else self._epoCleared
+            if callback is not None:
+                try: callback(self)
+                except KeyboardInterrupt: raise
+                except Exception as e: self.print("EPO callback failed: {}".format(e))
+
+    def readState(self):
+        """
+        state = readState()
+        Reads the motor levels, LED, EPO, EPO ignore, communications failsafe, LED IR and analog states in one pass.
+        Safety commands and motor writes are not held up by the pass. Returns a BoardState, or None if reading failed.
+        """
+        try: self._readFields(BoardState.FIELDS)
+        except Exception as e: return self._failed("Failed reading board state!", e)
+
+        with self._stateLock: return self._state.copy()
+
+    def getState(self):
+        """
+        state = getState()
+        Returns a BoardState holding the latest reading of every field, from readState, the state refresher or getEPO,
+        without touching the bus. Fields never read are None, check state.times for their age.
+        """
+        with self._stateLock: return self._state.copy()
+
+    def setEPOCallbacks(self, tripped=None, cleared=None):
+        """
+        setEPOCallbacks([tripped], [cleared])
+        Sets the functions called as callback(zeroBorg) when a read of the EPO state finds it has been tripped or cleared.
+        Changes are seen by readState, getEPO and the state refresher, run startStateRefresh to have them watched for you.
+        """
+        self._epoTripped=tripped
+        self._epoCleared=cleared
+
+    def startStateRefresh(self, ttls=None):
+        """
+        refresher = startStateRefresh([ttls])
+        Starts a background thread which keeps every BoardState field younger than its TTL in seconds.
+        ttls is a dictionary of field name to TTL overriding StateRefresher.TTLS, a TTL of None stops a field being refreshed.
+        Until stopStateRefresh is called the getters answer from the refreshed readings. Returns the StateRefresher object.
+        """
+        self.stopStateRefresh()
+        refresher=StateRefresher(self, ttls)
+        self._stateTTL=refresher.ttls
+        refresher.start()
+        self._refresher=refresher
+        return refresher
+
+    def stopStateRefresh(self):
+        """
+        stopStateRefresh()
+        Stops the background state refresher, if running, the getters read the bus again
+        """
+        refresher, self._refresher=self._refresher, None
+        self._stateTTL={}
+        if refresher is not None: refresher.stop()
+
+    def startKeepAlive(self, interval=0.1):
+        """
+        keepAlive = startKeepAlive([interval])
+        Starts a background thread which keeps the communications failsafe satisfied.
+        If no motor, LED or other command has been sent for interval seconds the last commanded motor levels are sent again,
+        so a busy main thread cannot let the failsafe stop the motors. Returns the KeepAlive object.
+        """
+        self.stopKeepAlive()
+        keepAlive=KeepAlive(self, interval)
+        keepAlive.start()
+        self._keepAlive=keepAlive
+        return keepAlive
+
+    def stopKeepAlive(self):
+        """
+        stopKeepAlive()
+        Stops the background failsafe keep alive thread, if running
+        """
+        keepAlive, self._keepAlive=self._keepAlive, None
+        if keepAlive is not None: keepAlive.stop()
+
+    def getKeepAliveStats(self):
+        """
+        stats = getKeepAliveStats()
+        Reads the timing statistics of the failsafe keep alive thread as a dictionary, None if it is not running.
+        See KeepAlive.getStats() for the fields.
+        """
+        keepAlive=self._keepAlive
+        return None if keepAlive is None else keepAlive.getStats()
+
     @classmethod
     def help(cls):
         """
@@ -569,5 +1380,724 @@ printFunction           Function reference to call when printing text, if None "
             print("=== {} === {}".format(f.__name__, f.__doc__))
 
 
+class CommandMetrics(object):
+    """
+Per command counters, latency histograms and error accounting for ZeroBorg I\u00B2C transactions
+Enable with ZeroBorg.setMetrics(True), one instance can be shared between several boards.
+LATENCY_BUCKETS         Upper bounds, in seconds, of the latency histogram buckets, the last bucket is unbounded
+    """
+
+    LATENCY_BUCKETS=(50e-6, 100e-6, 200e-6, 500e-6, 1e-3, 2e-3, 5e-3, 10e-3, 20e-3, 50e-3)
+
+    def __init__(self):
+        self._lock=threading.Lock()
+        self._commands={}
+        self._exporters=[]
+        self._exportThread=None
+        self._exportStop=threading.Event()
+        self._since=time.time()
+
+    def record(self, command, latency, byteCount, error=None):
+        """
+        record(command, latency, byteCount, [error])
+        Records one transaction, called by ZeroBorg for every bus read and write while metrics are enabled
+        """
+        bucket=bisect.bisect_left(self.LATENCY_BUCKETS, latency)
+        with self._lock:
+            entry=self._commands.get(command)
+            if entry is None:
+                # calls, failed, bytes, total latency, max latency, histogram, errors by type
+                entry=self._commands[command]=[0, 0, 0, 0.0, 0.0, [0]*(len(self.LATENCY_BUCKETS)+1), {}]
+            entry[0]+=1
+            entry[2]+=byteCount
+            entry[3]+=latency
+            if latency>entry[4]: entry[4]=latency
+            entry[5][bucket]+=1
+            if error is not None:
+                entry[1]+=1
+                name=type(error).__name__
+                entry[6][name]=entry[6].get(name, 0)+1
+
+    def snapshot(self, reset=False):
+        """
+        metrics = snapshot([reset])
+        Returns the metrics collected so far as a dictionary keyed by command name, each holding
+        calls, succeeded, failed, errors (count by exception type), bytes, latencyTotal, latencyMean,
+        latencyMax (seconds) and histogram (counts per LATENCY_BUCKETS bucket, then the overflow bucket).
+        The "since" key holds the wall clock time collection started. If reset is True the metrics are cleared.
+        """
+        with self._lock:
+            commands, since=self._commands, self._since
+            if reset: self._commands, self._since={}, time.time()
+            else: commands={command: [entry[0], entry[1], entry[2], entry[3], entry[4], list(entry[5]), dict(entry[6])]
+                for command, entry in commands.items()}
+
+        result={"since": since}
+        for command, (calls, failed, byteCount, total, worst, histogram, errors) in commands.items():
+            name=command.name if isinstance(command, Command) else str(command)
+            result[name]={
+                "calls": calls,
+                "succeeded": calls-failed,
+                "failed": failed,
+                "errors": errors,
+                "bytes": byteCount,
+                "latencyTotal": total,
+                "latencyMean": total/calls,
+                "latencyMax": worst,
+                "histogram": histogram,
+            }
+        return result
+
+    def reset(self):
+        """
+        reset()
+        Clears all collected metrics
+        """
+        self.snapshot(True)
+
+    def addExporter(self, exporter):
+        """
+        addExporter(exporter)
+        Adds a function which export() calls with each snapshot, e.g. to forward metrics to a telemetry pipeline
+        """
+        self._exporters.append(exporter)
+
+    def removeExporter(self, exporter):
+        """
+        removeExporter(exporter)
+        Removes an exporter added by addExporter()
+        """
+        self._exporters.remove(exporter)
+
+    def export(self, reset=False):
+        """
+        metrics = export([reset])
+        Takes a snapshot, passes it to every exporter and returns it
+        """
+        metrics=self.snapshot(reset)
+        for exporter in list(self._exporters):
+            try: exporter(metrics)
+            except KeyboardInterrupt: raise
+            except Exception as e: logger.warning("ZeroBorg metrics exporter failed: {}".format(e))
+        return metrics
+
+    def startExporting(self, interval=10.0, reset=True):
+        """
+        startExporting([interval], [reset])
+        Calls export(reset) every interval seconds on a background thread
+        """
+        self.stopExporting()
+        self._exportStop.clear()
+        self._exportThread=threading.Thread(target=self._exportLoop, args=(interval, reset),
+            name="ZeroBorgMetricsExport", daemon=True)
+        self._exportThread.start()
+
+    def stopExporting(self):
+        """
+        stopExporting()
+        Stops the background export thread, if running
+        """
+        if self._exportThread is None: return
+        self._exportStop.set()
+        self._exportThread.join()
+        self._exportThread=None
+
+    def _exportLoop(self, interval, reset):
+        deadline=time.monotonic()+interval
+        while not self._exportStop.wait(max(0.0, deadline-time.monotonic())):
+            self.export(reset)
+            deadline+=interval
+
+
+class Scheduler(object):
+    """
+Deadline clock for the fixed rate background threads, on the monotonic clock so it cannot drift with wall clock changes
+interval                Seconds between deadlines
+stopEvent               threading.Event which ends a wait early when it is set
+start                   First deadline, as a time.monotonic() value, now if None
+deadline                The current deadline, a thread may also set it directly
+A loop runs its work, calls advance() to move to the next deadline and then wait(). Deadlines which have already
+passed are skipped, and counted, rather than run late in a burst.
+    """
+
+    def __init__(self, interval, stopEvent, start=None):
+        self.interval=interval
+        self._stopEvent=stopEvent
+        self.deadline=time.monotonic() if start is None else start
+
+    def advance(self):
+        """
+        missed = advance()
+        Moves the deadline on by one interval, then on past any deadlines already missed, and returns how many were missed
+        """
+        interval=self.interval
+        self.deadline+=interval
+        late=time.monotonic()-self.deadline
+        if late<=0: return 0
+        missed=int(late/interval)+1
+        self.deadline+=missed*interval
+        return missed
+
+    def wait(self):
+        """
+        stopped = wait()
+        Waits until the deadline, returns True if stopEvent was set first (or already), False otherwise
+        """
+        while True:
+            remaining=self.deadline-time.monotonic()
+            if remaining<=0: return self._stopEvent.is_set()
+            if self._stopEvent.wait(remaining): return True
+
+class KeepAlive(object):
+    """
+Background thread which resends the last motor levels to keep the ZeroBorg communications failsafe satisfied
+zeroBorg                The ZeroBorg instance to keep alive
+interval                Seconds without a command before the motor levels are resent, keep below the 1/4 second failsafe
+timeout                 Gap between commands, in seconds, which counts as a missed deadline (the failsafe timeout)
+    """
+
+    def __init__(self, zeroBorg, interval=0.1, timeout=0.25):
+        self._zeroBorg=zeroBorg
+        self._interval=interval
+        self._timeout=timeout
+        self._thread=None
+        self._stopEvent=threading.Event()
+        self._statsLock=threading.Lock()
+        self.resetStats()
+
+    def start(self):
+        """
+        start()
+        Starts the keep alive thread
+        """
+        if self._thread is not None and self._thread.is_alive(): return
+        self._stopEvent.clear()
+        self._thread=threading.Thread(target=self._run, name="ZeroBorgKeepAlive", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        stop()
+        Stops the keep alive thread and waits for it to finish
+        """
+        self._stopEvent.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread=None
+
+    def isRunning(self):
+        """
+        state = isRunning()
+        True if the keep alive thread is running, False otherwise
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def resetStats(self):
+        """
+        resetStats()
+        Clears the timing statistics
+        """
+        with self._statsLock:
+            self._wakeups=0
+            self._resends=0
+            self._skipped=0
+            self._errors=0
+            self._missed=0
+            self._jitterTotal=0.0
+            self._jitterMax=0.0
+            self._gapMax=0.0
+
+    def getStats(self):
+        """
+        stats = getStats()
+        Returns the timing statistics as a dictionary:
+        wakeups         number of scheduled deadlines serviced
+        resends         deadlines where the motor levels had to be resent
+        skipped         deadlines where a real command had already been sent within the interval
+        errors          resends which failed on the bus
+        missed          deadlines where the gap between commands exceeded the failsafe timeout
+        jitterMean      mean lateness of the thread against its deadlines, in seconds
+        jitterMax       worst lateness of the thread against its deadlines, in seconds
+        gapMax          longest gap seen between commands, in seconds
+        """
+        with self._statsLock:
+            return {
+                "wakeups": self._wakeups,
+                "resends": self._resends,
+                "skipped": self._skipped,
+                "errors": self._errors,
+                "missed": self._missed,
+                "jitterMean": self._jitterTotal/self._wakeups if self._wakeups else 0.0,
+                "jitterMax": self._jitterMax,
+                "gapMax": self._gapMax,
+            }
+
+    def _run(self):
+        zeroBorg=self._zeroBorg
+        interval=self._interval
+        schedule=Scheduler(interval, self._stopEvent, max(zeroBorg._lastWrite, time.monotonic())+interval)
+        while True:
+            if schedule.wait(): return
+
+            now=time.monotonic()
+            jitter=now-schedule.deadline
+            gap=now-zeroBorg._lastWrite
+            resend=gap>=interval
+            error=False
+            if resend:
+                try: zeroBorg._resendMotors()
+                except KeyboardInterrupt: raise
+                except:
+                    error=True
+                    zeroBorg.print("Failed sending failsafe keep alive!")
+
+            with self._statsLock:
+                self._wakeups+=1
+                self._jitterTotal+=jitter
+                if jitter>self._jitterMax: self._jitterMax=jitter
+                if gap>self._gapMax: self._gapMax=gap
+                if gap>self._timeout: self._missed+=1
+                if error: self._errors+=1
+                elif resend: self._resends+=1
+                else: self._skipped+=1
+
+            # Real commands push the next deadline back, resends keep a fixed cadence
+            if resend: schedule.deadline+=interval
+            else: schedule.deadline=zeroBorg._lastWrite+interval
+            if schedule.deadline<now: schedule.deadline=now+interval
+
+
+class BoardState(object):
+    """
+Readable state of a ZeroBorg, returned by ZeroBorg.readState() and ZeroBorg.getState()
+motor1 .. motor4        Drive levels, from +1 to -1
+led                     True if the LED is on
+epo                     True if the EPO latch has been tripped
+epoIgnore               True if the EPO latch is ignored
+commsFailSafe           True if the communications failsafe is enabled
+ledIR                   True if IR messages blink the LED
+analog1, analog2        Analog port voltages
+times                   Dictionary of field name to the time.monotonic() the field was read at
+    """
+
+    FIELDS=("motor1", "motor2", "motor3", "motor4", "led", "epo", "epoIgnore", "commsFailSafe", "ledIR",
+        "analog1", "analog2")
+    __slots__=FIELDS+("times",)
+
+    def __init__(self):
+        for field in self.FIELDS: setattr(self, field, None)
+        self.times={}
+
+    @property
+    def timestamp(self):
+        """time.monotonic() of the newest reading, None if nothing has been read"""
+        return max(self.times.values()) if self.times else None
+
+    def copy(self):
+        """
+        state = copy()
+        Returns an independent copy of the state
+        """
+        state=BoardState()
+        for field in self.FIELDS: setattr(state, field, getattr(self, field))
+        state.times=dict(self.times)
+        return state
+
+    def __repr__(self):
+        return "BoardState({})".format(", ".join("{}={!r}".format(field, getattr(self, field)) for field in self.FIELDS))
+
+class StateRefresher(object):
+    """
+Background thread which keeps a ZeroBorg's BoardState readings younger than a TTL per field
+zeroBorg                The ZeroBorg instance to read
+ttls                    Dictionary of field name to TTL in seconds, overriding TTLS, None stops a field being refreshed
+A field is read again once it has used REFRESH of its TTL, and every field due is read in the same pass.
+    """
+
+    TTLS={
+        "motor1": 0.25, "motor2": 0.25, "motor3": 0.25, "motor4": 0.25,
+        "led": 0.5, "epo": 0.05, "epoIgnore": 1.0, "commsFailSafe": 1.0, "ledIR": 1.0,
+        "analog1": 0.05, "analog2": 0.05,
+    }
+    REFRESH=0.75
+
+    def __init__(self, zeroBorg, ttls=None):
+        self._zeroBorg=zeroBorg
+        ttls=dict(self.TTLS, **(ttls or {}))
+        self.ttls={field: ttl for field, ttl in ttls.items() if ttl is not None}
+        self._thread=None
+        self._stopEvent=threading.Event()
+        self.resetStats()
+
+    def start(self):
+        """
+        start()
+        Starts the refresh thread
+        """
+        if self._thread is not None and self._thread.is_alive(): return
+        self._stopEvent.clear()
+        self._thread=threading.Thread(target=self._run, name="ZeroBorgStateRefresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        stop()
+        Stops the refresh thread and waits for it to finish
+        """
+        self._stopEvent.set()
+        if self._thread is not None and self._thread is not threading.current_thread(): self._thread.join()
+        self._thread=None
+
+    def isRunning(self):
+        """
+        state = isRunning()
+        True if the refresh thread is running, False otherwise
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def resetStats(self):
+        """
+        resetStats()
+        Clears the refresh statistics
+        """
+        self._passes=0
+        self._reads=0
+        self._errors=0
+
+    def getStats(self):
+        """
+        stats = getStats()
+        Returns the refresh statistics as a dictionary: passes made, fields read and passes which failed
+        """
+        return {"passes": self._passes, "reads": self._reads, "errors": self._errors}
+
+    def _run(self):
+        zeroBorg=self._zeroBorg
+        times=zeroBorg._state.times
+        refresh={field: ttl*self.REFRESH for field, ttl in self.ttls.items()}
+        if not refresh: return
+        while not self._stopEvent.is_set():
+            now=time.monotonic()
+            due=[field for field in BoardState.FIELDS if field in refresh and now-times.get(field, 0.0)>=refresh[field]]
+            if due:
+                try: zeroBorg._readFields(due)
+                except KeyboardInterrupt: raise
+                except Exception:
+                    self._errors+=1
+                    zeroBorg.print("Failed refreshing board state!")
+                    # Back off for the shortest TTL rather than retrying in a tight loop
+                    if self._stopEvent.wait(min(refresh.values())): return
+                    continue
+                self._passes+=1
+                self._reads+=len(due)
+
+            now=time.monotonic()
+            wake=min(times.get(field, 0.0)+delay for field, delay in refresh.items())
+            if self._stopEvent.wait(max(wake-now, 0.001)): return
+
+def _parseFlag(i2cRecv): return i2cRecv[1]!=Command.ValueOff
+
+def _parseMotor(i2cRecv):
+    power=float(i2cRecv[2])/float(PWM_MAX)
+    return -power if i2cRecv[1]==Command.ValueRev else power
+
+def _parseAnalog(i2cRecv): return float((i2cRecv[1]<<8)+i2cRecv[2])/float(Command.AnalogMax)*ANALOG_VREF
+
+# BoardState field -> (read command, reply length, reply parser)
+_STATE_READS={
+    "motor1": (Command.GetA, I2C_NORM_LEN, _parseMotor),
+    "motor2": (Command.GetB, I2C_NORM_LEN, _parseMotor),
+    "motor3": (Command.GetC, I2C_NORM_LEN, _parseMotor),
+    "motor4": (Command.GetD, I2C_NORM_LEN, _parseMotor),
+    "led": (Command.GetLED, I2C_NORM_LEN, _parseFlag),
+    "epo": (Command.GetEPO, I2C_NORM_LEN, _parseFlag),
+    "epoIgnore": (Command.GetEPOIgnore, I2C_NORM_LEN, _parseFlag),
+    "commsFailSafe": (Command.GetFailSafe, I2C_NORM_LEN, _parseFlag),
+    "ledIR": (Command.GetLEDIR, I2C_NORM_LEN, _parseFlag),
+    "analog1": (Command.GetAnalog1, I2C_NORM_LEN, _parseAnalog),
+    "analog2": (Command.GetAnalog2, I2C_NORM_LEN, _parseAnalog),
+}
+
+_MOTOR_FIELDS={Command.GetA: "motor1", Command.GetB: "motor2", Command.GetC: "motor3", Command.GetD: "motor4"}
+
+# Write command -> BoardState fields it changes
+_WRITE_FIELDS={
+    Command.SetAFwd: ("motor1",), Command.SetARev: ("motor1",),
+    Command.SetBFwd: ("motor2",), Command.SetBRev: ("motor2",),
+    Command.SetCFwd: ("motor3",), Command.SetCRev: ("motor3",),
+    Command.SetDFwd: ("motor4",), Command.SetDRev: ("motor4",),
+    Command.AllOff: ("motor1", "motor2", "motor3", "motor4"),
+    Command.SetAllFwd: ("motor1", "motor2", "motor3", "motor4"),
+    Command.SetAllRev: ("motor1", "motor2", "motor3", "motor4"),
+    Command.SetLED: ("led",),
+    Command.ResetEPO: ("epo",),
+    Command.SetEPOIgnore: ("epoIgnore",),
+    Command.SetFailSafe: ("commsFailSafe",),
+    Command.SetLEDIR: ("ledIR",),
+}
+
+# ResetEPO is not a safety command: it can let a motor run again, so it keeps its place behind earlier writes
+_SAFETY_COMMANDS=frozenset((Command.AllOff, Command.GetEPO))
+
+class _Waiter(object):
+    __slots__=("priority", "sequence", "key", "drives", "event", "state", "queued")
+
+    def __init__(self, priority, sequence, key, drives):
+        self.priority=priority
+        self.sequence=sequence
+        self.key=key
+        self.drives=drives
+        self.event=threading.Event()
+        self.state=BusArbiter._WAITING
+        self.queued=time.monotonic()
+
+    def __lt__(self, other): return (self.priority, self.sequence)<(other.priority, other.sequence)
+
+class BusArbiter(object):
+    """
+Serialises the transactions of every ZeroBorg on one I\u00B2C bus, granting the bus by priority class
+SAFETY                  AllOff and EPO reads, granted before anything else
+MOTOR                   Motor and other setting writes, including ResetEPO
+TELEMETRY               All other reads, granted last
+Within a class the bus is granted in arrival order. A queued motor write is dropped when a newer write for the
+same motor of the same board is queued behind it (latest wins), and every queued motor write for a board is dropped
+when a stop for that board is queued, so a stop jumping the queue is never followed by an older write.
+A transaction in progress is never interrupted.
+Use BusArbiter.forBus(busNumber) to get the arbiter shared by everything on a bus.
+    """
+
+    SAFETY=0
+    MOTOR=1
+    TELEMETRY=2
+
+    _WAITING=0
+    _GRANTED=1
+    _COALESCED=2
+
+    _arbiters={}
+    _arbitersLock=threading.Lock()
+
+    @classmethod
+    def forBus(cls, busNumber):
+        """
+        arbiter = BusArbiter.forBus(busNumber)
+        Returns the shared arbiter for busNumber, creating it if needed
+        """
+        with cls._arbitersLock:
+            arbiter=cls._arbiters.get(busNumber)
+            if arbiter is None: arbiter=cls._arbiters[busNumber]=cls()
+            return arbiter
+
+    def __init__(self):
+        self._lock=threading.Lock()
+        self._owner=None
+        self._depth=0
+        self._waiting=[]
+        self._queued=0
+        self._latest={}
+        self._sequence=0
+        self.resetStats()
+
+    def acquire(self, priority=MOTOR, key=None, drives=None, stops=None):
+        """
+        granted = acquire([priority], [key], [drives], [stops])
+        Waits for the bus, returns True once it is held or False if the request was superseded by a newer one
+        with the same key, or dropped by a stop. drives names the board whose motors the transaction sets and stops
+        the board whose motors it stops, queuing a stop drops every queued transaction driving the same board.
+        Acquiring again from the thread holding the bus nests. Every True must be matched by release().
+        """
+        thread=threading.get_ident()
+        with self._lock:
+            if stops is not None:
+                for queued in self._waiting:
+                    if queued.drives==stops and queued.state==self._WAITING:
+                        queued.state=self._COALESCED
+                        queued.event.set()
+                        self._queued-=1
+            if self._owner==thread:
+                self._depth+=1
+                return True
+            if self._owner is None and not self._waiting:
+                self._owner=thread
+                self._depth=1
+                self._granted[priority]+=1
+                return True
+
+            self._sequence+=1
+            waiter=_Waiter(priority, self._sequence, key, drives)
+            if key is not None:
+                previous=self._latest.get(key)
+                if previous is not None and previous.state==self._WAITING:
+                    previous.state=self._COALESCED
+                    previous.event.set()
+                    self._queued-=1
+                self._latest[key]=waiter
+            heapq.heappush(self._waiting, waiter)
+            self._queued+=1
+            if self._queued>self._maxDepth: self._maxDepth=self._queued
+
+        waiter.event.wait()
+        waited=time.monotonic()-waiter.queued
+        with self._lock:
+            if waiter.state==self._COALESCED:
+                self._coalesced+=1
+                return False
+            self._owner=thread
+            self._granted[priority]+=1
+            self._waitTotal[priority]+=waited
+            if waited>self._waitMax[priority]: self._waitMax[priority]=waited
+            self._contended[priority]+=1
+        return True
+
+    def release(self):
+        """
+        release()
+        Releases the bus, handing it to the highest priority waiter
+        """
+        with self._lock:
+            self._depth-=1
+            if self._depth>0: return
+
+            while self._waiting:
+                waiter=heapq.heappop(self._waiting)
+                if waiter.state==self._COALESCED: continue
+                if waiter.key is not None and self._latest.get(waiter.key) is waiter: del self._latest[waiter.key]
+                # The bus stays owned by the waiter until its thread wakes and records itself
+                waiter.state=self._GRANTED
+                self._queued-=1
+                self._owner=waiter
+                self._depth=1
+                waiter.event.set()
+                return
+            self._owner=None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def getQueueDepth(self):
+        """
+        depth = getQueueDepth()
+        Returns the number of transactions currently waiting for the bus
+        """
+        return self._queued
+
+    def resetStats(self):
+        """
+        resetStats()
+        Clears the arbitration statistics
+        """
+        self._granted=[0, 0, 0]
+        self._contended=[0, 0, 0]
+        self._waitTotal=[0.0, 0.0, 0.0]
+        self._waitMax=[0.0, 0.0, 0.0]
+        self._coalesced=0
+        self._maxDepth=0
+
+    def getStats(self):
+        """
+        stats = getStats()
+        Returns the arbitration statistics as a dictionary: queueDepth, maxQueueDepth, coalesced,
+        and for each of "safety", "motor" and "telemetry": granted, waited (grants which had to queue),
+        waitMean and waitMax in seconds
+        """
+        with self._lock:
+            stats={
+                "queueDepth": self._queued,
+                "maxQueueDepth": self._maxDepth,
+                "coalesced": self._coalesced,
+            }
+            for priority, name in enumerate(("safety", "motor", "telemetry")):
+                waited=self._contended[priority]
+                stats[name]={
+                    "granted": self._granted[priority],
+                    "waited": waited,
+                    "waitMean": self._waitTotal[priority]/waited if waited else 0.0,
+                    "waitMax": self._waitMax[priority],
+                }
+            return stats
+
+
+class BusWorker(object):
+    """
+Thread which runs queued calls against one I\u00B2C bus one at a time, in the order they were submitted
+busNumber               I\u00B2C bus whose transactions the worker serialises
+Use BusWorker.forBus(busNumber) to share one worker between everything driving the same bus.
+    """
+
+    _workers={}
+    _workersLock=threading.Lock()
+
+    @classmethod
+    def forBus(cls, busNumber):
+        """
+        worker = BusWorker.forBus(busNumber)
+        Returns the shared, running worker for busNumber, starting one if needed
+        """
+        with cls._workersLock:
+            worker=cls._workers.get(busNumber)
+            if worker is None or not worker.isRunning():
+                worker=cls._workers[busNumber]=cls(busNumber)
+                worker.start()
+            return worker
+
+    def __init__(self, busNumber):
+        self._busNumber=busNumber
+        self._queue=queue.SimpleQueue()
+        self._thread=None
+
+    @property
+    def busNumber(self): return self._busNumber
+
+    def start(self):
+        """
+        start()
+        Starts the worker thread
+        """
+        if self.isRunning(): return
+        self._thread=threading.Thread(target=self._run,
+            name="ZeroBorgBus{}".format(self._busNumber), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        stop()
+        Stops the worker once the calls already queued have run, and waits for it to finish
+        """
+        if self._thread is None: return
+        self._queue.put(None)
+        if self._thread is not threading.current_thread(): self._thread.join()
+        self._thread=None
+
+    def isRunning(self):
+        """
+        state = isRunning()
+        True if the worker thread is running, False otherwise
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, function, *args, **kwargs):
+        """
+        future = submit(function, *args, **kwargs)
+        Queues function(*args, **kwargs) to run on the worker thread, returns a concurrent.futures.Future for the result
+        """
+        future=concurrent.futures.Future()
+        self._queue.put((future, function, args, kwargs))
+        return future
+
+    def _run(self):
+        while True:
+            item=self._queue.get()
+            if item is None: return
+
+            future, function, args, kwargs=item
+            if not future.set_running_or_notify_cancel(): continue
+            try: future.set_result(function(*args, **kwargs))
+            except BaseException as e: future.set_exception(e)
+
+
 if __name__=="__main__":
     ZeroBorg.help()
\ No newline at end of file
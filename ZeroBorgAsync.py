@@ -0,0 +1,125 @@
+import asyncio, weakref
+
+import ZeroBorg
+
+_METHODS=(
+    "init",
+    "setMotor1", "setMotor2", "setMotor3", "setMotor4", "setMotors", "setMotorFrame", "motorsOff",
+    "getMotor1", "getMotor2", "getMotor3", "getMotor4",
+    "setLED", "getLED",
+    "resetEPO", "getEPO", "setEPOIgnore", "getEPOIgnore",
+    "hasNewIRMessage", "getIRMessage", "getIRBytes", "readNewIR", "setLEDIR", "getLEDIR",
+    "getAnalog1", "getAnalog2", "getAnalogRaw",
+    "setCommsFailSafe", "getCommsFailSafe", "readState",
+)
+
+class _LoopBus(object):
+    # Calls made on one bus during one event loop iteration are sent to the bus worker as a single batch,
+    # and their results come back to the loop in a single thread hop.
+
+    _buses=weakref.WeakKeyDictionary()
+
+    @classmethod
+    def get(cls, busNumber, loop):
+        buses=cls._buses.get(loop)
+        if buses is None: buses=cls._buses[loop]={}
+        bus=buses.get(busNumber)
+        if bus is None: bus=buses[busNumber]=cls(busNumber, loop)
+        return bus
+
+    def __init__(self, busNumber, loop):
+        self._busNumber=busNumber
+        self._loop=loop
+        self._pending=[]
+
+    def call(self, function, args):
+        future=self._loop.create_future()
+        if not self._pending: self._loop.call_soon(self._flush)
+        self._pending.append((future, function, args))
+        return future
+
+    def _flush(self):
+        batch, self._pending=self._pending, []
+        ZeroBorg.BusWorker.forBus(self._busNumber).submit(self._runBatch, batch)
+
+    def _runBatch(self, batch):
+        results=[]
+        for future, function, args in batch:
+            try: results.append((future, function(*args), None))
+            except BaseException as e: results.append((future, None, e))
+
+        try: self._loop.call_soon_threadsafe(self._resolve, results)
+        except RuntimeError: pass # Loop closed, nobody is waiting any more
+
+    @staticmethod
+    def _resolve(results):
+        for future, result, error in results:
+            if future.cancelled(): continue
+            if error is None: future.set_result(result)
+            else: future.set_exception(error)
+
+class AsyncZeroBorg(object):
+    """
+asyncio interface to a ZeroBorg, every getter and setter of ZeroBorg is available as a coroutine
+zeroBorg                The ZeroBorg instance to drive, a new one is created if None
+All boards on the same I\u00B2C bus share one BusWorker thread, and calls awaited during the same event loop
+iteration are queued to it together, so one event loop can drive several boards without a thread per call.
+    """
+
+    def __init__(self, zeroBorg=None):
+        self._zeroBorg=ZeroBorg.ZeroBorg() if zeroBorg is None else zeroBorg
+
+    @property
+    def zeroBorg(self): return self._zeroBorg
+
+    def _call(self, function, *args):
+        return _LoopBus.get(self._zeroBorg.busNumber, asyncio.get_running_loop()).call(function, args)
+
+    async def analogStream(self, analog=1, interval=0.1):
+        """
+        async for voltage in analogStream([analog], [interval]):
+        Yields the voltage of analog port #1 or #2 every interval seconds, keeping to a fixed schedule
+        """
+        getter=self._zeroBorg.getAnalog1 if analog==1 else self._zeroBorg.getAnalog2
+        loop=asyncio.get_running_loop()
+        deadline=loop.time()
+        while True:
+            yield await self._call(getter)
+            deadline+=interval
+            delay=deadline-loop.time()
+            if delay<0: deadline-=delay
+            await asyncio.sleep(max(delay, 0))
+
+    async def irMessages(self, interval=0.05):
+        """
+        async for message in irMessages([interval]):
+        Yields each new IR message as bytes, as returned by readNewIR(), polling the new message flag every interval seconds
+        """
+        while True:
+            message=await self._call(self._zeroBorg.readNewIR)
+            if message is not None: yield message
+            else: await asyncio.sleep(interval)
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various coroutines provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+def _asyncMethod(name):
+    function=getattr(ZeroBorg.ZeroBorg, name)
+
+    async def method(self, *args):
+        return await self._call(getattr(self._zeroBorg, name), *args)
+
+    method.__name__=method.__qualname__=name
+    method.__doc__=function.__doc__
+    return method
+
+for _name in _METHODS: setattr(AsyncZeroBorg, _name, _asyncMethod(_name))
+del _name
+
+if __name__=="__main__":
+    AsyncZeroBorg.help()
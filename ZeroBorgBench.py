@@ -0,0 +1,200 @@
+import time, sys, json, platform, argparse, tracemalloc, gc
+
+import ZeroBorg
+import ZeroBorgEmulator
+import ZeroBorgI2CDev
+
+class NullBus(object):
+    """
+Bus which answers every transaction immediately with a fixed reply, isolating the Python overhead of the driver
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._reply=[0, ZeroBorg.I2C_ID_ZEROBORG]+[0]*(ZeroBorg.I2C_LONG_LEN-2)
+
+    def read_i2c_block_data(self, address, command, length): return self._reply[:length]
+    def write_byte_data(self, address, command, value): pass
+    def read_byte(self, address): return 0
+    def close(self): pass
+
+def _emulator(options):
+    return ZeroBorgEmulator.ZeroBorgEmulator(latency=options.latency, jitter=options.jitter,
+        errorRate=options.errorRate, seed=0)
+
+BACKENDS={
+    "null": lambda options: NullBus(),
+    "emulator": _emulator,
+    "smbus": lambda options: ZeroBorg.openSMBus(options.busNumber),
+    "i2cdev": lambda options: ZeroBorgI2CDev.I2CDevTransport(options.busNumber),
+    "i2cdev-emulated": lambda options: ZeroBorgI2CDev.I2CDevTransport(options.busNumber,
+        ZeroBorgI2CDev.EmulatedFileLayer(_emulator(options))),
+}
+
+def _controlLoop(zb):
+    zb.setMotorFrame(0.5, 0.5, -0.25, -0.25)
+    zb.getAnalog1()
+    zb.readNewIR()
+
+def _cachedControlLoop(zb):
+    zb.setMotor1(0.5)
+    zb.setMotor2(0.5)
+    zb.setMotor3(-0.25)
+    zb.setMotor4(-0.25)
+    zb.getAnalog1()
+
+def _workloads():
+    # (name, function, arguments, setup) for every public method and the mixed control loops
+    Z=ZeroBorg.ZeroBorg
+    noCache=lambda zb: zb.setWriteCache(False)
+    return [
+        ("setMotor1", Z.setMotor1, (0.5,), noCache),
+        ("setMotor2", Z.setMotor2, (-0.5,), noCache),
+        ("setMotor3", Z.setMotor3, (0.25,), noCache),
+        ("setMotor4", Z.setMotor4, (-0.25,), noCache),
+        ("setMotors", Z.setMotors, (0.75,), noCache),
+        ("setMotorFrame", Z.setMotorFrame, (0.1, 0.2, 0.3, 0.4), noCache),
+        ("motorsOff", Z.motorsOff, (), noCache),
+        ("getMotor1", Z.getMotor1, (), noCache),
+        ("getMotor2", Z.getMotor2, (), noCache),
+        ("getMotor3", Z.getMotor3, (), noCache),
+        ("getMotor4", Z.getMotor4, (), noCache),
+        ("setLED", Z.setLED, (True,), noCache),
+        ("getLED", Z.getLED, (), noCache),
+        ("resetEPO", Z.resetEPO, (), noCache),
+        ("getEPO", Z.getEPO, (), noCache),
+        ("setEPOIgnore", Z.setEPOIgnore, (True,), noCache),
+        ("getEPOIgnore", Z.getEPOIgnore, (), noCache),
+        ("hasNewIRMessage", Z.hasNewIRMessage, (), noCache),
+        ("getIRMessage", Z.getIRMessage, (), noCache),
+        ("getIRBytes", Z.getIRBytes, (), noCache),
+        ("readNewIR", Z.readNewIR, (), noCache),
+        ("setLEDIR", Z.setLEDIR, (False,), noCache),
+        ("getLEDIR", Z.getLEDIR, (), noCache),
+        ("getAnalog1", Z.getAnalog1, (), noCache),
+        ("getAnalog2", Z.getAnalog2, (), noCache),
+        ("getAnalogRaw", Z.getAnalogRaw, (1,), noCache),
+        ("setCommsFailSafe", Z.setCommsFailSafe, (False,), noCache),
+        ("getCommsFailSafe", Z.getCommsFailSafe, (), noCache),
+        ("readState", Z.readState, (), noCache),
+        ("controlLoop", _controlLoop, (), noCache),
+        ("cachedControlLoop", _cachedControlLoop, (), lambda zb: zb.setWriteCache(True, 0.1)),
+        ("metricsControlLoop", _controlLoop, (), lambda zb: zb.setMetrics(True)),
+    ]
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered)-1, int(fraction*len(ordered)))]
+
+def runBenchmark(zb, function, args, iterations=2000, allocationCalls=200):
+    """
+    result = runBenchmark(zb, function, args, [iterations], [allocationCalls])
+    Times function(zb, *args) iterations times and returns a dictionary with opsPerSecond,
+    p50, p95, p99 and max latency in microseconds, and the mean bytes allocated per call
+    """
+    for i in range(min(100, iterations)): function(zb, *args)
+
+    timer=time.perf_counter_ns
+    samples=[0]*iterations
+    gcEnabled=gc.isenabled()
+    gc.disable()
+    try:
+        started=timer()
+        for i in range(iterations):
+            before=timer()
+            function(zb, *args)
+            samples[i]=timer()-before
+        total=timer()-started
+    finally:
+        if gcEnabled: gc.enable()
+
+    tracemalloc.start()
+    try:
+        allocated=0
+        for i in range(allocationCalls):
+            current=tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            function(zb, *args)
+            allocated+=tracemalloc.get_traced_memory()[1]-current
+    finally: tracemalloc.stop()
+
+    samples.sort()
+    return {
+        "opsPerSecond": iterations/(total/1e9),
+        "p50": _percentile(samples, 0.50)/1e3,
+        "p95": _percentile(samples, 0.95)/1e3,
+        "p99": _percentile(samples, 0.99)/1e3,
+        "max": samples[-1]/1e3,
+        "bytesPerCall": allocated/float(allocationCalls),
+    }
+
+def runSuite(busFactory, iterations=2000, names=None, printFunction=print):
+    """
+    results = runSuite(busFactory, [iterations], [names], [printFunction])
+    Runs every workload, or only those in names, against a ZeroBorg using busFactory() as its bus,
+    returns a dictionary of runBenchmark results keyed by workload name
+    """
+    results={}
+    for name, function, args, setup in _workloads():
+        if names and name not in names: continue
+        zb=ZeroBorg.ZeroBorg()
+        zb.printFunction=zb.noPrint
+        zb.bus=busFactory()
+        setup(zb)
+        results[name]=result=runBenchmark(zb, function, args, iterations)
+        if printFunction is not None:
+            printFunction("{:<20} {:>12.0f} ops/s  p50 {:>8.2f}us  p95 {:>8.2f}us  p99 {:>8.2f}us  {:>8.1f} B/call".format(
+                name, result["opsPerSecond"], result["p50"], result["p95"], result["p99"], result["bytesPerCall"]))
+    return results
+
+def compareResults(old, new, threshold=0.1, printFunction=print):
+    """
+    regressions = compareResults(old, new, [threshold], [printFunction])
+    Compares two runSuite result dictionaries, returns the names whose throughput dropped,
+    or whose p99 latency grew, by more than threshold (0.1 is 10%)
+    """
+    regressions=[]
+    for name in sorted(set(old)&set(new)):
+        speed=new[name]["opsPerSecond"]/old[name]["opsPerSecond"]
+        tail=new[name]["p99"]/old[name]["p99"] if old[name]["p99"] else 1.0
+        regressed=speed<1.0-threshold or tail>1.0+threshold
+        if regressed: regressions.append(name)
+        if printFunction is not None:
+            printFunction("{:<20} ops/s x{:.2f}  p99 x{:.2f}{}".format(name, speed, tail, "  REGRESSION" if regressed else ""))
+    return regressions
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description="Benchmark the ZeroBorg driver hot paths")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="null",
+        help="bus to run against (default: null, which measures driver overhead only)")
+    parser.add_argument("--busNumber", type=int, default=1, help="I\u00B2C bus for the smbus backend")
+    parser.add_argument("--latency", type=float, default=0.0, help="emulator latency per transaction in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="emulator jitter per transaction in seconds")
+    parser.add_argument("--errorRate", type=float, default=0.0, help="emulator error rate, 0 to 1")
+    parser.add_argument("--iterations", type=int, default=2000, help="timed calls per workload")
+    parser.add_argument("--only", nargs="*", help="workloads to run (default: all)")
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--compare", help="compare against results saved by an earlier --json run")
+    parser.add_argument("--threshold", type=float, default=0.1, help="regression threshold for --compare")
+    options=parser.parse_args(argv)
+
+    results=runSuite(lambda: BACKENDS[options.backend](options), options.iterations, options.only)
+    report={
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "backend": options.backend,
+        "iterations": options.iterations,
+        "time": time.time(),
+        "results": results,
+    }
+    if options.json:
+        with open(options.json, "w") as f: json.dump(report, f, indent=2)
+
+    if options.compare:
+        with open(options.compare) as f: old=json.load(f)
+        print()
+        if compareResults(old["results"], results, options.threshold): return 1
+    return 0
+
+
+if __name__=="__main__":
+    sys.exit(main())
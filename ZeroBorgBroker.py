@@ -0,0 +1,470 @@
+import time, sys, struct, threading, argparse, math
+from multiprocessing import shared_memory, resource_tracker
+
+import ZeroBorg
+
+DEFAULT_NAME="zeroborg"
+VERSION=2
+
+HEADER=struct.Struct("<4sBB2x")         # magic, version, number of command slots
+SEQUENCE=struct.Struct("<I")            # seqlock counter in front of the state and every command slot, odd while writing
+STATE=struct.Struct("<d4fB2fI22s")      # timestamp, motor powers, flags, analog voltages, IR message count, IR message
+SLOT=struct.Struct("<d4fB4III")         # timestamp, motor powers, LED, motor update counts, LED update count,
+                                        # motors off count
+MAGIC=b"ZBSM"
+
+FLAG_LED=0x01
+FLAG_EPO=0x02
+FLAG_EPO_IGNORE=0x04
+FLAG_COMMS_FAILSAFE=0x08
+FLAG_LED_IR=0x10
+
+READ_ATTEMPTS=100    # seqlock reads tried before giving up on a block whose writer died mid-write
+STALE_AFTER=1.0      # seconds without the state being published before an existing block is taken over
+
+_FLAGS=(("led", FLAG_LED), ("epo", FLAG_EPO), ("epoIgnore", FLAG_EPO_IGNORE), ("commsFailSafe", FLAG_COMMS_FAILSAFE),
+    ("ledIR", FLAG_LED_IR))
+
+STATE_OFFSET=HEADER.size
+SLOTS_OFFSET=STATE_OFFSET+SEQUENCE.size+STATE.size
+SLOT_SIZE=SEQUENCE.size+SLOT.size
+
+# Blocks created by brokers in this process, which stay registered with the resource tracker
+_created=set()
+
+def _attach(name):
+    # Attaching must not register the segment for cleanup, or it is unlinked when the client exits
+    try: return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        memory=shared_memory.SharedMemory(name=name)
+        if name not in _created: resource_tracker.unregister(memory._name, "shared_memory")
+        return memory
+
+def _writeLocked(buffer, offset, layout, *values):
+    # Seqlock write, only ever called by the one writer of the block
+    sequence=SEQUENCE.unpack_from(buffer, offset)[0]
+    SEQUENCE.pack_into(buffer, offset, (sequence+1)&0xFFFFFFFF)
+    layout.pack_into(buffer, offset+SEQUENCE.size, *values)
+    SEQUENCE.pack_into(buffer, offset, (sequence+2)&0xFFFFFFFF)
+
+def _readLocked(buffer, offset, layout):
+    # Seqlock read, retried until no write overlapped it. Returns None if every attempt overlapped a write,
+    # which also happens when the writer died between the two sequence updates
+    for attempt in range(READ_ATTEMPTS):
+        before=SEQUENCE.unpack_from(buffer, offset)[0]
+        if not before&1:
+            values=layout.unpack_from(buffer, offset+SEQUENCE.size)
+            if SEQUENCE.unpack_from(buffer, offset)[0]==before: return before, values
+        time.sleep(0) # Let the writer run
+
+def _isLive(memory):
+    # A running broker publishes the state every pass, an existing block is live if it was published recently
+    # and is published again within STALE_AFTER seconds
+    buffer=memory.buf
+    if len(buffer)<SLOTS_OFFSET or HEADER.unpack_from(buffer, 0)[0]!=MAGIC: return False
+    read=_readLocked(buffer, STATE_OFFSET, STATE)
+    if read is not None and read[1][0]<time.monotonic()-STALE_AFTER: return False
+    first=SEQUENCE.unpack_from(buffer, STATE_OFFSET)[0]
+    deadline=time.monotonic()+STALE_AFTER
+    while time.monotonic()<deadline:
+        time.sleep(0.01)
+        if SEQUENCE.unpack_from(buffer, STATE_OFFSET)[0]!=first: return True
+    return False
+
+class ZeroBorgBroker(object):
+    """
+Owns a ZeroBorg and shares it with other processes on the same host through shared memory
+zeroBorg                The ZeroBorg instance to drive
+name                    Name of the shared memory block, clients attach with the same name
+rate                    Times per second command slots are checked and the state is published
+slots                   Number of command slots, each client process writes to its own slot
+failsafeTimeout         Seconds without a command or ping from any client driving the motors after which motorsOff() is sent,
+                        None to disable
+irInterval              Seconds between checks for a new IR message
+The state is published in one seqlock protected block, a client copies it out without locking and retries if the
+broker was writing. Each slot is a seqlock protected block written by one client only, holding the latest
+levels it wants and a count of updates for each motor and the LED, so commands never wait for a lock, a newer
+command simply replaces an older one and the broker only applies the levels whose count has changed.
+Powers which are not finite or are outside +1 to -1 are ignored, and a slot left half written by a client which
+died is skipped rather than waited for.
+    """
+
+    def __init__(self, zeroBorg, name=DEFAULT_NAME, rate=200.0, slots=8, failsafeTimeout=0.25, irInterval=0.05):
+        self._zeroBorg=zeroBorg
+        self._name=name
+        self._interval=1.0/rate
+        self._slots=slots
+        self._failsafeTimeout=failsafeTimeout
+        self._irInterval=irInterval
+        self._memory=None
+        self._thread=None
+        self._stopEvent=threading.Event()
+        self.resetStats()
+
+    @property
+    def name(self):
+        """Name of the shared memory block"""
+        return self._name
+
+    def start(self):
+        """
+        start()
+        Creates the shared memory block, starts the ZeroBorg state refresher and the broker thread.
+        A block of the same name left by a broker which died is replaced, raises FileExistsError if another
+        broker is still publishing it.
+        """
+        if self._thread is not None and self._thread.is_alive(): return
+        size=SLOTS_OFFSET+self._slots*SLOT_SIZE
+        try: self._memory=shared_memory.SharedMemory(name=self._name, create=True, size=size)
+        except FileExistsError:
+            existing=_attach(self._name)
+            try: live=_isLive(existing)
+            finally: existing.close()
+            if live: raise FileExistsError("Shared memory block {} is in use by a running ZeroBorgBroker".format(self._name))
+            # Left behind by a broker which did not shut down cleanly
+            stale=shared_memory.SharedMemory(name=self._name)
+            stale.close()
+            stale.unlink()
+            self._memory=shared_memory.SharedMemory(name=self._name, create=True, size=size)
+        _created.add(self._name)
+        buffer=self._memory.buf
+        buffer[:size]=bytes(size)
+        HEADER.pack_into(buffer, 0, MAGIC, VERSION, self._slots)
+
+        self._zeroBorg.startStateRefresh()
+        self._stopEvent.clear()
+        self._thread=threading.Thread(target=self._run, name="ZeroBorgBroker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        stop()
+        Stops the broker thread and removes the shared memory block, the motors are left as they are
+        """
+        self._stopEvent.set()
+        if self._thread is not None: self._thread.join()
+        self._thread=None
+        self._zeroBorg.stopStateRefresh()
+        memory, self._memory=self._memory, None
+        if memory is not None:
+            memory.close()
+            memory.unlink()
+            _created.discard(self._name)
+
+    def resetStats(self):
+        """
+        resetStats()
+        Clears the broker statistics
+        """
+        self._iterations=0
+        self._commands=0
+        self._overruns=0
+        self._failsafeTrips=0
+        self._rejected=0
+        self._skipped=0
+        self._errors=0
+
+    def getStats(self):
+        """
+        stats = getStats()
+        Returns the broker statistics as a dictionary: iterations run, commands (slot updates) applied,
+        overruns (iterations skipped because the broker fell behind), failsafeTrips, rejected (invalid motor powers),
+        skipped (slot reads abandoned because the slot stayed mid-write) and errors (passes which raised an exception)
+        """
+        return {"iterations": self._iterations, "commands": self._commands, "overruns": self._overruns,
+            "failsafeTrips": self._failsafeTrips, "rejected": self._rejected, "skipped": self._skipped,
+            "errors": self._errors}
+
+    def _run(self):
+        zeroBorg=self._zeroBorg
+        buffer=self._memory.buf
+        seen=[0]*self._slots
+        counts=[[0]*6 for slot in range(self._slots)] # Motor, LED and motors off counts last applied from each slot
+        setters=(zeroBorg.setMotor1, zeroBorg.setMotor2, zeroBorg.setMotor3, zeroBorg.setMotor4)
+        lastCommand=time.monotonic()
+        drivers=set() # Slots which have set a motor since the failsafe last tripped, only they keep it from tripping
+        moving=False
+        irCount=0
+        irMessage=bytes(ZeroBorg.IR_MAX_BYTES)
+        nextIR=0.0
+        schedule=ZeroBorg.Scheduler(self._interval, self._stopEvent)
+        while not self._stopEvent.is_set():
+            # Collect the slots written since the last pass, applied oldest first so the newest level wins
+            changed=[]
+            for slot in range(self._slots):
+                read=_readLocked(buffer, SLOTS_OFFSET+slot*SLOT_SIZE, SLOT)
+                if read is None:
+                    self._skipped+=1
+                    continue
+                sequence, values=read
+                if sequence!=seen[slot]:
+                    seen[slot]=sequence
+                    changed.append((values[0], slot, values))
+
+            now=time.monotonic()
+            # A failure talking to the board must not end the broker thread, or the failsafe would stop with it
+            try:
+                if changed:
+                    changed.sort()
+                    motors=[None]*4
+                    off=False
+                    led=None
+                    for timestamp, slot, values in changed:
+                        applied=counts[slot]
+                        if values[11]!=applied[5]:
+                            applied[5]=values[11]
+                            motors=[None]*4
+                            off=True
+                        for index in range(4):
+                            if values[6+index]!=applied[index]:
+                                applied[index]=values[6+index]
+                                drivers.add(slot)
+                                power=values[1+index]
+                                if -1.0<=power<=1.0: motors[index]=power # Also rejects NaN
+                                else: self._rejected+=1
+                        if values[10]!=applied[4]:
+                            applied[4]=values[10]
+                            led=bool(values[5])
+                        if slot in drivers: lastCommand=now
+                    self._commands+=len(changed)
+
+                    if off:
+                        zeroBorg.motorsOff()
+                        moving=False
+                        motors=[None if power==0.0 else power for power in motors] # Already stopped
+                    pending=[power for power in motors if power is not None]
+                    if any(pending): moving=True
+                    if len(pending)==4: zeroBorg.setMotorFrame(*motors)
+                    else:
+                        for setter, power in zip(setters, motors):
+                            if power is not None: setter(power)
+                    if led is not None: zeroBorg.setLED(led)
+                if self._failsafeTimeout is not None and moving and now-lastCommand>self._failsafeTimeout:
+                    zeroBorg.motorsOff()
+                    moving=False
+                    drivers.clear()
+                    self._failsafeTrips+=1
+
+                if now>=nextIR:
+                    nextIR=now+self._irInterval
+                    payload=zeroBorg.readNewIR()
+                    if payload is not None:
+                        irCount+=1
+                        irMessage=payload
+
+                state=zeroBorg.getState()
+                flags=0
+                for field, flag in _FLAGS:
+                    if getattr(state, field): flags|=flag
+                _writeLocked(buffer, STATE_OFFSET, STATE, time.monotonic(),
+                    state.motor1 or 0.0, state.motor2 or 0.0, state.motor3 or 0.0, state.motor4 or 0.0, flags,
+                    state.analog1 or 0.0, state.analog2 or 0.0, irCount, irMessage)
+            except Exception as e:
+                self._errors+=1
+                zeroBorg.print("ZeroBorgBroker pass failed: {}".format(e))
+            self._iterations+=1
+
+            self._overruns+=schedule.advance()
+            if schedule.wait(): return
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+class BrokerClient(object):
+    """
+Reads the state published by a ZeroBorgBroker and sends it commands, from any process on the same host
+name                    Name of the broker's shared memory block
+slot                    Command slot to write, every client process needs a different one
+Commands are written straight into shared memory and picked up by the broker's next pass, nothing blocks.
+Send a command or ping() at least every failsafeTimeout seconds to keep the broker failsafe from stopping the motors,
+a ping never sets a motor again once the failsafe has stopped it.
+    """
+
+    def __init__(self, name=DEFAULT_NAME, slot=0):
+        self._memory=_attach(name)
+        buffer=self._memory.buf
+        magic, version, slots=HEADER.unpack_from(buffer, 0)
+        if magic!=MAGIC or version!=VERSION:
+            self._memory.close()
+            raise ValueError("Shared memory block {} was not created by a ZeroBorgBroker".format(name))
+        if not 0<=slot<slots:
+            self._memory.close()
+            raise ValueError("Slot {} is out of range, the broker has {} slots".format(slot, slots))
+        self._buffer=buffer
+        self._offset=offset=SLOTS_OFFSET+slot*SLOT_SIZE
+        # Carry on from the counts left in the slot, so a new client in a reused slot is not mistaken for the old one
+        sequence=SEQUENCE.unpack_from(buffer, offset)[0]
+        if sequence&1: SEQUENCE.pack_into(buffer, offset, (sequence+1)&0xFFFFFFFF) # The last owner died mid-write
+        values=SLOT.unpack_from(buffer, offset+SEQUENCE.size)
+        self._powers=list(values[1:5])
+        self._led=values[5]
+        self._counts=list(values[6:12])
+        self._lock=threading.Lock()
+
+    def _publish(self):
+        powers=self._powers
+        counts=self._counts
+        _writeLocked(self._buffer, self._offset, SLOT, time.monotonic(), powers[0], powers[1], powers[2], powers[3],
+            self._led, counts[0], counts[1], counts[2], counts[3], counts[4], counts[5])
+
+    def _count(self, index):
+        self._counts[index]=(self._counts[index]+1)&0xFFFFFFFF
+
+    def _setMotor(self, index, power):
+        with self._lock:
+            self._powers[index]=power
+            self._count(index)
+            self._publish()
+
+    def setMotor1(self, power):
+        """
+        setMotor1(power)
+        Sets the drive level for motor 1, from +1 to -1
+        """
+        self._setMotor(0, power)
+
+    def setMotor2(self, power):
+        """
+        setMotor2(power)
+        Sets the drive level for motor 2, from +1 to -1
+        """
+        self._setMotor(1, power)
+
+    def setMotor3(self, power):
+        """
+        setMotor3(power)
+        Sets the drive level for motor 3, from +1 to -1
+        """
+        self._setMotor(2, power)
+
+    def setMotor4(self, power):
+        """
+        setMotor4(power)
+        Sets the drive level for motor 4, from +1 to -1
+        """
+        self._setMotor(3, power)
+
+    def setMotors(self, power):
+        """
+        setMotors(power)
+        Sets the drive level for all motors, from +1 to -1
+        """
+        self.setMotorFrame(power, power, power, power)
+
+    def setMotorFrame(self, power1, power2, power3, power4):
+        """
+        setMotorFrame(power1, power2, power3, power4)
+        Sets the drive level for all four motors at once, each from +1 to -1
+        """
+        with self._lock:
+            self._powers=[power1, power2, power3, power4]
+            for index in range(4): self._count(index)
+            self._publish()
+
+    def motorsOff(self):
+        """
+        motorsOff()
+        Sets all motors to stopped
+        """
+        with self._lock:
+            # The motor counts move too, so a level set earlier in the same broker pass is not applied after the stop
+            self._powers=[0.0]*4
+            for index in range(4): self._count(index)
+            self._count(5)
+            self._publish()
+
+    def setLED(self, state):
+        """
+        setLED(state)
+        Sets the current state of the LED, False for off, True for on
+        """
+        with self._lock:
+            self._led=1 if state else 0
+            self._count(4)
+            self._publish()
+
+    def ping(self):
+        """
+        ping()
+        Tells the broker this client is still there without changing anything
+        """
+        with self._lock: self._publish()
+
+    def readState(self):
+        """
+        state = readState()
+        Returns the latest state published by the broker as a ZeroBorg.BoardState, every field stamped with the
+        time.monotonic() it was published at, or None if the broker died while publishing
+        """
+        read=_readLocked(self._buffer, STATE_OFFSET, STATE)
+        if read is None: return
+        timestamp, power1, power2, power3, power4, flags, analog1, analog2, irCount, irMessage=read[1]
+        state=ZeroBorg.BoardState()
+        for field, value in zip(("motor1", "motor2", "motor3", "motor4", "analog1", "analog2"),
+                (power1, power2, power3, power4, analog1, analog2)):
+            setattr(state, field, value)
+        for field, flag in _FLAGS: setattr(state, field, bool(flags&flag))
+        state.times={field: timestamp for field in ZeroBorg.BoardState.FIELDS}
+        return state
+
+    def getIR(self):
+        """
+        count, payload = getIR()
+        Returns the number of IR messages the broker has received and the last message as bytes,
+        a change in count shows a new message even if it repeats the last one. Returns None if the broker died
+        while publishing.
+        """
+        read=_readLocked(self._buffer, STATE_OFFSET, STATE)
+        if read is not None: return read[1][8:10]
+
+    def close(self):
+        """
+        close()
+        Detaches from the shared memory block
+        """
+        self._buffer=None
+        self._memory.close()
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description="Share a ZeroBorg with other processes through shared memory")
+    parser.add_argument("--name", default=DEFAULT_NAME, help="shared memory block name (default: %(default)s)")
+    parser.add_argument("--busNumber", type=int, default=1, help="I\u00B2C bus the ZeroBorg is on")
+    parser.add_argument("--address", type=lambda text: int(text, 0), default=ZeroBorg.I2C_ID_ZEROBORG,
+        help="I\u00B2C address of the ZeroBorg")
+    parser.add_argument("--rate", type=float, default=200.0, help="broker passes per second")
+    parser.add_argument("--slots", type=int, default=8, help="number of client command slots")
+    parser.add_argument("--failsafe", type=float, default=0.25, help="seconds of client silence before motors off")
+    options=parser.parse_args(argv)
+
+    zb=ZeroBorg.ZeroBorg()
+    zb.busNumber=options.busNumber
+    zb.i2cAddress=options.address
+    zb.init(False)
+    if not zb.foundChip: return 1
+
+    broker=ZeroBorgBroker(zb, options.name, options.rate, options.slots, options.failsafe)
+    broker.start()
+    try:
+        while True: time.sleep(1)
+    except KeyboardInterrupt: pass
+    finally:
+        broker.stop()
+        zb.motorsOff()
+    return 0
+
+
+if __name__=="__main__":
+    sys.exit(main())
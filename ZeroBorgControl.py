@@ -0,0 +1,249 @@
+import time, threading
+
+import ZeroBorg
+
+class PID(object):
+    """
+PID controller with anti-windup and a filtered derivative
+kp, ki, kd              Proportional, integral and derivative gains
+outputLimit             Output is clamped to +/- outputLimit, 1 matches the motor power range
+derivativeTime          Time constant in seconds of the low pass filter on the derivative, 0 for no filtering
+The derivative acts on the measurement rather than the error so setpoint steps do not kick the output, and the
+integral stops growing while the output is saturated in the direction it would push it (conditional integration).
+    """
+
+    def __init__(self, kp, ki=0.0, kd=0.0, outputLimit=1.0, derivativeTime=0.01):
+        self.kp=kp
+        self.ki=ki
+        self.kd=kd
+        self.outputLimit=outputLimit
+        self.derivativeTime=derivativeTime
+        self.reset()
+
+    def reset(self):
+        """
+        reset()
+        Clears the integral and derivative state
+        """
+        self._integral=0.0
+        self._derivative=0.0
+        self._lastMeasurement=None
+        self.output=0.0
+
+    def update(self, setpoint, measurement, dt):
+        """
+        output = update(setpoint, measurement, dt)
+        Runs the controller for one step of dt seconds and returns the new output
+        """
+        error=setpoint-measurement
+        if self._lastMeasurement is not None and dt>0:
+            raw=-(measurement-self._lastMeasurement)/dt
+            alpha=dt/(self.derivativeTime+dt)
+            self._derivative+=alpha*(raw-self._derivative)
+        self._lastMeasurement=measurement
+
+        limit=self.outputLimit
+        unclamped=self.kp*error+self._integral+self.kd*self._derivative
+        # Anti-windup: only integrate when that does not push further into saturation
+        if not ((unclamped>=limit and error>0) or (unclamped<=-limit and error<0)):
+            self._integral=max(-limit, min(self._integral+self.ki*error*dt, limit))
+
+        output=self.kp*error+self._integral+self.kd*self._derivative
+        self.output=max(-limit, min(output, limit))
+        return self.output
+
+class ControlLoop(object):
+    """
+Runs PID loops from the ZeroBorg analog inputs to its motors at a fixed rate on a background thread
+zeroBorg                The ZeroBorg instance to control
+rate                    Loop iterations per second
+Add a channel per motor with addChannel(). Each iteration reads every analog port in use once, updates each
+channel's PID and writes the motors, timing the read, compute and write stages separately so getStats()
+shows whether the bus or Python limits the rate. Missed deadlines are skipped rather than run late in a burst.
+    """
+
+    def __init__(self, zeroBorg, rate=100.0):
+        self._zeroBorg=zeroBorg
+        self._interval=1.0/rate
+        self._channels=[]
+        self._lock=threading.Lock()
+        self._thread=None
+        self._stopEvent=threading.Event()
+        self.resetStats()
+
+    def addChannel(self, port, motor, pid, setpoint=0.0):
+        """
+        addChannel(port, motor, pid, [setpoint])
+        Drives motor 1 to 4 with pid so the voltage on analog port 1 or 2 tracks setpoint
+        """
+        setters=(self._zeroBorg.setMotor1, self._zeroBorg.setMotor2, self._zeroBorg.setMotor3, self._zeroBorg.setMotor4)
+        with self._lock:
+            self._channels=[channel for channel in self._channels if channel[1]!=motor]
+            self._channels.append([port, motor, pid, setpoint, setters[motor-1]])
+
+    def setSetpoint(self, motor, setpoint):
+        """
+        setSetpoint(motor, setpoint)
+        Sets the voltage the channel driving motor 1 to 4 tracks
+        """
+        with self._lock:
+            for channel in self._channels:
+                if channel[1]==motor: channel[3]=setpoint
+
+    def getOutput(self, motor):
+        """
+        power = getOutput(motor)
+        Returns the last power written by the channel driving motor 1 to 4, None if there is no such channel
+        """
+        for channel in self._channels:
+            if channel[1]==motor: return channel[2].output
+
+    def start(self):
+        """
+        start()
+        Resets the controllers and starts the loop thread
+        """
+        if self._thread is not None and self._thread.is_alive(): return
+        for channel in self._channels: channel[2].reset()
+        self._stopEvent.clear()
+        self._thread=threading.Thread(target=self._run, name="ZeroBorgControlLoop", daemon=True)
+        self._thread.start()
+
+    def stop(self, stopMotors=True):
+        """
+        stop([stopMotors])
+        Stops the loop thread and waits for it to finish, setting the controlled motors to 0 if stopMotors is True
+        """
+        self._stopEvent.set()
+        if self._thread is not None: self._thread.join()
+        self._thread=None
+        if stopMotors:
+            for channel in self._channels: channel[4](0)
+
+    def resetStats(self):
+        """
+        resetStats()
+        Clears the loop statistics
+        """
+        self._iterations=0
+        self._overruns=0
+        self._readErrors=0
+        self._errors=0
+        self._jitterTotal=0.0
+        self._jitterMax=0.0
+        self._periodMin=None
+        self._periodMax=0.0
+        self._stageTotal=[0.0, 0.0, 0.0]
+        self._stageMax=[0.0, 0.0, 0.0]
+
+    def getStats(self):
+        """
+        stats = getStats()
+        Returns the loop statistics as a dictionary, times in seconds:
+        iterations      loop iterations run
+        overruns        deadlines skipped because an iteration ran late
+        readErrors      analog reads which failed, the channel keeps its last output
+        errors          iterations which raised an exception, e.g. a motor write failing with raiseErrors set
+        jitterMean      mean lateness of the loop against its deadlines
+        jitterMax       worst lateness of the loop against its deadlines
+        periodMin       shortest time between the start of two iterations
+        periodMax       longest time between the start of two iterations
+        readMean, readMax, computeMean, computeMax, writeMean, writeMax
+                        mean and worst time spent reading the analog ports, running the PIDs and writing the motors
+        """
+        iterations=self._iterations or 1
+        stats={
+            "iterations": self._iterations,
+            "overruns": self._overruns,
+            "readErrors": self._readErrors,
+            "errors": self._errors,
+            "jitterMean": self._jitterTotal/iterations,
+            "jitterMax": self._jitterMax,
+            "periodMin": self._periodMin or 0.0,
+            "periodMax": self._periodMax,
+        }
+        for index, stage in enumerate(("read", "compute", "write")):
+            stats[stage+"Mean"]=self._stageTotal[index]/iterations
+            stats[stage+"Max"]=self._stageMax[index]
+        return stats
+
+    def step(self, dt=None):
+        """
+        step([dt])
+        Runs one iteration of every channel, dt is the time step in seconds (the loop interval if None).
+        Called by the loop thread.
+        """
+        if dt is None: dt=self._interval
+        zeroBorg=self._zeroBorg
+        with self._lock: channels=list(self._channels)
+
+        started=time.perf_counter()
+        readings={}
+        for channel in channels:
+            port=channel[0]
+            if port not in readings:
+                try: readings[port]=zeroBorg.getAnalog1() if port==1 else zeroBorg.getAnalog2()
+                except Exception: readings[port]=None # Raised when raiseErrors is set, counted below
+        read=time.perf_counter()
+
+        outputs=[]
+        for port, motor, pid, setpoint, setter in channels:
+            measurement=readings[port]
+            if measurement is None:
+                self._readErrors+=1
+                continue
+            outputs.append((setter, pid.update(setpoint, measurement, dt)))
+        computed=time.perf_counter()
+
+        for setter, power in outputs: setter(power)
+        written=time.perf_counter()
+
+        for index, duration in enumerate((read-started, computed-read, written-computed)):
+            self._stageTotal[index]+=duration
+            if duration>self._stageMax[index]: self._stageMax[index]=duration
+
+    def _run(self):
+        try: self._loop()
+        except BaseException:
+            # The loop is ending for something other than stop(), so leave the controlled motors stopped
+            # rather than running at their last output
+            for channel in self._channels:
+                try: channel[4](0)
+                except Exception: pass
+            raise
+
+    def _loop(self):
+        interval=self._interval
+        schedule=ZeroBorg.Scheduler(interval, self._stopEvent)
+        previous=None
+        while not self._stopEvent.is_set():
+            now=time.monotonic()
+            jitter=now-schedule.deadline
+            self._jitterTotal+=jitter
+            if jitter>self._jitterMax: self._jitterMax=jitter
+            if previous is not None:
+                period=now-previous
+                if self._periodMin is None or period<self._periodMin: self._periodMin=period
+                if period>self._periodMax: self._periodMax=period
+            # The real time step keeps the integral and derivative right when a deadline is missed
+            try: self.step(interval if previous is None else now-previous)
+            except Exception as e:
+                self._errors+=1
+                self._zeroBorg.print("ControlLoop iteration failed: {}".format(e))
+            previous=now
+            self._iterations+=1
+
+            self._overruns+=schedule.advance()
+            if schedule.wait(): return
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+
+if __name__=="__main__":
+    ControlLoop.help()
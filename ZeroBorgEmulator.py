@@ -0,0 +1,204 @@
+import time, random, errno, threading
+
+import ZeroBorg
+from ZeroBorg import Command, I2C_ID_ZEROBORG, IR_MAX_BYTES, PWM_MAX
+
+FAILSAFE_TIMEOUT=0.25
+
+class EmulatedBoard(object):
+    """
+Register level model of one ZeroBorg board
+address                 I\u00B2C address the board answers on
+motors                  [direction, pwm] for each of the four motors, direction is Command.ValueFwd or Command.ValueRev
+led                     True if the LED is on
+ledIR                   True if IR messages blink the LED
+epo                     True if the EPO latch has been tripped
+epoIgnore               True if the EPO latch is ignored
+failSafe                True if the communications failsafe is enabled
+analog                  Raw 10-bit readings of analog ports #1 and #2
+    """
+
+    def __init__(self, address=I2C_ID_ZEROBORG, clock=time.monotonic):
+        self.address=address
+        self._clock=clock
+        self.motors=[[Command.ValueFwd, 0] for i in range(4)]
+        self.led=False
+        self.ledIR=True
+        self.epo=False
+        self.epoIgnore=False
+        self.failSafe=False
+        self.analog=[0, 0]
+        self._irMessage=bytes(IR_MAX_BYTES)
+        self._newIR=False
+        self._lastCommand=clock()
+        self.failSafeTrips=0
+
+    def tripEPO(self):
+        """
+        tripEPO()
+        Simulates the EPO switch opening, latching the EPO and stopping the motors unless it is ignored
+        """
+        self.epo=True
+        if not self.epoIgnore: self._stopMotors()
+
+    def receiveIR(self, payload):
+        """
+        receiveIR(payload)
+        Simulates an IR message arriving, payload is bytes or a hexadecimal string of up to 22 bytes
+        """
+        if isinstance(payload, str): payload=bytes.fromhex(payload)
+        self._irMessage=bytes(payload[:IR_MAX_BYTES]).ljust(IR_MAX_BYTES, b'\0')
+        self._newIR=True
+        if self.ledIR: self.led=not self.led
+
+    def setAnalog(self, port, voltage):
+        """
+        setAnalog(port, voltage)
+        Sets the voltage seen on analog port #1 or #2
+        """
+        raw=int(round(voltage/ZeroBorg.ANALOG_VREF*Command.AnalogMax))
+        self.analog[port-1]=max(0, min(raw, Command.AnalogMax))
+
+    def getMotor(self, motor):
+        """
+        power = getMotor(motor)
+        Returns the drive level of motor 1 to 4, from +1 to -1
+        """
+        direction, pwm=self.motors[motor-1]
+        power=float(pwm)/PWM_MAX
+        return -power if direction==Command.ValueRev else power
+
+    def _stopMotors(self):
+        for motor in self.motors: motor[:]=[Command.ValueFwd, 0]
+
+    def _checkFailSafe(self):
+        if self.failSafe and self._clock()-self._lastCommand>FAILSAFE_TIMEOUT:
+            if any(pwm for direction, pwm in self.motors): self.failSafeTrips+=1
+            self._stopMotors()
+
+    def _setMotor(self, motor, direction, pwm):
+        if self.epo and not self.epoIgnore: pwm=0
+        self.motors[motor]=[direction, min(pwm, PWM_MAX)]
+
+    def write(self, command, value):
+        self._checkFailSafe()
+        self._lastCommand=self._clock()
+
+        if command==Command.SetLED: self.led=value==Command.ValueOn
+        elif Command.SetAFwd<=command<=Command.SetDRev and (command-Command.SetAFwd)%3!=2:
+            motor, reverse=divmod(command-Command.SetAFwd, 3)
+            self._setMotor(motor, Command.ValueRev if reverse else Command.ValueFwd, value)
+        elif command==Command.AllOff: self._stopMotors()
+        elif command in (Command.SetAllFwd, Command.SetAllRev):
+            direction=Command.ValueFwd if command==Command.SetAllFwd else Command.ValueRev
+            for motor in range(4): self._setMotor(motor, direction, value)
+        elif command==Command.SetFailSafe: self.failSafe=value==Command.ValueOn
+        elif command==Command.ResetEPO: self.epo=False
+        elif command==Command.SetEPOIgnore: self.epoIgnore=value==Command.ValueOn
+        elif command==Command.SetLEDIR: self.ledIR=value==Command.ValueOn
+        elif command==Command.SetI2cAdd: self.address=value
+        else: raise OSError(errno.EIO, "Unknown ZeroBorg write command {:02X}".format(command))
+
+    def read(self, command):
+        self._checkFailSafe()
+
+        if command==Command.GetLED: return [command, Command.ValueOn if self.led else Command.ValueOff]
+        elif command in (Command.GetA, Command.GetB, Command.GetC, Command.GetD):
+            direction, pwm=self.motors[(command-Command.GetA)//3]
+            return [command, direction, pwm]
+        elif command==Command.GetFailSafe: return [command, Command.ValueOn if self.failSafe else Command.ValueOff]
+        elif command==Command.GetEPO: return [command, Command.ValueOn if self.epo else Command.ValueOff]
+        elif command==Command.GetEPOIgnore: return [command, Command.ValueOn if self.epoIgnore else Command.ValueOff]
+        elif command==Command.GetNewIR: return [command, Command.ValueOn if self._newIR else Command.ValueOff]
+        elif command==Command.GetLastIR:
+            self._newIR=False
+            return [command]+list(self._irMessage)
+        elif command==Command.GetLEDIR: return [command, Command.ValueOn if self.ledIR else Command.ValueOff]
+        elif command in (Command.GetAnalog1, Command.GetAnalog2):
+            raw=self.analog[command-Command.GetAnalog1]
+            return [command, raw>>8, raw&0xFF]
+        elif command==Command.GetID: return [command, I2C_ID_ZEROBORG]
+        raise OSError(errno.EIO, "Unknown ZeroBorg read command {:02X}".format(command))
+
+class ZeroBorgEmulator(ZeroBorg.Transport):
+    """
+In-process stand in for smbus.SMBus with one or more emulated ZeroBorg boards attached
+addresses               I\u00B2C addresses of the emulated boards
+latency                 Seconds added to every transaction
+jitter                  Extra random seconds, from 0 to jitter, added to every transaction
+errorRate               Probability, from 0 to 1, of a transaction failing with an OSError
+seed                    Seed for the jitter and error generator, None for a random seed
+clock                   Function returning the time in seconds, used for the failsafe timeout
+Use ZeroBorg.bus=emulator on an existing instance, or ZeroBorg.busFactory=emulator so the first transaction opens it.
+    """
+
+    def __init__(self, addresses=(I2C_ID_ZEROBORG,), latency=0.0, jitter=0.0, errorRate=0.0, seed=None,
+            clock=time.monotonic):
+        self._boards=[EmulatedBoard(address, clock) for address in addresses]
+        self.latency=latency
+        self.jitter=jitter
+        self.errorRate=errorRate
+        self._random=random.Random(seed)
+        self._lock=threading.Lock()
+        self.transactions=0
+        self.errors=0
+
+    def __call__(self, busNumber):
+        # Lets the emulator stand in for smbus.SMBus as a ZeroBorg.busFactory
+        return self
+
+    @property
+    def boards(self): return tuple(self._boards)
+
+    def board(self, address=I2C_ID_ZEROBORG):
+        """
+        board = board([address])
+        Returns the EmulatedBoard at address
+        """
+        for board in self._boards:
+            if board.address==address: return board
+        raise KeyError("No emulated ZeroBorg at {:02X}".format(address))
+
+    def _transaction(self, address):
+        with self._lock:
+            self.transactions+=1
+            delay=self.latency+(self._random.random()*self.jitter if self.jitter else 0.0)
+            fail=self.errorRate and self._random.random()<self.errorRate
+            if fail: self.errors+=1
+        if delay>0: time.sleep(delay)
+        if fail: raise OSError(errno.EIO, "Injected I\u00B2C error")
+
+        for board in self._boards:
+            if board.address==address: return board
+        raise OSError(errno.ENXIO, "No device at {:02X}".format(address))
+
+    def read_i2c_block_data(self, address, command, length):
+        board=self._transaction(address)
+        with self._lock: data=board.read(command)
+        return (data+[0]*length)[:length]
+
+    def write_byte_data(self, address, command, value):
+        board=self._transaction(address)
+        with self._lock: board.write(command, value)
+
+    def read_byte(self, address):
+        self._transaction(address)
+        return 0
+
+    def write_quick(self, address):
+        self._transaction(address)
+
+    def close(self): pass
+
+def emulatedZeroBorg(**options):
+    """
+    zb, emulator = emulatedZeroBorg(**options)
+    Returns a ZeroBorg, already initialised, talking to a new ZeroBorgEmulator created with the given options
+    """
+    emulator=ZeroBorgEmulator(**options)
+    zb=ZeroBorg.ZeroBorg()
+    zb.printFunction=zb.noPrint
+    zb.busFactory=emulator
+    zb.i2cAddress=emulator.boards[0].address
+    zb.init(False)
+    return zb, emulator
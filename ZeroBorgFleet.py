@@ -0,0 +1,194 @@
+import time, threading, concurrent.futures
+
+import ZeroBorg
+
+class ZeroBorgFleet(object):
+    """
+Controls several ZeroBorg boards, on one or more I\u00B2C buses, as a single unit
+boards                  The ZeroBorg instances in the fleet, in the order used by the vectorised commands
+printFunction           Function reference to call when printing text, if None "print" is used
+Commands are dispatched with one BusWorker per bus: boards on different buses are driven in parallel,
+writes to boards on the same bus are sent one after another in fleet order.
+motorsOff bypasses the shared BusWorker queues, so a long batch or scan already queued there cannot hold up a stop.
+    """
+
+    def __init__(self, boards=()):
+        self._boards=[]
+        self._printFunction=None
+        self._lastLatency=[]
+        for board in boards: self.addBoard(board)
+
+    @classmethod
+    def fromScan(cls, busNumbers=(1,)):
+        """
+        fleet = ZeroBorgFleet.fromScan([busNumbers])
+        Builds a fleet from every ZeroBorg found by scanForZeroBorg on each of the given buses
+        """
+        fleet=cls()
+        for busNumber in busNumbers:
+            for address in ZeroBorg.scanForZeroBorg(busNumber): fleet.addBoard(address, busNumber)
+        return fleet
+
+    @property
+    def boards(self): return tuple(self._boards)
+
+    @property
+    def printFunction(self): return self._printFunction
+    @printFunction.setter
+    def printFunction(self, value): self._printFunction=value
+
+    def __len__(self): return len(self._boards)
+
+    def print(self, message):
+        """
+        print(message)
+        Wrapper used by the fleet to print messages, will call printFunction if set, print otherwise
+        """
+        if self._printFunction==None: print(message)
+        else: self._printFunction(message)
+
+    def addBoard(self, board, busNumber=1):
+        """
+        zb = addBoard(board, [busNumber])
+        Adds a board to the end of the fleet, board is either a ZeroBorg instance or the I\u00B2C address
+        of a board on busNumber, which is then initialised without trying the other bus. Returns the ZeroBorg instance.
+        """
+        if not isinstance(board, ZeroBorg.ZeroBorg):
+            address, board=board, ZeroBorg.ZeroBorg()
+            board.printFunction=self._printFunction
+            board.busNumber=busNumber
+            board.i2cAddress=address
+            board.init(False)
+
+        self._boards.append(board)
+        return board
+
+    def _dispatch(self, calls, timeout=None, direct=False):
+        # calls holds a (function, args) pair per board, returns the results in fleet order.
+        # direct runs each bus on a thread of its own instead of queueing behind the bus' BusWorker
+        started=time.monotonic()
+        byBus={}
+        for index, (board, call) in enumerate(zip(self._boards, calls)):
+            if call is not None: byBus.setdefault(board.busNumber, []).append((index, call))
+
+        if direct: futures=[self._runDirect(started, batch) for batch in byBus.values()]
+        else:
+            futures=[ZeroBorg.BusWorker.forBus(busNumber).submit(self._runBus, started, batch)
+                for busNumber, batch in byBus.items()]
+        done, notDone=concurrent.futures.wait(futures, timeout)
+        if notDone: self.print("Fleet dispatch timed out on {} bus(es)!".format(len(notDone)))
+
+        results=[None]*len(self._boards)
+        latency=[None]*len(self._boards)
+        for future in done:
+            for index, result, elapsed in future.result():
+                results[index]=result
+                latency[index]=elapsed
+        self._lastLatency=latency
+        return results
+
+    @staticmethod
+    def _runBus(started, batch):
+        completed=[]
+        for index, (function, args) in batch:
+            try: result=function(*args)
+            except KeyboardInterrupt: raise
+            except Exception: result=None
+            completed.append((index, result, time.monotonic()-started))
+        return completed
+
+    @classmethod
+    def _runDirect(cls, started, batch):
+        # The board's own BusArbiter still orders the bus, putting AllOff ahead of anything else waiting
+        future=concurrent.futures.Future()
+        def run():
+            try: future.set_result(cls._runBus(started, batch))
+            except BaseException as e: future.set_exception(e)
+        threading.Thread(target=run, name="ZeroBorgFleetStop", daemon=True).start()
+        return future
+
+    def getLastLatency(self):
+        """
+        latency = getLastLatency()
+        Returns, for each board, the seconds between the last fleet command being issued and that board's
+        command completing, None for boards which were not commanded or did not complete in time
+        """
+        return list(self._lastLatency)
+
+    def setMotorMatrix(self, powers, timeout=None):
+        """
+        counts = setMotorMatrix(powers, [timeout])
+        Sets the drive levels of every motor in the fleet, powers holds one row of four levels (+1 to -1) per board,
+        or None to leave a board untouched. Each row is sent with ZeroBorg.setMotorFrame.
+        Returns the number of I\u00B2C transactions used per board, None where sending failed or timed out.
+        e.g.
+        setMotorMatrix([[0.5, 0.5, 0.5, 0.5], [-0.5, -0.5, 0, 0]])
+        """
+        powers=list(powers)
+        if len(powers)!=len(self._boards):
+            raise ValueError("Expected {} rows of motor powers, got {}".format(len(self._boards), len(powers)))
+
+        return self._dispatch([None if row is None else (board.setMotorFrame, tuple(row))
+            for board, row in zip(self._boards, powers)], timeout)
+
+    def setMotors(self, power, timeout=None):
+        """
+        setMotors(power, [timeout])
+        Sets the drive level for all motors on every board, from +1 to -1
+        """
+        self._dispatch([(board.setMotors, (power,)) for board in self._boards], timeout)
+
+    def motorsOff(self, timeout=0.1):
+        """
+        latency = motorsOff([timeout])
+        Sends the motors off command to every board, waiting at most timeout seconds (None to wait forever).
+        The stops are sent straight away from a thread per bus rather than queued behind other fleet or async work.
+        Returns the worst latency across the fleet in seconds, None if any board did not complete within the timeout.
+        """
+        self._dispatch([(board.motorsOff, ()) for board in self._boards], timeout, True)
+        if None in self._lastLatency: return None
+        return max(self._lastLatency, default=0.0)
+
+    def setLED(self, state, timeout=None):
+        """
+        setLED(state, [timeout])
+        Sets the LED on every board, False for off, True for on
+        """
+        self._dispatch([(board.setLED, (state,)) for board in self._boards], timeout)
+
+    def setCommsFailSafe(self, state, timeout=None):
+        """
+        setCommsFailSafe(state, [timeout])
+        Enables or disables the communications failsafe on every board
+        """
+        self._dispatch([(board.setCommsFailSafe, (state,)) for board in self._boards], timeout)
+
+    def getEPO(self, timeout=None):
+        """
+        states = getEPO([timeout])
+        Reads the EPO latch state of every board, see ZeroBorg.getEPO
+        """
+        return self._dispatch([(board.getEPO, ()) for board in self._boards], timeout)
+
+    def getAnalog(self, timeout=None):
+        """
+        voltages = getAnalog([timeout])
+        Reads both analog ports of every board, returns an (analog1, analog2) pair per board
+        """
+        return self._dispatch([(self._readAnalog, (board,)) for board in self._boards], timeout)
+
+    @staticmethod
+    def _readAnalog(board):
+        return board.getAnalog1(), board.getAnalog2()
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+
+if __name__=="__main__":
+    ZeroBorgFleet.help()
@@ -0,0 +1,187 @@
+import os, ctypes, errno
+
+try: import fcntl
+except ImportError: fcntl=None
+
+import ZeroBorg
+from ZeroBorg import I2C_LONG_LEN
+
+I2C_RDWR=0x0707             # ioctl request for combined transactions, from linux/i2c-dev.h
+I2C_M_RD=0x0001             # message flag for a read, from linux/i2c.h
+MAX_MESSAGES=8              # messages in one combined transaction, the kernel allows up to 42
+MAX_MESSAGE_LEN=I2C_LONG_LEN+1
+
+class I2CMessage(ctypes.Structure):
+    """struct i2c_msg from linux/i2c.h"""
+    _fields_=[("addr", ctypes.c_uint16), ("flags", ctypes.c_uint16), ("len", ctypes.c_uint16),
+        ("buf", ctypes.POINTER(ctypes.c_uint8))]
+
+class I2CRdwrData(ctypes.Structure):
+    """struct i2c_rdwr_ioctl_data from linux/i2c-dev.h"""
+    _fields_=[("msgs", ctypes.POINTER(I2CMessage)), ("nmsgs", ctypes.c_uint32)]
+
+class FileLayer(object):
+    """
+The operating system calls used by I2CDevTransport, replace it to run the transport without a real /dev/i2c-N
+    """
+
+    def open(self, path): return os.open(path, os.O_RDWR)
+    def ioctl(self, fd, request, argument): return fcntl.ioctl(fd, request, argument)
+    def close(self, fd): os.close(fd)
+
+class I2CDevTransport(ZeroBorg.Transport):
+    """
+Transport talking to /dev/i2c-N directly with the I2C_RDWR ioctl, without smbus
+busNumber               I\u00B2C bus to open
+fileLayer               Object providing open, ioctl and close, FileLayer() if None
+Every call is a single ioctl built in preallocated ctypes buffers, and writeRegisters / readRegisters
+send all their messages in one combined transaction (repeated starts, no stop in between) so a motor frame
+or an IR flag and message read costs one system call.
+    """
+
+    combined=True
+
+    def __init__(self, busNumber, fileLayer=None):
+        if fileLayer is None:
+            if fcntl is None: raise OSError("fcntl is not available, I2CDevTransport needs Linux")
+            fileLayer=FileLayer()
+        self._fileLayer=fileLayer
+        self._fd=fileLayer.open("/dev/i2c-{}".format(busNumber))
+        self._messages=(I2CMessage*MAX_MESSAGES)()
+        self._buffers=[(ctypes.c_uint8*MAX_MESSAGE_LEN)() for i in range(MAX_MESSAGES)]
+        for message, buffer in zip(self._messages, self._buffers):
+            message.buf=ctypes.cast(buffer, ctypes.POINTER(ctypes.c_uint8))
+        self._request=I2CRdwrData(self._messages, 0)
+        self.syscalls=0
+
+    def _send(self, count):
+        self._request.nmsgs=count
+        self.syscalls+=1
+        # The struct goes in as a buffer so fcntl.ioctl passes the kernel a pointer to it, an address as a
+        # Python int would be parsed as a C int and overflow
+        self._fileLayer.ioctl(self._fd, I2C_RDWR, self._request)
+
+    def _setWrite(self, index, address, command, value=None):
+        message=self._messages[index]
+        message.addr=address
+        message.flags=0
+        buffer=self._buffers[index]
+        buffer[0]=command
+        if value is None: message.len=1
+        else:
+            buffer[1]=value
+            message.len=2
+
+    def _setRead(self, index, address, length):
+        message=self._messages[index]
+        message.addr=address
+        message.flags=I2C_M_RD
+        message.len=length
+
+    def read_i2c_block_data(self, address, command, length):
+        self._setWrite(0, address, command)
+        self._setRead(1, address, length)
+        self._send(2)
+        return self._buffers[1][:length]
+
+    def write_byte_data(self, address, command, value):
+        self._setWrite(0, address, command, value)
+        self._send(1)
+
+    def read_byte(self, address):
+        self._setRead(0, address, 1)
+        self._send(1)
+        return self._buffers[0][0]
+
+    def write_quick(self, address):
+        message=self._messages[0]
+        message.addr=address
+        message.flags=0
+        message.len=0
+        self._send(1)
+
+    def writeRegisters(self, address, writes):
+        """
+        writeRegisters(address, writes)
+        Writes every (command, value) pair in writes to the device at address in one combined transaction
+        """
+        for start in range(0, len(writes), MAX_MESSAGES):
+            chunk=writes[start:start+MAX_MESSAGES]
+            for index, (command, value) in enumerate(chunk): self._setWrite(index, address, command, value)
+            self._send(len(chunk))
+
+    def readRegisters(self, address, reads):
+        """
+        replies = readRegisters(address, reads)
+        Reads every (command, length) pair in reads from the device at address in one combined transaction
+        """
+        replies=[]
+        pairs=MAX_MESSAGES//2
+        for start in range(0, len(reads), pairs):
+            chunk=reads[start:start+pairs]
+            for index, (command, length) in enumerate(chunk):
+                self._setWrite(2*index, address, command)
+                self._setRead(2*index+1, address, length)
+            self._send(2*len(chunk))
+            replies.extend(self._buffers[2*index+1][:length] for index, (command, length) in enumerate(chunk))
+        return replies
+
+    def close(self):
+        fd, self._fd=self._fd, None
+        if fd is not None: self._fileLayer.close(fd)
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+class EmulatedFileLayer(FileLayer):
+    """
+Fake file descriptor layer which decodes I2C_RDWR requests and runs them against a ZeroBorgEmulator
+emulator                The ZeroBorgEmulator (or any smbus like bus) the messages are sent to
+Each write of a command byte followed by a read is run as read_i2c_block_data, a two byte write as write_byte_data.
+    """
+
+    def __init__(self, emulator):
+        self._emulator=emulator
+        self._open=set()
+        self._nextFd=3
+        self.ioctls=0
+
+    def open(self, path):
+        fd=self._nextFd
+        self._nextFd+=1
+        self._open.add(fd)
+        return fd
+
+    def close(self, fd): self._open.discard(fd)
+
+    def ioctl(self, fd, request, argument):
+        if fd not in self._open: raise OSError(errno.EBADF, "Bad file descriptor")
+        if request!=I2C_RDWR: raise OSError(errno.ENOTTY, "Inappropriate ioctl for device")
+        self.ioctls+=1
+        # Decoded the way fcntl.ioctl sees it, from the bytes of a buffer argument
+        data=I2CRdwrData.from_buffer_copy(memoryview(argument).cast("B"))
+        messages=[data.msgs[index] for index in range(data.nmsgs)]
+        emulator=self._emulator
+        index=0
+        while index<len(messages):
+            message=messages[index]
+            if message.flags&I2C_M_RD:
+                message.buf[0]=emulator.read_byte(message.addr)
+            elif message.len==0: emulator.write_quick(message.addr)
+            elif message.len==1 and index+1<len(messages) and messages[index+1].flags&I2C_M_RD:
+                reply=messages[index+1]
+                values=emulator.read_i2c_block_data(message.addr, message.buf[0], reply.len)
+                for position, value in enumerate(values[:reply.len]): reply.buf[position]=value
+                index+=1
+            else: emulator.write_byte_data(message.addr, message.buf[0], message.buf[1])
+            index+=1
+        return 0
+
+
+if __name__=="__main__":
+    I2CDevTransport.help()
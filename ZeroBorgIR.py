@@ -0,0 +1,144 @@
+import time, threading
+
+import ZeroBorg
+
+def irCode(code):
+    """
+    key = irCode(code)
+    Normalises an IR code to the key used by IRListener: bytes with the trailing zero bytes removed.
+    code can be the bytes from getIRBytes() / readNewIR() or a hexadecimal string from getIRMessage().
+    """
+    if isinstance(code, str):
+        if len(code)%2: code+='0' # getIRMessage() strips trailing zero digits
+        code=bytes.fromhex(code)
+    return bytes(code).rstrip(b'\0')
+
+class IRListener(object):
+    """
+Polls a ZeroBorg for IR messages on a background thread and dispatches them to callbacks
+zeroBorg                The ZeroBorg instance to poll
+minInterval             Poll interval in seconds straight after a message has been received
+maxInterval             Longest poll interval, reached after a run of idle polls
+backoff                 Factor the poll interval grows by after each idle poll
+Callbacks are looked up by code in a dictionary built with addCode(), codes without an entry go to the default
+callback if one is set. Each callback is called as callback(payload) with the raw message bytes.
+    """
+
+    def __init__(self, zeroBorg, minInterval=0.01, maxInterval=0.2, backoff=1.5):
+        self._zeroBorg=zeroBorg
+        self._minInterval=minInterval
+        self._maxInterval=maxInterval
+        self._backoff=backoff
+        self._interval=maxInterval
+        self._actions={}
+        self._default=None
+        self._polls=0
+        self._messages=0
+        self._errors=0
+        self._thread=None
+        self._stopEvent=threading.Event()
+
+    @property
+    def interval(self):
+        """The current poll interval in seconds"""
+        return self._interval
+
+    @property
+    def polls(self):
+        """Number of polls made since the listener was created"""
+        return self._polls
+
+    @property
+    def messages(self):
+        """Number of messages received since the listener was created"""
+        return self._messages
+
+    @property
+    def errors(self):
+        """Number of polls which raised an exception, e.g. a failed read with raiseErrors set"""
+        return self._errors
+
+    def addCode(self, code, callback):
+        """
+        addCode(code, callback)
+        Calls callback(payload) whenever the IR code is received, code is bytes or a hexadecimal string (see irCode)
+        """
+        self._actions[irCode(code)]=callback
+
+    def removeCode(self, code):
+        """
+        removeCode(code)
+        Stops dispatching the IR code
+        """
+        self._actions.pop(irCode(code), None)
+
+    def setDefault(self, callback):
+        """
+        setDefault(callback)
+        Calls callback(payload) for codes without their own callback, None to ignore them
+        """
+        self._default=callback
+
+    def start(self):
+        """
+        start()
+        Starts the polling thread
+        """
+        if self._thread is not None and self._thread.is_alive(): return
+        self._stopEvent.clear()
+        self._thread=threading.Thread(target=self._run, name="ZeroBorgIRListener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        stop()
+        Stops the polling thread and waits for it to finish
+        """
+        self._stopEvent.set()
+        if self._thread is not None and self._thread is not threading.current_thread(): self._thread.join()
+        self._thread=None
+
+    def poll(self):
+        """
+        payload = poll()
+        Checks for a new IR message once, dispatching it if there is one, and adapts the poll interval.
+        Returns the message bytes, None if there was no new message.
+        """
+        self._polls+=1
+        payload=self._zeroBorg.readNewIR()
+        if payload is None:
+            self._interval=min(self._interval*self._backoff, self._maxInterval)
+            return
+
+        self._messages+=1
+        self._interval=self._minInterval
+        action=self._actions.get(payload.rstrip(b'\0'), self._default)
+        if action is not None:
+            try: action(payload)
+            except KeyboardInterrupt: raise
+            except Exception as e: self._zeroBorg.print("IR callback failed: {}".format(e))
+        return payload
+
+    def _run(self):
+        deadline=time.monotonic()
+        while not self._stopEvent.is_set():
+            try: self.poll()
+            except Exception as e:
+                # Back off to the longest interval rather than ending the thread or hammering a failing bus
+                self._errors+=1
+                self._interval=self._maxInterval
+                self._zeroBorg.print("IR poll failed: {}".format(e))
+            deadline=max(deadline+self._interval, time.monotonic())
+            if self._stopEvent.wait(deadline-time.monotonic()): return
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+
+if __name__=="__main__":
+    IRListener.help()
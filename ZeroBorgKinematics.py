@@ -0,0 +1,100 @@
+try: import numpy
+except ImportError: numpy=None
+
+import ZeroBorg
+from ZeroBorg import PWM_MAX
+
+# Rows give each motor's power from (vx, vy, omega): forward speed, speed to the left and turn rate anticlockwise
+LAYOUTS={
+    # Motor 1 drives the left track, motor 2 the right track
+    "tank": ((1.0, 0.0, -1.0), (1.0, 0.0, 1.0), (0.0, 0.0, 0.0), (0.0, 0.0, 0.0)),
+    # Motors 1 front left, 2 front right, 3 rear left, 4 rear right
+    "skid": ((1.0, 0.0, -1.0), (1.0, 0.0, 1.0), (1.0, 0.0, -1.0), (1.0, 0.0, 1.0)),
+    "mecanum": ((1.0, -1.0, -1.0), (1.0, 1.0, 1.0), (1.0, 1.0, -1.0), (1.0, -1.0, 1.0)),
+}
+
+class Mixer(object):
+    """
+Turns body velocity commands into the four ZeroBorg motor powers
+layout                  Name from LAYOUTS ("tank", "skid" or "mecanum") or four (vx, vy, omega) rows of your own
+invert                  Four booleans, True for a motor wired or mounted backwards
+trim                    Four factors from 0 to 1 scaling each motor, to even out mismatched motors
+Commands are (vx, vy, omega) from -1 to +1: forward, sideways to the left (mecanum only) and turning anticlockwise.
+If any motor would need more than full power every motor is scaled down by the same factor, so the robot
+keeps its direction of travel and only loses speed. Trim and inversion are applied after that.
+    """
+
+    def __init__(self, layout="skid", invert=(False, False, False, False), trim=(1.0, 1.0, 1.0, 1.0)):
+        self._matrix=[list(row) for row in (LAYOUTS[layout] if isinstance(layout, str) else layout)]
+        if len(self._matrix)!=4 or any(len(row)!=3 for row in self._matrix):
+            raise ValueError("A layout needs four (vx, vy, omega) rows")
+        self._gain=[(-1.0 if inverted else 1.0)*factor for inverted, factor in zip(invert, trim)]
+        if numpy is not None:
+            self._numpyMatrix=numpy.array(self._matrix, dtype=numpy.float64).T
+            self._numpyGain=numpy.array(self._gain, dtype=numpy.float64)
+
+    def mix(self, vx, vy=0.0, omega=0.0):
+        """
+        power1, power2, power3, power4 = mix(vx, [vy], [omega])
+        Returns the motor powers, from +1 to -1, for one velocity command
+        """
+        powers=[row[0]*vx+row[1]*vy+row[2]*omega for row in self._matrix]
+        peak=max(abs(power) for power in powers)
+        scale=1.0/peak if peak>1.0 else 1.0
+        return tuple(max(-1.0, min(power*scale*gain, 1.0)) for power, gain in zip(powers, self._gain))
+
+    def mixArcade(self, throttle, steer):
+        """
+        power1, power2, power3, power4 = mixArcade(throttle, steer)
+        As mix() for a joystick style command, throttle forwards and steer to the right, each from -1 to +1
+        """
+        return self.mix(throttle, 0.0, -steer)
+
+    def drive(self, zeroBorg, vx, vy=0.0, omega=0.0):
+        """
+        count = drive(zeroBorg, vx, [vy], [omega])
+        Mixes one velocity command and sends it to zeroBorg with setMotorFrame, returning its result
+        """
+        return zeroBorg.setMotorFrame(*self.mix(vx, vy, omega))
+
+    def mixBatch(self, commands):
+        """
+        powers = mixBatch(commands)
+        Mixes a whole trajectory at once, commands is a sequence of (vx, [vy], [omega]) rows.
+        Returns an N x 4 NumPy array of motor powers if NumPy is installed, a list of 4-tuples otherwise.
+        """
+        if numpy is None:
+            return [self.mix(*command) for command in commands]
+
+        if len(commands)==0: return numpy.zeros((0, 4))
+        commands=numpy.asarray(commands, dtype=numpy.float64).reshape(len(commands), -1)
+        if commands.shape[1]<3:
+            commands=numpy.hstack((commands, numpy.zeros((len(commands), 3-commands.shape[1]))))
+        powers=commands@self._numpyMatrix
+        peak=numpy.abs(powers).max(axis=1, keepdims=True)
+        powers/=numpy.maximum(peak, 1.0)
+        powers*=self._numpyGain
+        return numpy.clip(powers, -1.0, 1.0, out=powers)
+
+    def pwmBatch(self, commands):
+        """
+        pwm = pwmBatch(commands)
+        As mixBatch(), returning the signed PWM values ZeroBorg sends (int(255*power), negative for reverse).
+        Returns an N x 4 int16 NumPy array if NumPy is installed, a list of 4-tuples otherwise.
+        """
+        powers=self.mixBatch(commands)
+        if numpy is None:
+            return [tuple(int(PWM_MAX*power) for power in row) for row in powers]
+        return numpy.trunc(powers*PWM_MAX).astype(numpy.int16)
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+
+if __name__=="__main__":
+    Mixer.help()
@@ -0,0 +1,290 @@
+import time, threading, math
+
+import ZeroBorg
+from ZeroBorg import PWM_MAX
+
+def quantize(power):
+    """
+    pwm = quantize(power)
+    Returns the signed PWM byte ZeroBorg sends for power, negative for reverse
+    """
+    pwm=int(PWM_MAX*power)
+    return max(-PWM_MAX, min(pwm, PWM_MAX))
+
+def trapezoidalProfile(start, target, rate, dt):
+    """
+    powers, rates = trapezoidalProfile(start, target, rate, dt)
+    Ramps power from start to target changing by at most rate per second, sampled every dt seconds.
+    Returns the power and rate of change at each tick, the last power is always target.
+    """
+    steps=max(1, int(math.ceil(abs(target-start)/(rate*dt)-1e-9)))
+    step=(target-start)/steps
+    slew=step/dt
+    powers=[start+step*(i+1) for i in range(steps)]
+    powers[-1]=target
+    return powers, [slew]*(steps-1)+[0.0]
+
+def sCurveProfile(start, target, rate, acceleration, dt, startRate=0.0):
+    """
+    powers, rates = sCurveProfile(start, target, rate, acceleration, dt, [startRate])
+    Ramps power from start to target changing by at most rate per second, with the rate of change itself
+    changing by at most acceleration per second squared, so the ramp eases in and out. startRate lets a new
+    ramp continue smoothly from one in progress. Returns the power and rate of change at each tick.
+    """
+    powers=[]
+    rates=[]
+    power, slew=start, startRate
+    tolerance=0.5/PWM_MAX
+    while True:
+        error=target-power
+        if abs(error)<=tolerance and abs(slew)<=acceleration*dt: break
+
+        # Fastest rate which can still be brought to zero by the target
+        wanted=math.copysign(min(rate, math.sqrt(2.0*acceleration*abs(error))), error)
+        change=max(-acceleration*dt, min(wanted-slew, acceleration*dt))
+        slew+=change
+        power+=slew*dt
+        if (target-power)*error<0: power, slew=target, 0.0 # Overshot
+        powers.append(power)
+        rates.append(slew)
+        if len(powers)>100000: break
+
+    if not powers or powers[-1]!=target:
+        powers.append(target)
+        rates.append(0.0)
+    else: rates[-1]=0.0
+    return powers, rates
+
+def pwmChanges(powers):
+    """
+    changes = pwmChanges(powers)
+    Returns the indices in powers where the quantized PWM byte differs from the previous entry
+    """
+    changes=[]
+    previous=None
+    for index, power in enumerate(powers):
+        pwm=quantize(power)
+        if pwm!=previous: changes.append(index)
+        previous=pwm
+    return changes
+
+class _Plan(object):
+    __slots__=("startTick", "powers", "rates", "changes", "next")
+
+    def __init__(self, startTick, powers, rates):
+        self.startTick=startTick
+        self.powers=powers
+        self.rates=rates
+        self.changes=pwmChanges(powers)
+        self.next=0
+
+class MotionController(object):
+    """
+Streams ramped motor commands to a ZeroBorg from a fixed rate scheduler thread
+zeroBorg                The ZeroBorg instance to drive
+tick                    Scheduler period in seconds
+Each motor has a rate limit (power per second) and an optional acceleration limit (power per second squared),
+giving a trapezoidal ramp without one and an S-curve ramp with one. Ramps are computed when a move starts,
+and the scheduler only writes to the bus on ticks where a motor's quantized PWM byte changes.
+    """
+
+    def __init__(self, zeroBorg, tick=0.01):
+        self._zeroBorg=zeroBorg
+        self._tick=tick
+        self._rate=[1.0]*4
+        self._acceleration=[None]*4
+        self._plans=[None]*4
+        self._power=[0.0]*4
+        self._slew=[0.0]*4
+        self._sent=[None]*4
+        self._tickCount=0
+        self._generation=0
+        self._lock=threading.Lock()
+        self._writeLock=threading.Lock()
+        self._idle=threading.Condition(self._lock)
+        self._thread=None
+        self._stopEvent=threading.Event()
+        self.resetStats()
+
+    def setLimits(self, motor, rate, acceleration=None):
+        """
+        setLimits(motor, rate, [acceleration])
+        Sets the ramp limits of motor 1 to 4, rate in power per second (1 ramps from stopped to full in a second),
+        acceleration in power per second squared for an S-curve ramp, None for a trapezoidal ramp
+        """
+        self._rate[motor-1]=rate
+        self._acceleration[motor-1]=acceleration
+
+    def getPower(self, motor):
+        """
+        power = getPower(motor)
+        Returns the power the profile of motor 1 to 4 has reached
+        """
+        return self._power[motor-1]
+
+    def moveTo(self, motor, target, blend=False):
+        """
+        moveTo(motor, target, [blend])
+        Starts ramping motor 1 to 4 to target power, from +1 to -1, replacing any ramp in progress.
+        The new ramp starts from the power already reached. If blend is True an S-curve ramp also keeps the current
+        rate of change so the move continues smoothly, otherwise the rate of change starts again from zero.
+        """
+        index=motor-1
+        target=max(-1.0, min(target, 1.0))
+        with self._lock:
+            start=self._power[index]
+            if self._acceleration[index] is None:
+                powers, rates=trapezoidalProfile(start, target, self._rate[index], self._tick)
+            else:
+                startRate=self._slew[index] if blend else 0.0
+                powers, rates=sCurveProfile(start, target, self._rate[index], self._acceleration[index],
+                    self._tick, startRate)
+            self._plans[index]=_Plan(self._tickCount+1, powers, rates)
+
+    def moveAll(self, targets, blend=False):
+        """
+        moveAll(targets, [blend])
+        Starts ramping all four motors, targets holds four powers, None leaves a motor's ramp alone
+        """
+        for motor, target in enumerate(targets, 1):
+            if target is not None: self.moveTo(motor, target, blend)
+
+    def stopAll(self):
+        """
+        stopAll()
+        Abandons every ramp and sends motors off straight away
+        """
+        with self._lock:
+            self._plans=[None]*4
+            self._power=[0.0]*4
+            self._slew=[0.0]*4
+            self._sent=[0]*4
+            self._generation+=1
+            self._idle.notify_all()
+        # Waits for a step already writing to finish, so none of its writes can land after the stop
+        with self._writeLock: self._zeroBorg.motorsOff()
+
+    def isIdle(self, motor=None):
+        """
+        state = isIdle([motor])
+        True if motor 1 to 4, or every motor if None, has no ramp in progress
+        """
+        if motor is None: return all(plan is None for plan in self._plans)
+        return self._plans[motor-1] is None
+
+    def wait(self, timeout=None):
+        """
+        state = wait([timeout])
+        Waits until every ramp has finished, returns False if timeout seconds passed first
+        """
+        with self._idle: return self._idle.wait_for(self.isIdle, timeout)
+
+    def start(self):
+        """
+        start()
+        Starts the scheduler thread
+        """
+        if self._thread is not None and self._thread.is_alive(): return
+        self._stopEvent.clear()
+        self._thread=threading.Thread(target=self._run, name="ZeroBorgMotion", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        stop()
+        Stops the scheduler thread, leaving the motors at their last level
+        """
+        self._stopEvent.set()
+        if self._thread is not None: self._thread.join()
+        self._thread=None
+
+    def resetStats(self):
+        """
+        resetStats()
+        Clears the scheduler statistics
+        """
+        self._ticks=0
+        self._writes=0
+        self._suppressed=0
+        self._overruns=0
+        self._errors=0
+
+    def getStats(self):
+        """
+        stats = getStats()
+        Returns the scheduler statistics as a dictionary: ticks run, writes sent, suppressed (ticks where a ramp
+        advanced without changing the PWM byte), overruns (ticks skipped because the scheduler fell behind) and errors
+        (ticks whose writes raised an exception)
+        """
+        return {"ticks": self._ticks, "writes": self._writes, "suppressed": self._suppressed, "overruns": self._overruns,
+            "errors": self._errors}
+
+    def step(self):
+        """
+        step()
+        Advances every ramp by one tick and writes the motors whose PWM byte changed, called by the scheduler thread
+        """
+        writes=[]
+        with self._lock:
+            self._tickCount+=1
+            tick=self._tickCount
+            for index, plan in enumerate(self._plans):
+                if plan is None: continue
+                offset=tick-plan.startTick
+                if offset<0: continue
+                offset=min(offset, len(plan.powers)-1)
+                power=plan.powers[offset]
+                self._power[index]=power
+                self._slew[index]=plan.rates[offset]
+
+                # Only ticks where the precomputed PWM byte changes need a write
+                changed=plan.next<len(plan.changes) and plan.changes[plan.next]==offset
+                if changed: plan.next+=1
+                pwm=quantize(power) if changed else None
+                if changed and pwm!=self._sent[index]:
+                    self._sent[index]=pwm
+                    writes.append((index, power))
+                else: self._suppressed+=1
+
+                if offset==len(plan.powers)-1:
+                    self._plans[index]=None
+                    self._slew[index]=0.0
+            if self.isIdle(): self._idle.notify_all()
+            self._ticks+=1
+            generation=self._generation
+            powers=list(self._power)
+
+        if not writes: return
+        zeroBorg=self._zeroBorg
+        with self._writeLock:
+            # A stopAll() since the writes were worked out has already sent motors off, they are stale
+            if generation!=self._generation: return
+            if len(writes)==4: zeroBorg.setMotorFrame(*powers)
+            else:
+                setters=(zeroBorg.setMotor1, zeroBorg.setMotor2, zeroBorg.setMotor3, zeroBorg.setMotor4)
+                for index, power in writes: setters[index](power)
+        self._writes+=len(writes)
+
+    def _run(self):
+        # Missed ticks are skipped, falling back into step rather than bursting through them
+        schedule=ZeroBorg.Scheduler(self._tick, self._stopEvent)
+        while not self._stopEvent.is_set():
+            # A write raising (raiseErrors set) must not end the thread, the next change is written as usual
+            try: self.step()
+            except Exception as e:
+                self._errors+=1
+                self._zeroBorg.print("MotionController step failed: {}".format(e))
+            self._overruns+=schedule.advance()
+            if schedule.wait(): return
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+
+if __name__=="__main__":
+    MotionController.help()
@@ -0,0 +1,318 @@
+import time, struct, threading, queue, os, mmap, collections
+
+import ZeroBorg
+
+MAGIC=b"ZBREC\x02"
+HEADER=struct.Struct("<6sHdd")         # magic, record size, time.time() and time.monotonic() taken together
+RECORD=struct.Struct("<dfBBBBB3x24s") # timestamp, latency, operation, address, command, status, length, payload
+
+OP_READ=0           # read_i2c_block_data, payload is the reply
+OP_WRITE=1          # write_byte_data, payload is the value
+OP_READ_BYTE=2      # read_byte, payload is the byte read
+OP_WRITE_QUICK=3    # write_quick, no payload
+
+STATUS_OK=0
+STATUS_ERROR=1
+
+Record=collections.namedtuple("Record", ("timestamp", "latency", "operation", "address", "command", "status", "payload"))
+Record.__doc__="""
+One logged I\u00B2C transaction
+timestamp               time.monotonic() when the transaction started
+latency                 Seconds the transaction took
+operation               OP_READ, OP_WRITE, OP_READ_BYTE or OP_WRITE_QUICK
+address                 I\u00B2C address of the transaction
+command                 Command byte, 0 for read_byte and write_quick
+status                  STATUS_OK, or STATUS_ERROR if the bus raised
+payload                 Bytes written or read, for OP_READ its length is the length requested
+"""
+
+class BusRecorder(ZeroBorg.Transport):
+    """
+Stand in for smbus.SMBus which passes every transaction to a real bus and logs it to a binary file
+path                    File to log to, rotated to path.1, path.2 ... when it grows past maxBytes
+bus                     Bus to pass transactions to, if None it is opened by calling the recorder with a bus number
+busFactory              Function called with busNumber to open bus, if None ZeroBorg.openSMBus is used
+bufferRecords           Records collected in memory before they are handed to the writer thread
+maxBytes                Size a log file may reach before it is rotated, 0 never rotates
+backups                 Number of rotated files kept
+flushInterval           Seconds after which a partly filled buffer is written anyway
+Every record has the fixed RECORD layout and each file starts with a HEADER, so rotated files can be replayed on their own.
+The HEADER anchors the monotonic record timestamps to the wall clock. A log already at path is rotated when recording
+starts, as monotonic time does not carry over a reboot.
+Disk writes happen on a background thread, the calling thread only packs records into a preallocated buffer.
+Use ZeroBorg.busFactory=recorder so the ZeroBorg's bus is recorded, close() closes the real bus and stop() the log.
+    """
+
+    def __init__(self, path, bus=None, busFactory=None, bufferRecords=256, maxBytes=16*1024*1024, backups=5,
+            flushInterval=1.0):
+        self._path=path
+        self._bus=bus
+        self._busFactory=busFactory
+        self._capacity=bufferRecords*RECORD.size
+        self._buffer=bytearray(self._capacity)
+        self._used=0
+        self._maxBytes=maxBytes
+        self._backups=backups
+        self._flushInterval=flushInterval
+        self._lock=threading.Lock()
+        self._queue=queue.SimpleQueue()
+        self._file=None
+        self.records=0
+        self.dropped=0
+        self._thread=threading.Thread(target=self._run, name="ZeroBorgRecorder", daemon=True)
+        self._thread.start()
+
+    def __call__(self, busNumber):
+        # Lets the recorder stand in for smbus.SMBus as a ZeroBorg.busFactory
+        if self._bus is None: self._bus=(self._busFactory or ZeroBorg.openSMBus)(busNumber)
+        return self
+
+    def _record(self, started, operation, address, command, status, payload):
+        latency=time.monotonic()-started
+        with self._lock:
+            RECORD.pack_into(self._buffer, self._used, started, latency, operation, address, command, status,
+                len(payload), bytes(payload))
+            self._used+=RECORD.size
+            self.records+=1
+            if self._used>=self._capacity: self._handOff()
+
+    def _handOff(self):
+        # Called with the lock held, the writer thread gets a copy so the buffer can be reused straight away
+        if self._used:
+            self._queue.put(bytes(self._buffer[:self._used]))
+            self._used=0
+
+    def read_i2c_block_data(self, address, command, length):
+        started=time.monotonic()
+        try: result=self._bus.read_i2c_block_data(address, command, length)
+        except:
+            self._record(started, OP_READ, address, command, STATUS_ERROR, bytes(length))
+            raise
+        self._record(started, OP_READ, address, command, STATUS_OK, (list(result)+[0]*length)[:length])
+        return result
+
+    def write_byte_data(self, address, command, value):
+        started=time.monotonic()
+        try: self._bus.write_byte_data(address, command, value)
+        except:
+            self._record(started, OP_WRITE, address, command, STATUS_ERROR, (value,))
+            raise
+        self._record(started, OP_WRITE, address, command, STATUS_OK, (value,))
+
+    def read_byte(self, address):
+        started=time.monotonic()
+        try: result=self._bus.read_byte(address)
+        except:
+            self._record(started, OP_READ_BYTE, address, 0, STATUS_ERROR, b"")
+            raise
+        self._record(started, OP_READ_BYTE, address, 0, STATUS_OK, (result,))
+        return result
+
+    def write_quick(self, address):
+        started=time.monotonic()
+        try: self._bus.write_quick(address)
+        except:
+            self._record(started, OP_WRITE_QUICK, address, 0, STATUS_ERROR, b"")
+            raise
+        self._record(started, OP_WRITE_QUICK, address, 0, STATUS_OK, b"")
+
+    @property
+    def combined(self):
+        """True if the real bus sends writeRegisters and readRegisters as one combined transaction"""
+        return getattr(self._bus, "combined", False)
+
+    def writeRegisters(self, address, writes):
+        """
+        writeRegisters(address, writes)
+        Passes the writes to the real bus as one combined transaction if it supports them, logging each write
+        """
+        if not self.combined: return ZeroBorg.Transport.writeRegisters(self, address, writes)
+        started=time.monotonic()
+        try: self._bus.writeRegisters(address, writes)
+        except:
+            for command, value in writes: self._record(started, OP_WRITE, address, command, STATUS_ERROR, (value,))
+            raise
+        for command, value in writes: self._record(started, OP_WRITE, address, command, STATUS_OK, (value,))
+
+    def readRegisters(self, address, reads):
+        """
+        replies = readRegisters(address, reads)
+        Passes the reads to the real bus as one combined transaction if it supports them, logging each read
+        """
+        if not self.combined: return ZeroBorg.Transport.readRegisters(self, address, reads)
+        started=time.monotonic()
+        try: replies=self._bus.readRegisters(address, reads)
+        except:
+            for command, length in reads: self._record(started, OP_READ, address, command, STATUS_ERROR, bytes(length))
+            raise
+        for (command, length), reply in zip(reads, replies):
+            self._record(started, OP_READ, address, command, STATUS_OK, (list(reply)+[0]*length)[:length])
+        return replies
+
+    def close(self):
+        """
+        close()
+        Closes the real bus, the log keeps running until stop() is called
+        """
+        bus, self._bus=self._bus, None
+        if bus is not None: bus.close()
+
+    def flush(self):
+        """
+        flush()
+        Hands any buffered records to the writer thread
+        """
+        with self._lock: self._handOff()
+
+    def stop(self):
+        """
+        stop()
+        Writes any buffered records, waits for the writer thread and closes the log file
+        """
+        if not self._thread.is_alive(): return
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _open(self):
+        if os.path.exists(self._path) and os.path.getsize(self._path)>0: self._shift()
+        self._file=open(self._path, "wb")
+        self._file.write(HEADER.pack(MAGIC, RECORD.size, time.time(), time.monotonic()))
+
+    def _rotate(self):
+        self._file.close()
+        self._shift()
+        self._open()
+
+    def _shift(self):
+        for index in range(self._backups-1, 0, -1):
+            source="{}.{}".format(self._path, index)
+            if os.path.exists(source): os.replace(source, "{}.{}".format(self._path, index+1))
+        if self._backups: os.replace(self._path, self._path+".1")
+        else: os.remove(self._path)
+
+    def _run(self):
+        try: self._open()
+        except OSError as e: ZeroBorg.logger.error("Cannot open ZeroBorg recording {}: {}".format(self._path, e))
+        while True:
+            try: chunk=self._queue.get(timeout=self._flushInterval)
+            except queue.Empty:
+                self.flush()
+                continue
+            if chunk is None: break
+            if self._file is None:
+                self.dropped+=len(chunk)//RECORD.size
+                continue
+            try:
+                self._file.write(chunk)
+                if self._maxBytes and self._file.tell()>=self._maxBytes: self._rotate()
+            except OSError as e:
+                self.dropped+=len(chunk)//RECORD.size
+                ZeroBorg.logger.warning("Failed writing ZeroBorg recording {}: {}".format(self._path, e))
+        if self._file is not None: self._file.close()
+        self._file=None
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+class BusReplayer(object):
+    """
+Reads a BusRecorder log through a read only memory map and drives its transactions against a bus again
+path                    Log file written by BusRecorder
+wallClock               time.time() when the log file was started
+monotonic               time.monotonic() at the same moment, the clock record timestamps are in
+Records are only unpacked when they are used, so large logs open instantly.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            size=os.fstat(f.fileno()).st_size
+            self._map=mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if len(self._map)<HEADER.size: raise ValueError("{} is not a ZeroBorg recording".format(path))
+        magic, recordSize, self.wallClock, self.monotonic=HEADER.unpack_from(self._map, 0)
+        if magic!=MAGIC or recordSize!=RECORD.size: raise ValueError("{} is not a ZeroBorg recording".format(path))
+        # A record cut short by a crash is ignored
+        self._count=(len(self._map)-HEADER.size)//RECORD.size
+
+    def __len__(self): return self._count
+
+    def __getitem__(self, index):
+        if index<0: index+=self._count
+        if not 0<=index<self._count: raise IndexError("record index out of range")
+        timestamp, latency, operation, address, command, status, length, payload=RECORD.unpack_from(
+            self._map, HEADER.size+index*RECORD.size)
+        return Record(timestamp, latency, operation, address, command, status, payload[:length])
+
+    def __iter__(self):
+        for index in range(self._count): yield self[index]
+
+    def toWallClock(self, timestamp):
+        """
+        seconds = toWallClock(timestamp)
+        Converts a record timestamp to time.time() seconds, for lining the log up with other logs from the robot
+        """
+        return self.wallClock+(timestamp-self.monotonic)
+
+    def close(self):
+        """
+        close()
+        Releases the memory map
+        """
+        if isinstance(self._map, mmap.mmap): self._map.close()
+
+    def replay(self, bus, speed=1.0, compare=True, skipErrors=True):
+        """
+        stats = replay(bus, [speed], [compare], [skipErrors])
+        Sends every logged transaction to bus, an smbus.SMBus or ZeroBorgEmulator.
+        speed scales the recorded timing, 1 replays in real time, 10 ten times faster, None as fast as possible.
+        If compare is True replies are checked against the log. Transactions which failed when recorded are
+        skipped if skipErrors is True. Returns a dictionary with the number of transactions sent, errors raised
+        by bus, mismatches (replies differing from the log), the duration in seconds and lateMax, the worst lateness
+        against the scaled timing in seconds.
+        """
+        stats={"transactions": 0, "errors": 0, "mismatches": 0, "duration": 0.0, "lateMax": 0.0}
+        if not self._count: return stats
+        first=self[0].timestamp
+        started=time.monotonic()
+        for record in self:
+            if skipErrors and record.status!=STATUS_OK: continue
+            if speed:
+                due=started+(record.timestamp-first)/speed
+                delay=due-time.monotonic()
+                if delay>0: time.sleep(delay)
+                elif -delay>stats["lateMax"]: stats["lateMax"]=-delay
+
+            stats["transactions"]+=1
+            try:
+                if record.operation==OP_READ:
+                    result=bytes(bus.read_i2c_block_data(record.address, record.command, len(record.payload)))
+                elif record.operation==OP_WRITE:
+                    result=bus.write_byte_data(record.address, record.command, record.payload[0])
+                elif record.operation==OP_READ_BYTE: result=bytes((bus.read_byte(record.address),))
+                else: result=bus.write_quick(record.address)
+            except Exception:
+                stats["errors"]+=1
+                continue
+            if compare and record.operation in (OP_READ, OP_READ_BYTE) and result!=record.payload:
+                stats["mismatches"]+=1
+
+        stats["duration"]=time.monotonic()-started
+        return stats
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+
+if __name__=="__main__":
+    BusRecorder.help()
+    BusReplayer.help()
@@ -0,0 +1,192 @@
+import time, threading, array, math
+
+try: import numpy
+except ImportError: numpy=None
+
+import ZeroBorg
+
+class AnalogSampler(object):
+    """
+Samples the ZeroBorg analog ports at a fixed rate on a background thread into a preallocated ring buffer
+zeroBorg                The ZeroBorg instance to sample
+rate                    Samples per second
+size                    Number of samples kept per port
+ports                   Analog ports to sample, any of 1 and 2
+Raw 10-bit readings and monotonic timestamps are stored in NumPy arrays if NumPy is installed, array.array otherwise.
+Every sample is written twice, size apart, so the newest samples are always contiguous and can be handed out
+as views without copying. Failed reads are stored as FAILED (0xFFFF) in the raw readings, which become NaN
+in voltages and are left out of averages and statistics.
+    """
+
+    FAILED=0xFFFF
+
+    def __init__(self, zeroBorg, rate=100.0, size=1024, ports=(1, 2)):
+        self._zeroBorg=zeroBorg
+        self._interval=1.0/rate
+        self._size=size
+        self._ports=tuple(ports)
+        if numpy is not None:
+            self._times=numpy.zeros(2*size, dtype=numpy.float64)
+            self._raw={port: numpy.zeros(2*size, dtype=numpy.uint16) for port in self._ports}
+        else:
+            self._times=array.array("d", bytes(8*2*size))
+            self._raw={port: array.array("H", bytes(2*2*size)) for port in self._ports}
+        self._count=0
+        self._overruns=0
+        self._thread=None
+        self._stopEvent=threading.Event()
+
+    @property
+    def count(self):
+        """Total number of samples taken since the sampler was created"""
+        return self._count
+
+    @property
+    def overruns(self):
+        """Number of sample deadlines which were missed and skipped"""
+        return self._overruns
+
+    def start(self):
+        """
+        start()
+        Starts the sampling thread
+        """
+        if self._thread is not None and self._thread.is_alive(): return
+        self._stopEvent.clear()
+        self._thread=threading.Thread(target=self._run, name="ZeroBorgAnalogSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        stop()
+        Stops the sampling thread and waits for it to finish
+        """
+        self._stopEvent.set()
+        if self._thread is not None: self._thread.join()
+        self._thread=None
+
+    def _run(self):
+        schedule=ZeroBorg.Scheduler(self._interval, self._stopEvent)
+        while not self._stopEvent.is_set():
+            self.sample()
+            self._overruns+=schedule.advance()
+            if schedule.wait(): return
+
+    def sample(self):
+        """
+        sample()
+        Takes one sample of every port now and stores it in the ring buffer, called by the sampling thread
+        """
+        zeroBorg=self._zeroBorg
+        index=self._count%self._size
+        stamp=time.monotonic()
+        for port in self._ports:
+            try: raw=zeroBorg.getAnalogRaw(port)
+            except Exception: raw=None # Raised when raiseErrors is set, stored like any other failed read
+            if raw is None: raw=self.FAILED
+            samples=self._raw[port]
+            samples[index]=samples[index+self._size]=raw
+        self._times[index]=self._times[index+self._size]=stamp
+        self._count+=1
+
+    def _window(self, buffer, count):
+        available=min(self._count, self._size)
+        if count is None or count>available: count=available
+        end=self._count%self._size+self._size
+        if numpy is not None: return buffer[end-count:end]
+        return memoryview(buffer)[end-count:end]
+
+    def snapshot(self, port=1, count=None):
+        """
+        timestamps, raw = snapshot([port], [count])
+        Returns views of the newest count samples (all stored samples if None) of port, oldest first, without copying.
+        The views share memory with the ring buffer, copy them if they must outlive the next size samples.
+        """
+        count=self._count if count is None else count
+        return self._window(self._times, count), self._window(self._raw[port], count)
+
+    def decimate(self, factor, port=1, count=None):
+        """
+        timestamps, raw = decimate(factor, [port], [count])
+        As snapshot(), keeping every factor-th sample, still without copying
+        """
+        timestamps, raw=self.snapshot(port, count)
+        return timestamps[::factor], raw[::factor]
+
+    @staticmethod
+    def toVolts(raw):
+        """
+        voltages = AnalogSampler.toVolts(raw)
+        Converts raw 10-bit readings to voltages, as a NumPy array if NumPy is installed, a list otherwise.
+        Failed reads (FAILED) become NaN.
+        """
+        scale=ZeroBorg.ANALOG_VREF/float(ZeroBorg.Command.AnalogMax)
+        if numpy is not None:
+            raw=numpy.asarray(raw)
+            return numpy.where(raw==AnalogSampler.FAILED, numpy.nan, raw*scale)
+        return [math.nan if value==AnalogSampler.FAILED else value*scale for value in raw]
+
+    def volts(self, port=1, count=None):
+        """
+        timestamps, voltages = volts([port], [count])
+        As snapshot(), with the readings converted to voltages
+        """
+        timestamps, raw=self.snapshot(port, count)
+        return timestamps, self.toVolts(raw)
+
+    def movingAverage(self, window, port=1, count=None):
+        """
+        voltages = movingAverage(window, [port], [count])
+        Returns the moving average, over window samples, of the newest count samples of port in volts.
+        Failed reads are left out of each average, a window of nothing but failed reads averages to NaN.
+        """
+        voltages=self.volts(port, count)[1]
+        if len(voltages)<window: return voltages[:0]
+        if numpy is not None:
+            valid=~numpy.isnan(voltages)
+            total=numpy.cumsum(numpy.concatenate(([0.0], numpy.where(valid, voltages, 0.0))))
+            samples=numpy.cumsum(numpy.concatenate(([0], valid)))
+            with numpy.errstate(invalid="ignore", divide="ignore"):
+                return (total[window:]-total[:-window])/(samples[window:]-samples[:-window])
+
+        averages=[]
+        total=0.0
+        samples=0
+        for index, voltage in enumerate(voltages):
+            if voltage==voltage: # Not NaN
+                total+=voltage
+                samples+=1
+            if index>=window:
+                dropped=voltages[index-window]
+                if dropped==dropped:
+                    total-=dropped
+                    samples-=1
+            if index>=window-1: averages.append(total/samples if samples else math.nan)
+        return averages
+
+    def stats(self, port=1, count=None):
+        """
+        mean, minimum, maximum = stats([port], [count])
+        Returns the mean, minimum and maximum voltage of the newest count samples of port, leaving out failed reads.
+        None values if there are no good samples.
+        """
+        voltages=self.volts(port, count)[1]
+        if numpy is not None:
+            voltages=voltages[~numpy.isnan(voltages)]
+            if len(voltages)==0: return None, None, None
+            return float(voltages.mean()), float(voltages.min()), float(voltages.max())
+        voltages=[voltage for voltage in voltages if voltage==voltage]
+        if len(voltages)==0: return None, None, None
+        return sum(voltages)/len(voltages), min(voltages), max(voltages)
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+
+if __name__=="__main__":
+    AnalogSampler.help()
@@ -0,0 +1,363 @@
+import time, socket, select, struct, threading, math
+
+import ZeroBorg
+
+VERSION=1
+DEFAULT_PORT=50840
+
+OP_SET_MOTOR=1      # channel is the motor 1 to 4, value the power
+OP_SET_MOTORS=2     # value is the power for every motor
+OP_MOTORS_OFF=3
+OP_SET_LED=4        # channel is 1 for on, 0 for off
+OP_READ_STATE=5     # answered with a STATE packet
+OP_PING=6           # keeps the server failsafe satisfied without changing anything, once the client has set a motor
+
+PACKET=struct.Struct("<BBIBf")      # version, op, sequence, channel, value
+STATE=struct.Struct("<BBI4fB2f")    # version, op, sequence, motor powers, flags, analog voltages
+
+FLAG_LED=0x01
+FLAG_EPO=0x02
+FLAG_EPO_IGNORE=0x04
+FLAG_COMMS_FAILSAFE=0x08
+FLAG_LED_IR=0x10
+FLAG_FAILED=0x80    # the state could not be read
+
+_FLAGS=(("led", FLAG_LED), ("epo", FLAG_EPO), ("epoIgnore", FLAG_EPO_IGNORE), ("commsFailSafe", FLAG_COMMS_FAILSAFE),
+    ("ledIR", FLAG_LED_IR))
+
+def _newer(sequence, last):
+    # Sequence numbers wrap at 2**32, a packet is newer if it is less than half the range ahead
+    return 0<((sequence-last)&0xFFFFFFFF)<0x80000000
+
+class ZeroBorgServer(object):
+    """
+Owns a ZeroBorg and accepts commands for it from other processes as UDP packets
+zeroBorg                The ZeroBorg instance to drive
+host                    Address to listen on, keep to 127.0.0.1 unless other machines must reach the board
+port                    UDP port to listen on
+failsafeTimeout         Seconds without a packet from any client driving the motors after which motorsOff() is sent,
+                        None to disable
+refresh                 True to run the ZeroBorg state refresher so state reads are answered without waiting for the bus,
+                        unless a field has been written since it was last refreshed
+Each packet carries a sequence number, a packet older than the last one seen from the same client is dropped.
+Packets which arrive together are applied together: only the newest level for each motor is written (latest wins).
+Only clients which have set a motor keep the failsafe satisfied, a client which just reads the state does not.
+    """
+
+    def __init__(self, zeroBorg, host="127.0.0.1", port=DEFAULT_PORT, failsafeTimeout=0.25, refresh=True):
+        self._zeroBorg=zeroBorg
+        self._address=(host, port)
+        self._failsafeTimeout=failsafeTimeout
+        self._refresh=refresh
+        self._socket=None
+        self._thread=None
+        self._stopEvent=threading.Event()
+        self._clients={}
+        self._drivers=set()
+        self._lastPacket=0.0
+        self._moving=False
+        self.resetStats()
+
+    @property
+    def address(self):
+        """The (host, port) the server is listening on"""
+        return self._socket.getsockname() if self._socket is not None else self._address
+
+    def start(self):
+        """
+        start()
+        Opens the socket and starts the server thread
+        """
+        if self._thread is not None and self._thread.is_alive(): return
+        self._socket=socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(self._address)
+        self._socket.setblocking(False)
+        if self._refresh: self._zeroBorg.startStateRefresh()
+        self._stopEvent.clear()
+        self._lastPacket=time.monotonic()
+        self._thread=threading.Thread(target=self._run, name="ZeroBorgServer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        stop()
+        Stops the server thread and closes the socket, the motors are left as they are
+        """
+        self._stopEvent.set()
+        if self._thread is not None: self._thread.join()
+        self._thread=None
+        if self._refresh: self._zeroBorg.stopStateRefresh()
+        if self._socket is not None: self._socket.close()
+        self._socket=None
+
+    def resetStats(self):
+        """
+        resetStats()
+        Clears the server statistics
+        """
+        self._packets=0
+        self._stale=0
+        self._malformed=0
+        self._coalesced=0
+        self._batches=0
+        self._failsafeTrips=0
+        self._errors=0
+
+    def getStats(self):
+        """
+        stats = getStats()
+        Returns the server statistics as a dictionary:
+        packets         valid packets received
+        stale           packets dropped for an old sequence number
+        malformed       packets dropped for a bad size, version, operation or motor power
+        coalesced       motor commands replaced by a newer one before being written
+        batches         groups of packets applied together
+        failsafeTrips   times motorsOff() was sent because every client driving the motors went silent
+        errors          batches which raised an exception while being applied to the ZeroBorg
+        clients         number of clients seen
+        """
+        return {"packets": self._packets, "stale": self._stale, "malformed": self._malformed,
+            "coalesced": self._coalesced, "batches": self._batches, "failsafeTrips": self._failsafeTrips,
+            "errors": self._errors, "clients": len(self._clients)}
+
+    def _run(self):
+        sock=self._socket
+        interval=self._failsafeTimeout/4.0 if self._failsafeTimeout else 0.1
+        while not self._stopEvent.is_set():
+            readable=select.select((sock,), (), (), interval)[0]
+            if readable: self._serveBatch(sock)
+            if (self._failsafeTimeout is not None and self._moving
+                    and time.monotonic()-self._lastPacket>self._failsafeTimeout):
+                self._moving=False
+                self._drivers.clear()
+                self._failsafeTrips+=1
+                try: self._zeroBorg.motorsOff()
+                except Exception as e:
+                    self._errors+=1
+                    self._zeroBorg.print("ZeroBorgServer failsafe could not stop the motors: {}".format(e))
+
+    def _serveBatch(self, sock):
+        # Reads every packet already queued, then applies the newest value of each setting once
+        motors=[None]*4
+        off=False
+        led=None
+        reads=[]
+        alive=False
+        clients=self._clients
+        drivers=self._drivers
+        while True:
+            try: data, client=sock.recvfrom(64)
+            except (BlockingIOError, InterruptedError): break
+            except OSError: break # e.g. ICMP port unreachable from a client which has gone away
+
+            if len(data)!=PACKET.size:
+                self._malformed+=1
+                continue
+            version, op, sequence, channel, value=PACKET.unpack(data)
+            if version!=VERSION or (op in (OP_SET_MOTOR, OP_SET_MOTORS) and not -1.0<=value<=1.0): # Also NaN
+                self._malformed+=1
+                continue
+            last=clients.get(client)
+            if last is not None and not _newer(sequence, last):
+                self._stale+=1
+                continue
+            clients[client]=sequence
+            self._packets+=1
+
+            if op==OP_SET_MOTOR and 1<=channel<=4:
+                if motors[channel-1] is not None: self._coalesced+=1
+                motors[channel-1]=value
+                drivers.add(client)
+            elif op==OP_SET_MOTORS:
+                self._coalesced+=sum(1 for power in motors if power is not None)
+                motors=[value]*4
+                drivers.add(client)
+            elif op==OP_MOTORS_OFF:
+                self._coalesced+=sum(1 for power in motors if power is not None)
+                motors=[None]*4
+                off=True
+            elif op==OP_SET_LED: led=bool(channel)
+            elif op==OP_READ_STATE: reads.append((client, sequence))
+            elif op!=OP_PING:
+                self._malformed+=1
+                self._packets-=1
+                continue
+            if client in drivers: alive=True
+
+        if alive: self._lastPacket=time.monotonic()
+        if not (off or led is not None or reads or any(power is not None for power in motors)): return
+        self._batches+=1
+        # A failure applying one batch must not end the server thread, or the failsafe would stop with it
+        try: self._apply(sock, off, motors, led, reads)
+        except Exception as e:
+            self._errors+=1
+            self._zeroBorg.print("ZeroBorgServer failed applying commands: {}".format(e))
+
+    def _apply(self, sock, off, motors, led, reads):
+        zeroBorg=self._zeroBorg
+        if off:
+            zeroBorg.motorsOff()
+            self._moving=False
+        pending=[power for power in motors if power is not None]
+        if pending: self._moving=True
+        if len(pending)==4: zeroBorg.setMotorFrame(*motors)
+        elif pending:
+            setters=(zeroBorg.setMotor1, zeroBorg.setMotor2, zeroBorg.setMotor3, zeroBorg.setMotor4)
+            for setter, power in zip(setters, motors):
+                if power is not None: setter(power)
+        if led is not None: zeroBorg.setLED(led)
+
+        if reads:
+            state=zeroBorg.getState() if self._refresh else None
+            # A write in this batch, or in one the refresher has not caught up with, leaves that field without a
+            # timestamp, its old value must not be sent back as current
+            if state is None or any(field not in state.times for field in ZeroBorg.BoardState.FIELDS):
+                state=zeroBorg.readState()
+            for client, sequence in reads:
+                try: sock.sendto(_packState(sequence, state), client)
+                except OSError: pass
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+def _packState(sequence, state):
+    nan=float("nan")
+    if state is None: return STATE.pack(VERSION, OP_READ_STATE, sequence, nan, nan, nan, nan, FLAG_FAILED, nan, nan)
+    flags=0
+    for field, flag in _FLAGS:
+        if getattr(state, field): flags|=flag
+    values=[nan if value is None else value
+        for value in (state.motor1, state.motor2, state.motor3, state.motor4, state.analog1, state.analog2)]
+    return STATE.pack(VERSION, OP_READ_STATE, sequence, values[0], values[1], values[2], values[3], flags,
+        values[4], values[5])
+
+class ZeroBorgClient(object):
+    """
+Sends commands to a ZeroBorgServer, with the same names as the ZeroBorg methods they stand in for
+host                    Address of the server
+port                    UDP port of the server
+Commands are sent without waiting for an answer, only readState() waits for a reply.
+Once this client has set a motor, send a command or ping() at least every failsafeTimeout seconds to keep the
+server failsafe from stopping the motors.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self._socket=socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.connect((host, port))
+        self._sequence=0
+        self._lock=threading.Lock()
+
+    def _send(self, op, channel=0, value=0.0):
+        with self._lock:
+            self._sequence=(self._sequence+1)&0xFFFFFFFF
+            sequence=self._sequence
+            self._socket.send(PACKET.pack(VERSION, op, sequence, channel, value))
+        return sequence
+
+    def setMotor1(self, power):
+        """
+        setMotor1(power)
+        Sets the drive level for motor 1, from +1 to -1
+        """
+        self._send(OP_SET_MOTOR, 1, power)
+
+    def setMotor2(self, power):
+        """
+        setMotor2(power)
+        Sets the drive level for motor 2, from +1 to -1
+        """
+        self._send(OP_SET_MOTOR, 2, power)
+
+    def setMotor3(self, power):
+        """
+        setMotor3(power)
+        Sets the drive level for motor 3, from +1 to -1
+        """
+        self._send(OP_SET_MOTOR, 3, power)
+
+    def setMotor4(self, power):
+        """
+        setMotor4(power)
+        Sets the drive level for motor 4, from +1 to -1
+        """
+        self._send(OP_SET_MOTOR, 4, power)
+
+    def setMotors(self, power):
+        """
+        setMotors(power)
+        Sets the drive level for all motors, from +1 to -1
+        """
+        self._send(OP_SET_MOTORS, 0, power)
+
+    def motorsOff(self):
+        """
+        motorsOff()
+        Sets all motors to stopped
+        """
+        self._send(OP_MOTORS_OFF)
+
+    def setLED(self, state):
+        """
+        setLED(state)
+        Sets the current state of the LED, False for off, True for on
+        """
+        self._send(OP_SET_LED, 1 if state else 0)
+
+    def ping(self):
+        """
+        ping()
+        Tells the server this client is still there without changing anything
+        """
+        self._send(OP_PING)
+
+    def readState(self, timeout=0.1):
+        """
+        state = readState([timeout])
+        Asks the server for the board state, returns a ZeroBorg.BoardState or None if there was no answer within
+        timeout seconds or the server could not read the board
+        """
+        sequence=self._send(OP_READ_STATE)
+        deadline=time.monotonic()+timeout
+        while True:
+            remaining=deadline-time.monotonic()
+            if remaining<=0: return
+            self._socket.settimeout(remaining)
+            try: data=self._socket.recv(64)
+            except (socket.timeout, OSError): return
+            if len(data)!=STATE.size: continue
+            values=STATE.unpack(data)
+            if values[0]!=VERSION or values[1]!=OP_READ_STATE or values[2]!=sequence: continue # Late answer
+            break
+
+        flags=values[7]
+        if flags&FLAG_FAILED: return
+        state=ZeroBorg.BoardState()
+        for field, value in zip(("motor1", "motor2", "motor3", "motor4", "analog1", "analog2"), values[3:7]+values[8:]):
+            setattr(state, field, None if math.isnan(value) else value)
+        for field, flag in _FLAGS: setattr(state, field, bool(flags&flag))
+        return state
+
+    def close(self):
+        """
+        close()
+        Closes the client socket
+        """
+        self._socket.close()
+
+    @classmethod
+    def help(cls):
+        """
+        help()
+        Displays the names and descriptions of the various functions provided
+        """
+        ZeroBorg.ZeroBorg.help.__func__(cls)
+
+
+if __name__=="__main__":
+    ZeroBorgServer.help()
+    ZeroBorgClient.help()
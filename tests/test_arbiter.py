@@ -0,0 +1,136 @@
+import threading, time, itertools, unittest
+
+import ZeroBorg
+import ZeroBorgEmulator
+
+_busNumbers=itertools.count(100)
+
+def _queue(target, *args):
+    # Starts target on a thread and waits until its transaction is queued behind the held bus
+    thread=threading.Thread(target=target, args=args)
+    thread.start()
+    time.sleep(0.05)
+    return thread
+
+class BusArbiterTest(unittest.TestCase):
+    def setUp(self):
+        self.zb, self.emulator=ZeroBorgEmulator.emulatedZeroBorg()
+        self.zb.busNumber=next(_busNumbers) # An arbiter of its own, the emulator ignores the bus number
+        self.zb.writeCache=True
+        self.board=self.emulator.board()
+        self.arbiter=self.zb.getArbiter()
+        # Records every register write which reaches the emulator
+        self.writes=[]
+        write=self.emulator.write_byte_data
+        def record(address, command, value):
+            self.writes.append((command, value))
+            write(address, command, value)
+        self.emulator.write_byte_data=record
+
+    def test_stopDropsEarlierMotorWrites(self):
+        self.arbiter.acquire()
+        threads=[_queue(self.zb.setMotor1, 1.0), _queue(self.zb.setMotorFrame, 1, 1, 1, 1), _queue(self.zb.motorsOff)]
+        self.arbiter.release()
+        for thread in threads: thread.join()
+        self.assertEqual(self.writes, [(ZeroBorg.Command.AllOff, 0)])
+        self.assertEqual(self.arbiter.getStats()["coalesced"], 2)
+        self.assertEqual([self.board.getMotor(motor) for motor in range(1, 5)], [0.0]*4)
+        self.assertEqual(self.zb._shadow[ZeroBorg.Command.SetAFwd][1], 0)
+
+    def test_queuedFrameDoesNotBlockStop(self):
+        self.arbiter.acquire()
+        threads=[_queue(self.zb.setMotorFrame, 1, 1, 1, 0.5), _queue(self.zb.motorsOff)]
+        self.assertEqual(self.arbiter.getQueueDepth(), 1) # The frame was dropped as the stop queued
+        self.arbiter.release()
+        for thread in threads: thread.join()
+        self.assertEqual(self.writes, [(ZeroBorg.Command.AllOff, 0)])
+
+    def test_queuedResendDroppedByStop(self):
+        self.zb.setMotor1(0.5)
+        del self.writes[:]
+        self.arbiter.acquire()
+        threads=[_queue(self.zb._resendMotors), _queue(self.zb.motorsOff)]
+        self.arbiter.release()
+        for thread in threads: thread.join()
+        self.assertEqual(self.writes, [(ZeroBorg.Command.AllOff, 0)])
+
+    def test_writesAfterStopRun(self):
+        self.arbiter.acquire()
+        threads=[_queue(self.zb.motorsOff), _queue(self.zb.setMotor2, 0.5)]
+        self.arbiter.release()
+        for thread in threads: thread.join()
+        self.assertAlmostEqual(self.board.getMotor(2), 0.5, places=2)
+
+    def test_stopLeavesOtherWrites(self):
+        self.arbiter.acquire()
+        threads=[_queue(self.zb.setLED, True), _queue(self.zb.motorsOff)]
+        self.arbiter.release()
+        for thread in threads: thread.join()
+        self.assertTrue(self.board.led)
+
+    def test_resetEPOKeepsArrivalOrder(self):
+        self.board.tripEPO()
+        self.arbiter.acquire()
+        threads=[_queue(self.zb.setMotor1, 1.0), _queue(self.zb.resetEPO)]
+        self.arbiter.release()
+        for thread in threads: thread.join()
+        self.assertFalse(self.board.epo)
+        self.assertEqual(self.board.getMotor(1), 0.0)
+
+    def test_latestWins(self):
+        self.arbiter.acquire()
+        threads=[_queue(self.zb.setMotor3, 0.2), _queue(self.zb.setMotor3, -0.4)]
+        self.arbiter.release()
+        for thread in threads: thread.join()
+        self.assertAlmostEqual(self.board.getMotor(3), -0.4, places=2)
+        self.assertEqual(self.arbiter.getStats()["coalesced"], 1)
+
+    def test_safetyFirst(self):
+        order=[]
+        self.arbiter.acquire()
+        def take(priority, name):
+            self.arbiter.acquire(priority)
+            order.append(name)
+            self.arbiter.release()
+        threads=[_queue(take, ZeroBorg.BusArbiter.TELEMETRY, "telemetry"), _queue(take, ZeroBorg.BusArbiter.MOTOR, "motor"),
+            _queue(take, ZeroBorg.BusArbiter.SAFETY, "safety")]
+        self.arbiter.release()
+        for thread in threads: thread.join()
+        self.assertEqual(order, ["safety", "motor", "telemetry"])
+
+    def test_stateReadDoesNotHoldUpStop(self):
+        self.emulator.latency=0.01
+        reader=threading.Thread(target=self.zb.readState)
+        reader.start()
+        time.sleep(0.025)
+        started=time.monotonic()
+        self.zb.motorsOff()
+        stopped=time.monotonic()-started
+        reader.join()
+        self.assertLess(stopped, 0.05) # The read in progress and the stop, not the rest of the eleven reads
+
+    def test_backgroundInitSwitchesBusBetweenTransactions(self):
+        events=[]
+        class Bus0(ZeroBorgEmulator.ZeroBorgEmulator):
+            # No board on bus 0, writes take a while and closing records whether one was in progress
+            def write_byte_data(bus, address, command, value):
+                events.append("write")
+                time.sleep(0.05)
+                events.append("written")
+            def close(bus): events.append("close")
+        buses={0: Bus0(addresses=(), latency=0.02), 1: self.emulator}
+        zb=ZeroBorg.ZeroBorg()
+        zb.printFunction=zb.noPrint
+        zb.busFactory=lambda busNumber: buses[busNumber]
+        zb.busNumber=0
+        zb.retryPolicy=ZeroBorg.RetryPolicy(retries=0)
+        zb.init(True, ZeroBorg.INIT_BACKGROUND)
+        time.sleep(0.005)
+        zb.setLED(True) # Queued behind the probe on bus 0, then in progress as the probe fails
+        self.assertTrue(zb.waitForInit(1.0))
+        self.assertEqual(zb.busNumber, 1)
+        self.assertEqual(events, ["write", "written", "close"])
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import asyncio, unittest
+
+import ZeroBorgAsync
+import ZeroBorgEmulator
+
+class AsyncZeroBorgTest(unittest.TestCase):
+    def setUp(self):
+        self.zb, self.emulator=ZeroBorgEmulator.emulatedZeroBorg()
+        self.board=self.emulator.board()
+
+    def test_setAndGet(self):
+        async def run():
+            client=ZeroBorgAsync.AsyncZeroBorg(self.zb)
+            await client.setMotor1(0.5)
+            return await client.getMotor1()
+        self.assertAlmostEqual(asyncio.run(run()), 0.5, places=2)
+
+    def test_irMessagesAreBytes(self):
+        async def run():
+            client=ZeroBorgAsync.AsyncZeroBorg(self.zb)
+            messages=client.irMessages(0.001)
+            self.board.receiveIR("0102030405")
+            first=await messages.__anext__()
+            self.board.receiveIR("aabb")
+            second=await messages.__anext__()
+            await messages.aclose()
+            return first, second
+        first, second=asyncio.run(run())
+        self.assertEqual(first[:5], bytes.fromhex("0102030405"))
+        self.assertEqual(second[:2], bytes.fromhex("aabb"))
+
+
+if __name__=="__main__":
+    unittest.main()
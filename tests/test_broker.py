@@ -0,0 +1,113 @@
+import os, time, itertools, unittest
+
+import ZeroBorgBroker
+import ZeroBorgEmulator
+
+_names=itertools.count()
+
+class ZeroBorgBrokerTest(unittest.TestCase):
+    def setUp(self):
+        self.zb, self.emulator=ZeroBorgEmulator.emulatedZeroBorg()
+        self.board=self.emulator.board()
+        self.name="zbtest{}_{}".format(os.getpid(), next(_names))
+        self.broker=ZeroBorgBroker.ZeroBorgBroker(self.zb, self.name, rate=500.0, failsafeTimeout=0.1)
+        self.broker.start()
+        self.first=ZeroBorgBroker.BrokerClient(self.name, 0)
+        self.second=ZeroBorgBroker.BrokerClient(self.name, 1)
+
+    def tearDown(self):
+        self.first.close()
+        self.second.close()
+        self.broker.stop()
+
+    def _settle(self):
+        # Waits for a few broker passes
+        iterations=self.broker.getStats()["iterations"]
+        while self.broker.getStats()["iterations"]<iterations+3: time.sleep(0.002)
+
+    def test_setMotor(self):
+        self.first.setMotor2(-0.5)
+        self._settle()
+        self.assertAlmostEqual(self.board.getMotor(2), -0.5, places=2)
+        deadline=time.monotonic()+1.0
+        while abs(self.first.readState().motor2+0.5)>0.01 and time.monotonic()<deadline: time.sleep(0.01)
+        self.assertAlmostEqual(self.first.readState().motor2, -0.5, places=2) # Once the refresher has read it back
+
+    def test_pingDoesNotRestartMotors(self):
+        self.first.setMotor1(0.5)
+        self._settle()
+        time.sleep(0.2)
+        self.assertEqual(self.board.getMotor(1), 0.0)
+        self.assertEqual(self.broker.getStats()["failsafeTrips"], 1)
+        self.first.ping()
+        self._settle()
+        self.assertEqual(self.board.getMotor(1), 0.0)
+
+    def test_otherClientsDoNotHoldOffFailsafe(self):
+        self.first.setMotor1(0.5)
+        self._settle()
+        # The driving client has gone quiet, another keeps pinging and setting the LED
+        deadline=time.monotonic()+0.3
+        while time.monotonic()<deadline:
+            self.second.ping()
+            self.second.setLED(True)
+            time.sleep(0.01)
+        self.assertEqual(self.board.getMotor(1), 0.0)
+        self.assertEqual(self.broker.getStats()["failsafeTrips"], 1)
+
+    def test_ledDoesNotResendMotors(self):
+        self.first.setMotor1(0.5)
+        self._settle()
+        self.second.setMotor1(-0.5)
+        self._settle()
+        self.first.setLED(True)
+        self._settle()
+        self.assertAlmostEqual(self.board.getMotor(1), -0.5, places=2)
+        self.assertTrue(self.board.led)
+
+    def test_motorsOffAfterSet(self):
+        self.first.setMotor3(0.5)
+        self.first.motorsOff()
+        self._settle()
+        self.assertEqual(self.board.getMotor(3), 0.0)
+
+    def test_invalidPowersRejected(self):
+        self.first.setMotor1(0.5)
+        self._settle()
+        self.first.setMotor1(float("nan"))
+        self.first.setMotor2(float("inf"))
+        self._settle()
+        self.assertAlmostEqual(self.board.getMotor(1), 0.5, places=2)
+        self.assertEqual(self.broker.getStats()["rejected"], 2)
+        self.assertTrue(self.broker._thread.is_alive())
+
+    def test_halfWrittenSlotSkipped(self):
+        # A client killed between the two sequence updates leaves its slot odd for good
+        offset=ZeroBorgBroker.SLOTS_OFFSET+ZeroBorgBroker.SLOT_SIZE
+        self.first._buffer[offset]|=1
+        self.first.setMotor4(0.25)
+        self._settle()
+        self.assertAlmostEqual(self.board.getMotor(4), 0.25, places=2)
+        self.assertGreater(self.broker.getStats()["skipped"], 0)
+
+    def test_secondBrokerDoesNotTakeOver(self):
+        other=ZeroBorgBroker.ZeroBorgBroker(self.zb, self.name)
+        self.assertRaises(FileExistsError, other.start)
+        self.first.setMotor1(0.5)
+        self._settle()
+        self.assertAlmostEqual(self.board.getMotor(1), 0.5, places=2)
+
+    def test_staleBlockReplaced(self):
+        # A broker which died leaves its block behind, no longer published
+        self.broker._stopEvent.set()
+        self.broker._thread.join()
+        time.sleep(ZeroBorgBroker.STALE_AFTER)
+        other=ZeroBorgBroker.ZeroBorgBroker(self.zb, self.name, rate=500.0)
+        other.start()
+        other.stop()
+        self.broker._memory.close()
+        self.broker._memory=None
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import time, unittest
+
+import ZeroBorgControl
+import ZeroBorgEmulator
+
+class ControlLoopTest(unittest.TestCase):
+    def setUp(self):
+        self.zb, self.emulator=ZeroBorgEmulator.emulatedZeroBorg()
+        self.zb.printFunction=self.zb.noPrint
+        self.board=self.emulator.board()
+        self.loop=ZeroBorgControl.ControlLoop(self.zb, rate=200.0)
+        self.loop.addChannel(1, 1, ZeroBorgControl.PID(2.0), setpoint=1.0)
+
+    def tearDown(self):
+        self.loop.stop()
+
+    def test_drivesTowardsSetpoint(self):
+        self.board.setAnalog(1, 0.5)
+        self.loop.start()
+        time.sleep(0.05)
+        self.assertAlmostEqual(self.board.getMotor(1), 1.0, places=2)
+        self.board.setAnalog(1, 1.5)
+        time.sleep(0.05)
+        self.assertAlmostEqual(self.board.getMotor(1), -1.0, places=2)
+
+    def test_survivesRaisedErrors(self):
+        self.zb.raiseErrors=True
+        self.board.setAnalog(1, 0.5)
+        self.loop.start()
+        time.sleep(0.03)
+        self.emulator.errorRate=1.0
+        time.sleep(0.1)
+        self.emulator.errorRate=0.0
+        self.assertTrue(self.loop._thread.is_alive())
+        self.assertGreater(self.loop.getStats()["readErrors"], 0)
+        self.board.setAnalog(1, 1.5)
+        time.sleep(0.05)
+        self.assertAlmostEqual(self.board.getMotor(1), -1.0, places=2)
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import threading, unittest
+
+import ZeroBorg
+import ZeroBorgEmulator
+import ZeroBorgFleet
+
+class ZeroBorgFleetTest(unittest.TestCase):
+    def setUp(self):
+        self.zb, self.emulator=ZeroBorgEmulator.emulatedZeroBorg()
+        self.zb.busNumber=200 # A BusWorker of its own, the emulator ignores the bus number
+        self.board=self.emulator.board()
+        self.fleet=ZeroBorgFleet.ZeroBorgFleet([self.zb])
+
+    def test_motorsOffDoesNotWaitForBusWorker(self):
+        self.zb.setMotors(0.5)
+        release=threading.Event()
+        worker=ZeroBorg.BusWorker.forBus(self.zb.busNumber)
+        stalled=worker.submit(release.wait, 5.0) # e.g. a stalled scan probe ahead in the queue
+        try:
+            latency=self.fleet.motorsOff(timeout=0.5)
+            self.assertIsNotNone(latency)
+            self.assertEqual([self.board.getMotor(motor) for motor in range(1, 5)], [0.0]*4)
+        finally:
+            release.set()
+            stalled.result()
+
+    def test_setMotorMatrix(self):
+        self.fleet.setMotorMatrix([[0.5, 0.5, 0.5, -0.5]], timeout=1.0)
+        self.assertAlmostEqual(self.board.getMotor(4), -0.5, places=2)
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import ZeroBorgEmulator
+from ZeroBorg import Command, PWM_MAX
+
+HALF=int(PWM_MAX*0.5)
+QUARTER=int(PWM_MAX*0.25)
+
+class MotorFrameTest(unittest.TestCase):
+    def setUp(self):
+        self.zb, self.emulator=ZeroBorgEmulator.emulatedZeroBorg()
+        self.zb.writeCache=True
+        self.board=self.emulator.board()
+        # Records every register write which reaches the board
+        self.writes=[]
+        write=self.emulator.write_byte_data
+        def record(address, command, value):
+            write(address, command, value)
+            self.writes.append((command, value))
+        self.emulator.write_byte_data=record
+
+    def _motors(self):
+        return [round(self.board.getMotor(motor), 2) for motor in range(1, 5)]
+
+    def test_commonLevel(self):
+        self.assertEqual(self.zb.setMotorFrame(0.5, 0.5, 0.5, 0.5), 1)
+        self.assertEqual(self.writes, [(Command.SetAllFwd, HALF)])
+
+    def test_commonLevelWithFixUp(self):
+        self.assertEqual(self.zb.setMotorFrame(0.5, 0.5, 0.5, -0.5), 2)
+        self.assertEqual(self.writes, [(Command.SetAllFwd, HALF), (Command.SetDRev, HALF)])
+        self.assertEqual(self._motors(), [0.5, 0.5, 0.5, -0.5])
+
+    def test_reverseCommonLevel(self):
+        self.assertEqual(self.zb.setMotorFrame(-0.5, 0.25, -0.5, -0.5), 2)
+        self.assertEqual(self.writes, [(Command.SetAllRev, HALF), (Command.SetBFwd, QUARTER)])
+        self.assertEqual(self._motors(), [-0.5, 0.25, -0.5, -0.5])
+
+    def test_noCommonLevel(self):
+        self.assertEqual(self.zb.setMotorFrame(0, 0.25, 0.5, -0.25), 4)
+        self.assertEqual(self.writes, [(Command.SetAFwd, 0), (Command.SetBFwd, QUARTER), (Command.SetCFwd, HALF),
+            (Command.SetDRev, QUARTER)])
+
+    def test_warmCacheSkipsFrame(self):
+        self.zb.setMotorFrame(0.5, 0.5, 0.5, -0.5)
+        del self.writes[:]
+        self.assertEqual(self.zb.setMotorFrame(0.5, 0.5, 0.5, -0.5), 0)
+        self.assertEqual(self.writes, [])
+
+    def test_warmCacheSendsOnlyChanges(self):
+        self.zb.setMotorFrame(0.5, 0.5, 0.5, 0.5)
+        del self.writes[:]
+        # Three motors still share a level, but only one register differs from the board
+        self.assertEqual(self.zb.setMotorFrame(0.5, -0.25, 0.5, 0.5), 1)
+        self.assertEqual(self.writes, [(Command.SetBRev, QUARTER)])
+        self.assertEqual(self._motors(), [0.5, -0.25, 0.5, 0.5])
+
+    def test_collapseWhenMostChanged(self):
+        self.zb.setMotorFrame(0.5, 0.25, 0, 0)
+        del self.writes[:]
+        self.assertEqual(self.zb.setMotorFrame(-0.5, -0.5, -0.5, 0), 2)
+        self.assertEqual(self.writes, [(Command.SetAllRev, HALF), (Command.SetDFwd, 0)])
+        self.assertEqual(self._motors(), [-0.5, -0.5, -0.5, 0.0])
+
+    def test_resendIgnoresCache(self):
+        self.zb.setMotorFrame(0.5, 0.5, 0.5, 0.5)
+        del self.writes[:]
+        self.assertEqual(self.zb._resendMotors(), 1)
+        self.assertEqual(self.writes, [(Command.SetAllFwd, HALF)])
+
+
+if __name__=="__main__":
+    unittest.main()
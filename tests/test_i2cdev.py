@@ -0,0 +1,46 @@
+import os, errno, unittest
+
+import ZeroBorg
+import ZeroBorgEmulator
+import ZeroBorgI2CDev
+
+class NullFileLayer(ZeroBorgI2CDev.FileLayer):
+    # The real fcntl.ioctl against /dev/null, which reaches the system call and fails it with ENOTTY
+    def open(self, path): return os.open(os.devnull, os.O_RDWR)
+
+class I2CDevTransportTest(unittest.TestCase):
+    def setUp(self):
+        self.emulator=ZeroBorgEmulator.ZeroBorgEmulator()
+        self.fileLayer=ZeroBorgI2CDev.EmulatedFileLayer(self.emulator)
+        self.zb=ZeroBorg.ZeroBorg()
+        self.zb.printFunction=self.zb.noPrint
+        self.zb.busFactory=lambda busNumber: ZeroBorgI2CDev.I2CDevTransport(busNumber, self.fileLayer)
+        self.zb.init(False)
+
+    def test_probe(self):
+        self.assertTrue(self.zb.foundChip)
+
+    def test_frameIsOneIoctl(self):
+        ioctls=self.fileLayer.ioctls
+        self.zb.setMotorFrame(0.5, -0.5, 1, 0)
+        self.assertEqual(self.fileLayer.ioctls, ioctls+1)
+        board=self.emulator.board()
+        self.assertEqual([round(board.getMotor(motor), 2) for motor in range(1, 5)], [0.5, -0.5, 1.0, 0.0])
+
+    def test_readRegisters(self):
+        self.zb.setMotor2(-1)
+        replies=self.zb.bus.readRegisters(ZeroBorg.I2C_ID_ZEROBORG, [(ZeroBorg.Command.GetB, 4), (ZeroBorg.Command.GetID, 4)])
+        self.assertEqual(replies[0][1:3], [ZeroBorg.Command.ValueRev, ZeroBorg.PWM_MAX])
+        self.assertEqual(replies[1][1], ZeroBorg.I2C_ID_ZEROBORG)
+
+    @unittest.skipIf(ZeroBorgI2CDev.fcntl is None, "needs fcntl")
+    def test_realIoctlReachesTheSystemCall(self):
+        transport=ZeroBorgI2CDev.I2CDevTransport(1, NullFileLayer())
+        try:
+            with self.assertRaises(OSError) as raised: transport.write_byte_data(ZeroBorg.I2C_ID_ZEROBORG, 1, 1)
+            self.assertEqual(raised.exception.errno, errno.ENOTTY)
+        finally: transport.close()
+
+
+if __name__=="__main__":
+    unittest.main()
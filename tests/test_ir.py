@@ -0,0 +1,42 @@
+import time, unittest
+
+import ZeroBorgEmulator
+import ZeroBorgIR
+
+class IRListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.zb, self.emulator=ZeroBorgEmulator.emulatedZeroBorg()
+        self.board=self.emulator.board()
+        self.listener=ZeroBorgIR.IRListener(self.zb, minInterval=0.005, maxInterval=0.02)
+        self.received=[]
+        self.listener.addCode("a1b2", self.received.append)
+
+    def tearDown(self):
+        self.listener.stop()
+
+    def _waitForMessages(self, count):
+        deadline=time.monotonic()+1.0
+        while len(self.received)<count and time.monotonic()<deadline: time.sleep(0.005)
+
+    def test_dispatch(self):
+        self.listener.start()
+        self.board.receiveIR("a1b2")
+        self._waitForMessages(1)
+        self.assertEqual(self.received[0].rstrip(b'\0'), bytes.fromhex("a1b2"))
+
+    def test_backsOffOnRaisedErrors(self):
+        self.zb.raiseErrors=True
+        self.zb.printFunction=self.zb.noPrint
+        self.emulator.errorRate=1.0
+        self.listener.start()
+        time.sleep(0.05)
+        self.assertGreater(self.listener.errors, 0)
+        self.assertEqual(self.listener.interval, 0.02)
+        self.emulator.errorRate=0.0
+        self.board.receiveIR("a1b2")
+        self._waitForMessages(1)
+        self.assertEqual(len(self.received), 1)
+
+
+if __name__=="__main__":
+    unittest.main()
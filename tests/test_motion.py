@@ -0,0 +1,62 @@
+import threading, time, unittest
+
+import ZeroBorg
+import ZeroBorgEmulator
+import ZeroBorgMotion
+
+class MotionControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.zb, self.emulator=ZeroBorgEmulator.emulatedZeroBorg()
+        self.board=self.emulator.board()
+        self.motion=ZeroBorgMotion.MotionController(self.zb, tick=0.005)
+        self.motion.setLimits(1, 10.0)
+        self.writes=[]
+        write=self.emulator.write_byte_data
+        def record(address, command, value):
+            self.writes.append((command, value))
+            write(address, command, value)
+        self.emulator.write_byte_data=record
+
+    def tearDown(self):
+        self.motion.stop()
+
+    def test_rampReachesTarget(self):
+        self.motion.start()
+        self.motion.moveTo(1, 0.5)
+        self.assertTrue(self.motion.wait(1.0))
+        self.assertAlmostEqual(self.board.getMotor(1), 0.5, places=2)
+
+    def test_stopAllIsNotOvertakenByAStep(self):
+        self.motion.moveTo(1, 1.0)
+        arbiter=self.zb.getArbiter()
+        arbiter.acquire()
+        stepping=threading.Thread(target=self.motion.step)
+        stepping.start()
+        time.sleep(0.05)
+        stopping=threading.Thread(target=self.motion.stopAll)
+        stopping.start()
+        time.sleep(0.05)
+        arbiter.release()
+        stepping.join()
+        stopping.join()
+        self.motion.step()
+        self.assertEqual(self.writes[-1], (ZeroBorg.Command.AllOff, 0))
+        self.assertEqual(self.board.getMotor(1), 0.0)
+
+    def test_survivesRaisedErrors(self):
+        self.zb.raiseErrors=True
+        self.zb.printFunction=self.zb.noPrint
+        self.emulator.errorRate=1.0
+        self.motion.start()
+        self.motion.moveTo(1, 0.5)
+        time.sleep(0.05)
+        self.emulator.errorRate=0.0
+        self.assertTrue(self.motion._thread.is_alive())
+        self.assertGreater(self.motion.getStats()["errors"], 0)
+        self.motion.moveTo(1, -0.5)
+        self.assertTrue(self.motion.wait(1.0))
+        self.assertAlmostEqual(self.board.getMotor(1), -0.5, places=2)
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import os, time, tempfile, unittest
+
+import ZeroBorgEmulator
+import ZeroBorgRecorder
+
+class BusRecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory=tempfile.TemporaryDirectory()
+        self.path=os.path.join(self.directory.name, "bus.rec")
+        self.emulator=ZeroBorgEmulator.ZeroBorgEmulator()
+        self.address=self.emulator.boards[0].address
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _record(self, writes, **options):
+        recorder=ZeroBorgRecorder.BusRecorder(self.path, self.emulator, bufferRecords=1, **options)
+        for value in range(writes): recorder.write_byte_data(self.address, 1, value)
+        recorder.stop()
+
+    def test_wallClockAnchor(self):
+        before=time.time()
+        self._record(3)
+        after=time.time()
+        replayer=ZeroBorgRecorder.BusReplayer(self.path)
+        try:
+            self.assertEqual(len(replayer), 3)
+            self.assertTrue(before<=replayer.wallClock<=after)
+            for record in replayer: self.assertTrue(before<=replayer.toWallClock(record.timestamp)<=after)
+        finally: replayer.close()
+
+    def test_everyFileHasAnAnchor(self):
+        self._record(2)
+        self._record(10, maxBytes=ZeroBorgRecorder.HEADER.size+4*ZeroBorgRecorder.RECORD.size, backups=5)
+        paths=[self.path]+["{}.{}".format(self.path, index) for index in range(1, 5)]
+        counts=[]
+        for path in paths:
+            if not os.path.exists(path): continue
+            replayer=ZeroBorgRecorder.BusReplayer(path)
+            counts.append(len(replayer))
+            self.assertGreater(replayer.wallClock, 0.0)
+            replayer.close()
+        self.assertEqual(sum(counts), 12) # The earlier log was rotated rather than appended to
+        self.assertIn(2, counts)
+
+
+if __name__=="__main__":
+    unittest.main()
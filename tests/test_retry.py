@@ -0,0 +1,35 @@
+import unittest
+
+import ZeroBorg
+import ZeroBorgEmulator
+
+class RetryTest(unittest.TestCase):
+    def setUp(self):
+        self.zb, self.emulator=ZeroBorgEmulator.emulatedZeroBorg()
+        self.opened=[]
+        self.zb.busFactory=self._open
+        self.zb.retryPolicy=ZeroBorg.RetryPolicy(retries=2, backoff=0.0, deadline=None, reopenAfter=3)
+
+    def _open(self, busNumber):
+        # Records whether the bus was reopened with the arbiter and the open lock held
+        self.opened.append((self.zb.getArbiter()._owner is not None, self.zb._openLock.locked()))
+        return self.emulator
+
+    def test_raisesAfterRetries(self):
+        self.emulator.errorRate=1.0
+        self.zb.raiseErrors=True
+        with self.assertRaises(ZeroBorg.ZeroBorgIOError): self.zb.getLED()
+        self.assertEqual(self.emulator.errors, 3)
+
+    def test_reopenHoldsTheBus(self):
+        self.zb.bus=None
+        self.zb.getLED() # Opens the bus lazily
+        self.emulator.errorRate=1.0
+        self.zb.getLED()
+        self.assertEqual(self.opened, [(True, True), (True, True)])
+        self.emulator.errorRate=0.0
+        self.assertFalse(self.zb.getLED())
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import math, time, unittest
+from unittest import mock
+
+import ZeroBorgEmulator
+import ZeroBorgSampler
+
+class AnalogSamplerTest(unittest.TestCase):
+    numpy=ZeroBorgSampler.numpy
+
+    def setUp(self):
+        patcher=mock.patch.object(ZeroBorgSampler, "numpy", self.numpy)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.zb, self.emulator=ZeroBorgEmulator.emulatedZeroBorg()
+        self.emulator.board().setAnalog(1, 1.0)
+        self.sampler=ZeroBorgSampler.AnalogSampler(self.zb, size=16, ports=(1,))
+
+    def _sample(self, good, failed=0):
+        for index in range(good): self.sampler.sample()
+        self.emulator.errorRate=1.0
+        for index in range(failed): self.sampler.sample()
+        self.emulator.errorRate=0.0
+
+    def test_failedReadsAreNaN(self):
+        self._sample(2, 1)
+        voltages=list(self.sampler.volts()[1])
+        self.assertAlmostEqual(voltages[0], 1.0, places=2)
+        self.assertTrue(math.isnan(voltages[2]))
+
+    def test_statsSkipFailedReads(self):
+        self._sample(4, 1)
+        self._sample(4)
+        mean, minimum, maximum=self.sampler.stats()
+        for value in (mean, minimum, maximum): self.assertAlmostEqual(value, 1.0, places=2)
+
+    def test_raisedErrorsStoredAsFailed(self):
+        self.zb.raiseErrors=True
+        self._sample(1, 1)
+        self.assertEqual(list(self.sampler.snapshot()[1]), [self.emulator.board().analog[0], self.sampler.FAILED])
+
+    def test_threadSurvivesRaisedErrors(self):
+        self.zb.raiseErrors=True
+        self.emulator.errorRate=1.0
+        self.sampler.start()
+        time.sleep(0.05)
+        self.emulator.errorRate=0.0
+        alive=self.sampler._thread.is_alive()
+        self.sampler.stop()
+        self.assertTrue(alive)
+        self.assertGreater(self.sampler.count, 0)
+
+    def test_statsAllFailed(self):
+        self._sample(0, 3)
+        self.assertEqual(self.sampler.stats(), (None, None, None))
+
+    def test_movingAverageSkipsFailedReads(self):
+        self._sample(3, 2)
+        self._sample(3)
+        averages=list(self.sampler.movingAverage(2))
+        self.assertEqual(len(averages), 7)
+        self.assertTrue(math.isnan(averages[3])) # Both samples failed
+        for index in (0, 1, 2, 4, 5, 6): self.assertAlmostEqual(averages[index], 1.0, places=2)
+
+@unittest.skipIf(ZeroBorgSampler.numpy is None, "NumPy is not installed, the other tests already use the fallback")
+class AnalogSamplerFallbackTest(AnalogSamplerTest):
+    numpy=None
+
+
+if __name__=="__main__":
+    unittest.main()
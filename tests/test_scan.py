@@ -0,0 +1,47 @@
+import os, time, shutil, tempfile, unittest
+from unittest import mock
+
+import ZeroBorg
+import ZeroBorgEmulator
+
+class SlowEmulator(ZeroBorgEmulator.ZeroBorgEmulator):
+    # Holds the bus for delay seconds whenever slowAddress is probed
+    slowAddress=0x10
+    delay=0.3
+
+    def read_byte(self, address):
+        if address==self.slowAddress: time.sleep(self.delay)
+        return super().read_byte(address)
+
+class FastScanTest(unittest.TestCase):
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+        self.cacheFile=os.path.join(self.directory, "scan.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _scan(self, emulator, **options):
+        with mock.patch.object(ZeroBorg, "openSMBus", emulator):
+            return [result.address for result in ZeroBorg.fastScanForZeroBorg(99, timeout=0.1, cacheFile=self.cacheFile,
+                **options)]
+
+    def test_sweepAndCache(self):
+        emulator=ZeroBorgEmulator.ZeroBorgEmulator(addresses=(0x40, 0x50))
+        self.assertEqual(self._scan(emulator), [0x40, 0x50])
+        self.assertEqual(ZeroBorg._loadScanCache(self.cacheFile), {99: [0x40, 0x50]})
+
+    def test_slowAddressIsSkipped(self):
+        emulator=SlowEmulator(addresses=(0x40, 0x50))
+        self.assertEqual(self._scan(emulator), [0x40, 0x50])
+        # The sweep skipped 0x10, so it is not trusted as the cache
+        self.assertEqual(ZeroBorg._loadScanCache(self.cacheFile), {})
+
+    def test_incompleteSweepKeepsCache(self):
+        self._scan(ZeroBorgEmulator.ZeroBorgEmulator(addresses=(0x40, 0x50)))
+        self.assertEqual(self._scan(SlowEmulator(addresses=(0x40,)), fullSweep=True), [0x40])
+        self.assertEqual(ZeroBorg._loadScanCache(self.cacheFile), {99: [0x40, 0x50]})
+
+
+if __name__=="__main__":
+    unittest.main()
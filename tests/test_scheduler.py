@@ -0,0 +1,33 @@
+import time, threading, unittest
+
+import ZeroBorg
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.stopEvent=threading.Event()
+
+    def test_advanceOnTime(self):
+        schedule=ZeroBorg.Scheduler(0.01, self.stopEvent)
+        started=schedule.deadline
+        self.assertEqual(schedule.advance(), 0)
+        self.assertAlmostEqual(schedule.deadline, started+0.01)
+        self.assertFalse(schedule.wait())
+        self.assertGreaterEqual(time.monotonic(), schedule.deadline)
+
+    def test_advanceSkipsMissedDeadlines(self):
+        schedule=ZeroBorg.Scheduler(0.01, self.stopEvent, time.monotonic()-0.035)
+        self.assertEqual(schedule.advance(), 3)
+        self.assertGreater(schedule.deadline, time.monotonic())
+        self.assertLess(schedule.deadline, time.monotonic()+0.01)
+
+    def test_waitStops(self):
+        schedule=ZeroBorg.Scheduler(10.0, self.stopEvent)
+        schedule.advance()
+        threading.Timer(0.01, self.stopEvent.set).start()
+        started=time.monotonic()
+        self.assertTrue(schedule.wait())
+        self.assertLess(time.monotonic()-started, 1.0)
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import time, unittest
+
+import ZeroBorg
+import ZeroBorgEmulator
+import ZeroBorgServer
+
+class ZeroBorgServerTest(unittest.TestCase):
+    def setUp(self):
+        self.zb, self.emulator=ZeroBorgEmulator.emulatedZeroBorg()
+        self.board=self.emulator.board()
+        self.server=ZeroBorgServer.ZeroBorgServer(self.zb, port=0, failsafeTimeout=0.1)
+        self.server.start()
+        host, port=self.server.address
+        self.client=ZeroBorgServer.ZeroBorgClient(host, port)
+        self.monitor=ZeroBorgServer.ZeroBorgClient(host, port)
+
+    def tearDown(self):
+        self.client.close()
+        self.monitor.close()
+        self.server.stop()
+
+    def _settle(self):
+        # A state read is answered after every packet sent before it has been applied
+        self.assertIsNotNone(self.client.readState())
+
+    def test_setMotor(self):
+        self.client.setMotor2(-0.5)
+        self._settle()
+        self.assertAlmostEqual(self.board.getMotor(2), -0.5, places=2)
+
+    def test_invalidPowersRejected(self):
+        self.client.setMotor1(0.5)
+        for power in (float("nan"), float("inf"), -float("inf"), 1.5):
+            self.client.setMotor1(power)
+            self.client.setMotors(power)
+        self._settle()
+        self.assertAlmostEqual(self.board.getMotor(1), 0.5, places=2)
+        self.assertEqual(self.server.getStats()["malformed"], 8)
+        self.assertTrue(self.server._thread.is_alive())
+
+    def test_failsafeIgnoresMonitors(self):
+        self.client.setMotor1(0.7)
+        self._settle()
+        deadline=time.monotonic()+0.5
+        while time.monotonic()<deadline:
+            self.monitor.readState()
+            self.monitor.ping()
+            time.sleep(0.02)
+        self.assertEqual(self.board.getMotor(1), 0.0)
+        self.assertEqual(self.server.getStats()["failsafeTrips"], 1)
+
+    def test_pingKeepsDriverAlive(self):
+        self.client.setMotor1(0.7)
+        deadline=time.monotonic()+0.4
+        while time.monotonic()<deadline:
+            self.client.ping()
+            time.sleep(0.02)
+        self._settle()
+        self.assertAlmostEqual(self.board.getMotor(1), 0.7, places=2)
+        self.assertEqual(self.server.getStats()["failsafeTrips"], 0)
+
+    def test_readAfterWriteNotStale(self):
+        deadline=time.monotonic()+1.0
+        while len(self.zb.getState().times)<len(ZeroBorg.BoardState.FIELDS) and time.monotonic()<deadline:
+            time.sleep(0.01)
+        self.client.setMotor1(0.5)
+        self.client.setLED(True)
+        state=self.client.readState() # Applied in the same batch as the writes, well before the next refresh
+        self.assertAlmostEqual(state.motor1, 0.5, places=2)
+        self.assertTrue(state.led)
+
+
+if __name__=="__main__":
+    unittest.main()
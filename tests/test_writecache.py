@@ -0,0 +1,68 @@
+import time, unittest
+
+import ZeroBorgEmulator
+from ZeroBorg import Command, PWM_MAX
+
+class WriteCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.zb, self.emulator=ZeroBorgEmulator.emulatedZeroBorg()
+        self.zb.setWriteCache(True, refresh=0.05)
+        self.board=self.emulator.board()
+        # Records every register write which reaches the board
+        self.writes=[]
+        write=self.emulator.write_byte_data
+        def record(address, command, value):
+            write(address, command, value)
+            self.writes.append((command, value))
+        self.emulator.write_byte_data=record
+
+    def test_unchangedWritesSkipped(self):
+        self.zb.setMotor1(0.5)
+        self.zb.setMotor1(0.5)
+        self.zb.setLED(True)
+        self.zb.setLED(True)
+        self.assertEqual(self.writes, [(Command.SetAFwd, int(PWM_MAX*0.5)), (Command.SetLED, Command.ValueOn)])
+
+    def test_changedWritesSent(self):
+        self.zb.setMotor1(0.5)
+        self.zb.setMotor1(-0.5) # Same PWM byte, other direction
+        self.zb.setMotor1(0.25)
+        self.assertEqual([command for command, value in self.writes], [Command.SetAFwd, Command.SetARev, Command.SetAFwd])
+        self.assertAlmostEqual(self.board.getMotor(1), 0.25, places=2)
+
+    def test_resentAfterRefresh(self):
+        self.zb.setMotor2(0.5)
+        time.sleep(0.06)
+        self.zb.setMotor2(0.5)
+        self.assertEqual(len(self.writes), 2)
+
+    def test_setMotorsFillsCache(self):
+        self.zb.setMotors(-0.5)
+        self.zb.setMotor3(-0.5)
+        self.zb.setMotors(-0.5)
+        self.assertEqual(self.writes, [(Command.SetAllRev, int(PWM_MAX*0.5))])
+
+    def test_motorsOffAlwaysSent(self):
+        self.zb.motorsOff()
+        self.zb.motorsOff()
+        self.zb.setMotor4(0)
+        self.assertEqual(self.writes, [(Command.AllOff, 0), (Command.AllOff, 0)])
+
+    def test_failedWriteForgotten(self):
+        self.zb.printFunction=self.zb.noPrint
+        self.emulator.errorRate=1.0
+        self.zb.setMotor1(0.5)
+        self.assertEqual(self.writes, [])
+        self.emulator.errorRate=0.0
+        self.zb.setMotor1(0.5)
+        self.assertEqual(self.writes, [(Command.SetAFwd, int(PWM_MAX*0.5))])
+
+    def test_disabledSendsEverything(self):
+        self.zb.writeCache=False
+        self.zb.setMotor1(0.5)
+        self.zb.setMotor1(0.5)
+        self.assertEqual(len(self.writes), 2)
+
+
+if __name__=="__main__":
+    unittest.main()